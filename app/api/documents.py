@@ -1,20 +1,28 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Query
-from typing import List
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Query, Header
+from typing import List, Optional, Tuple
 from datetime import datetime
-from app.models.document import DocumentResponse, DocumentList
+from app.models.document import (
+    BulkDeleteRequest,
+    BulkDeleteResponse,
+    DocumentResponse,
+    DocumentList,
+)
 from app.helpers.minio_helpers import minio_helper
-from app.helpers.celery_tasks import process_document_task
-from sqlalchemy.orm import Session
-from app.db.session import SessionLocal
+from app.helpers.ingest_scheduler import ingest_scheduler
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.session import get_async_db
 from app.db.crud_documents import (
-    create_document,
-    get_document,
-    list_documents,
-    delete_document,
+    create_document_async,
+    get_document_async,
+    list_documents_async,
+    count_documents_async,
+    estimate_document_count_async,
+    tombstone_documents_async,
 )
+from app.config import settings
 from app.models.document_table import DocumentStatusEnum
-from app.utils.vector_store import vector_store
 from app.utils.cache import cache
+import asyncio
 import uuid
 import logging
 
@@ -23,17 +31,19 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/documents", tags=["documents"])
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 @router.post("/", response_model=DocumentResponse)
-async def upload_document(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    """Upload a new document"""
+async def upload_document(
+    file: UploadFile = File(...),
+    x_tenant_id: str = Header("default"),
+    x_profile: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Upload a new document
+
+    With X-Profile: 1 each ingest task is profiled; list the results with
+    GET /profiles/?prefix=ingest-<document_id>.
+    """
     try:
         # Log upload attempt
         logger.info(
@@ -62,11 +72,19 @@ async def upload_document(file: UploadFile = File(...), db: Session = Depends(ge
             "file_size": doc_info["file_size"],
             "file_type": file.content_type,
             "status": DocumentStatusEnum.processing,
+            "tenant_id": x_tenant_id,
         }
-        db_doc = create_document(db, document_data)
-
-        # Process document in background
-        process_document_task.delay(doc_id, doc_info["object_name"])
+        db_doc = await create_document_async(db, document_data)
+        # Ingest and queries route the document's vectors by tenant
+        cache.set_document_tenant(doc_id, x_tenant_id)
+
+        # Queue for background processing in the lane matching its size
+        if x_profile == "1" and settings.PROFILING_ENABLED:
+            cache.request_ingest_profile(doc_id)
+        lane = ingest_scheduler.enqueue(
+            doc_id, doc_info["object_name"], doc_info["file_size"], x_tenant_id
+        )
+        logger.info(f"Document {doc_id} queued in {lane}")
 
         logger.info(f"Upload complete for document ID: {doc_id}")
         return db_doc
@@ -80,53 +98,131 @@ async def upload_document(file: UploadFile = File(...), db: Session = Depends(ge
         raise HTTPException(status_code=500, detail=f"Failed to upload document: {str(e)}")
 
 
+async def _get_document_total(
+    db: AsyncSession, status: Optional[DocumentStatusEnum]
+) -> Tuple[int, bool]:
+    """
+    Total number of documents for a listing, served from a short-lived cache.
+
+    Unfiltered totals on large tables use the planner estimate instead of a
+    full count.
+    """
+    scope = status.value if status else "all"
+    cached = cache.get_cached_document_count(scope)
+    if cached:
+        return cached["total"], cached["estimated"]
+
+    total, estimated = None, False
+    if status is None:
+        estimate = await estimate_document_count_async(db)
+        if (
+            estimate is not None
+            and estimate >= settings.DOCUMENT_COUNT_ESTIMATE_THRESHOLD
+        ):
+            total, estimated = estimate, True
+    if total is None:
+        total = await count_documents_async(db, status)
+
+    cache.cache_document_count(
+        scope, total, estimated, ttl=settings.DOCUMENT_COUNT_CACHE_TTL
+    )
+    return total, estimated
+
+
 @router.get("/", response_model=DocumentList)
 async def list_documents_endpoint(
-    skip: int = 0, limit: int = 10, db: Session = Depends(get_db)
+    limit: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = None,
+    status: Optional[DocumentStatusEnum] = None,
+    include_total: bool = True,
+    db: AsyncSession = Depends(get_async_db),
 ):
-    """List all documents"""
-    docs, total = list_documents(db, skip, limit)
-    return {"documents": [doc.__dict__ for doc in docs], "total": total}
+    """List documents, newest first; pass next_cursor back to get the next page"""
+    try:
+        docs, next_cursor = await list_documents_async(db, limit, cursor, status)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    total, total_estimated = None, False
+    if include_total:
+        total, total_estimated = await _get_document_total(db, status)
+
+    return {
+        "documents": [doc.__dict__ for doc in docs],
+        "total": total,
+        "total_estimated": total_estimated,
+        "next_cursor": next_cursor,
+    }
+
+
+@router.get("/queues")
+async def ingest_queue_stats():
+    """Queue depth, in-flight ingests and wait times per ingest lane"""
+    return {"lanes": ingest_scheduler.stats()}
 
 
 @router.get("/{document_id}", response_model=DocumentResponse)
-async def get_document_endpoint(document_id: str, db: Session = Depends(get_db)):
+async def get_document_endpoint(
+    document_id: str, db: AsyncSession = Depends(get_async_db)
+):
     """Get document details"""
-    doc = get_document(db, document_id)
+    doc = await get_document_async(db, document_id)
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
     return doc.__dict__
 
 
-@router.delete("/{document_id}")
-async def delete_document_endpoint(document_id: str, db: Session = Depends(get_db)):
-    """Delete a document"""
-    doc = get_document(db, document_id)
-    if not doc:
-        raise HTTPException(status_code=404, detail="Document not found")
+async def _tombstone(db: AsyncSession, document_ids: List[str]) -> List[str]:
+    """Hide documents at once and leave removing their data to the GC task"""
+    deleted = await tombstone_documents_async(db, document_ids)
+    if deleted:
+        from app.helpers.celery_tasks import collect_deleted_documents_task
 
-    # Delete from MinIO
-    try:
-        minio_helper.delete_document(document_id, doc.file_name)
-    except Exception as e:
-        # Log but don't fail deletion if file is already gone
-        logger.warning(f"Failed to delete file from MinIO: {e}")
+        # Queries only check the Redis set, so the delete is not done until
+        # it holds the documents; a retried delete marks them again
+        for attempt in range(3):
+            if cache.mark_documents_deleted(deleted):
+                break
+            await asyncio.sleep(0.1 * (attempt + 1))
+        else:
+            raise HTTPException(
+                status_code=503,
+                detail="Documents were deleted but may still answer queries; retry the delete",
+            )
+        collect_deleted_documents_task.delay()
+    return deleted
 
-    # Delete embeddings from vector store
-    try:
-        vector_store.delete_document_chunks(document_id)
-    except Exception as e:
-        logger.warning(f"Failed to delete from vector store: {e}")
 
-    # Delete cached data from Redis
-    try:
-        cache.delete_document_cache(document_id)
-    except Exception as e:
-        logger.warning(f"Failed to delete cache: {e}")
+@router.post("/delete", response_model=BulkDeleteResponse, status_code=202)
+async def bulk_delete_documents(
+    request: BulkDeleteRequest, db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Delete many documents
+
+    They disappear from listings and queries immediately; their files,
+    vectors and cached answers are removed in the background.
+    """
+    if len(request.document_ids) > settings.BULK_DELETE_MAX_DOCUMENTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.BULK_DELETE_MAX_DOCUMENTS} documents per request",
+        )
+    document_ids = list(dict.fromkeys(request.document_ids))
+    deleted = await _tombstone(db, document_ids)
+    found = set(deleted)
+    return {
+        "deleted": deleted,
+        "not_found": [document_id for document_id in document_ids if document_id not in found],
+    }
+
 
-    # Remove from document store (database)
-    deleted_doc = delete_document(db, document_id)
-    if not deleted_doc:
+@router.delete("/{document_id}")
+async def delete_document_endpoint(
+    document_id: str, db: AsyncSession = Depends(get_async_db)
+):
+    """Delete a document; its data is removed in the background"""
+    if not await _tombstone(db, [document_id]):
         raise HTTPException(status_code=404, detail="Document not found")
 
     return {"message": "Document deleted successfully"}
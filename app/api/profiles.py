@@ -0,0 +1,27 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
+from app.utils.cache import cache
+
+router = APIRouter(prefix="/profiles", tags=["profiles"])
+
+
+@router.get("/")
+async def list_profiles(prefix: str = ""):
+    """
+    Ids of stored profiles, e.g. prefix=ingest-<document_id> for the
+    profiles of every ingest task of one document
+    """
+    return {"profile_ids": cache.list_profiles(prefix)}
+
+
+@router.get("/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id: str):
+    """
+    Download a captured profile in folded-stack format
+
+    Render it with flamegraph.pl, or open it in speedscope.
+    """
+    folded = cache.get_profile(profile_id)
+    if folded is None:
+        raise HTTPException(status_code=404, detail="Profile not found or expired")
+    return PlainTextResponse(folded)
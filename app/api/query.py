@@ -0,0 +1,152 @@
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import StreamingResponse
+from typing import Optional
+import json
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from app.db.crud_documents import get_query_scope_async
+from app.db.session import get_async_db
+from app.models.query import (
+    BatchQueryRequest,
+    CorpusQueryRequest,
+    CorpusQueryResponse,
+    QueryRequest,
+    QueryResponse,
+)
+from app.utils.profiler import profiled
+from app.utils.cache import cache
+from app.utils.rag_engine import rag_engine
+from app.utils.timing import StageTimings
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/query", tags=["query"])
+
+
+@router.post("/", response_model=QueryResponse)
+async def query_document(request: QueryRequest, x_profile: Optional[str] = Header(None)):
+    """
+    Answer a question about a document
+
+    Set include_timings for a per-stage breakdown, and send X-Profile: 1 to
+    capture a sampling profile of the request (when profiling is enabled).
+    """
+    if cache.is_document_deleted(request.document_id):
+        raise HTTPException(status_code=404, detail="Document not found")
+    try:
+        timings = StageTimings()
+        with profiled("query", enabled=x_profile == "1") as profile_id:
+            answer, execution_time, context_chunks = await rag_engine.process_query(
+                request.document_id, request.question, timings=timings
+            )
+        return {
+            "answer": answer,
+            "execution_time": execution_time,
+            "context_chunks": context_chunks,
+            "timings": timings.as_dict() if request.include_timings else None,
+            "profile_id": profile_id,
+        }
+    except Exception as e:
+        logger.exception(f"Error processing query: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to process query: {str(e)}")
+
+
+@router.post("/corpus", response_model=CorpusQueryResponse)
+async def query_corpus(
+    request: CorpusQueryRequest,
+    x_profile: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Answer a question across several documents, with per-document citations
+
+    The scope is the listed document_ids, all ready documents of tenant_id,
+    or their intersection. Only ready documents are searched.
+    """
+    if request.document_ids is None and request.tenant_id is None:
+        raise HTTPException(
+            status_code=400, detail="Provide document_ids, tenant_id or both"
+        )
+    if (
+        request.document_ids is not None
+        and len(request.document_ids) > settings.RAG_CORPUS_MAX_DOCUMENTS
+    ):
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.RAG_CORPUS_MAX_DOCUMENTS} documents per query",
+        )
+
+    documents = await get_query_scope_async(
+        db,
+        document_ids=request.document_ids,
+        tenant_id=request.tenant_id,
+        limit=settings.RAG_CORPUS_MAX_DOCUMENTS,
+    )
+    if not documents:
+        raise HTTPException(status_code=404, detail="No ready documents in scope")
+    if request.tenant_id is not None and len(documents) == settings.RAG_CORPUS_MAX_DOCUMENTS:
+        logger.warning(
+            f"Tenant {request.tenant_id} scope truncated to {settings.RAG_CORPUS_MAX_DOCUMENTS} documents"
+        )
+
+    try:
+        timings = StageTimings()
+        with profiled("corpus-query", enabled=x_profile == "1") as profile_id:
+            answer, execution_time, citations = await rag_engine.process_corpus_query(
+                [doc.id for doc in documents],
+                request.question,
+                titles={doc.id: doc.title for doc in documents},
+                max_documents=request.max_documents,
+                timings=timings,
+            )
+        return {
+            "answer": answer,
+            "execution_time": execution_time,
+            "citations": citations,
+            "documents_searched": len(documents),
+            "timings": timings.as_dict() if request.include_timings else None,
+            "profile_id": profile_id,
+        }
+    except Exception as e:
+        logger.exception(f"Error processing corpus query: {e}")
+        raise HTTPException(
+            status_code=500, detail=f"Failed to process corpus query: {str(e)}"
+        )
+
+
+@router.post("/batch")
+async def query_document_batch(request: BatchQueryRequest):
+    """
+    Answer many questions about one document, streamed as NDJSON
+
+    Each line is one result, in completion order rather than request order:
+    ``index`` (position in ``questions``), ``question``, and either
+    ``answer``/``cached``/``context_chunks`` or ``error``. The last line is
+    ``{"done": true, "timings": {...}}``.
+    """
+    if len(request.questions) > settings.RAG_BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.RAG_BATCH_MAX_QUESTIONS} questions per batch",
+        )
+    if cache.is_document_deleted(request.document_id):
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    async def results():
+        timings = StageTimings()
+        try:
+            async for result in rag_engine.process_query_batch(
+                request.document_id,
+                request.questions,
+                top_k=request.top_k,
+                timings=timings,
+            ):
+                yield json.dumps(result) + "\n"
+        except Exception as e:
+            # Headers are already sent; report the failure in-band
+            logger.exception(f"Error processing batch query: {e}")
+            yield json.dumps({"error": f"Failed to process batch: {str(e)}"}) + "\n"
+        yield json.dumps({"done": True, "timings": timings.as_dict()}) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
@@ -1,50 +1,272 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+import asyncio
 import json
 import uuid
 from datetime import datetime
+from typing import Any, Dict, List, Set, Union
 import logging
+from app.config import settings
+from app.utils.cache import cache
+from app.utils.profiler import profiled
 from app.utils.rag_engine import rag_engine
+from app.utils.status_events import StatusEventListener
+from app.utils.timing import StageTimings
+from app.utils.token_stream import (
+    MAX_QUERY_ID_BYTES,
+    coalesce_tokens,
+    encode_binary_token_frame,
+)
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 
+class StatusBuffer:
+    """Undelivered status events for one connection, coalesced per document"""
+
+    def __init__(self, max_documents: int):
+        self.max_documents = max_documents
+        self.document_ids: Set[str] = set()
+        self.pending: Dict[str, Dict[str, Any]] = {}
+        self.ready = asyncio.Event()
+
+    def push(self, document_id: str, event: Dict[str, Any]):
+        # A newer event replaces an undelivered older one for the same document,
+        # so the buffer never holds more than one event per subscription
+        if document_id not in self.document_ids:
+            return
+        self.pending[document_id] = event
+        self.ready.set()
+
+    def drain(self) -> List[Dict[str, Any]]:
+        events = list(self.pending.values())
+        self.pending = {}
+        self.ready.clear()
+        return events
+
+
 class ConnectionHandler:
     def __init__(self):
         self.active_connections: dict = {}
+        # Outgoing messages are queued per connection and written by one task
+        # each, so a slow client never holds up producers for other clients
+        self.send_queues: Dict[str, asyncio.Queue] = {}
+        self.writers: Dict[str, asyncio.Task] = {}
+        # document_id -> ids of connections subscribed to its status
+        self.subscriptions: Dict[str, Set[str]] = {}
+        self.status_buffers: Dict[str, StatusBuffer] = {}
 
     async def connect(self, websocket: WebSocket) -> str:
         """Connect a new WebSocket client"""
         await websocket.accept()
         connection_id = str(uuid.uuid4())
         self.active_connections[connection_id] = websocket
+        queue = asyncio.Queue(maxsize=settings.WS_SEND_QUEUE_SIZE)
+        self.send_queues[connection_id] = queue
+        self.writers[connection_id] = asyncio.create_task(
+            self._write_messages(connection_id, websocket, queue)
+        )
         return connection_id
 
+    async def _write_messages(
+        self, connection_id: str, websocket: WebSocket, queue: asyncio.Queue
+    ):
+        """Drain a connection's send queue onto its socket"""
+        try:
+            while True:
+                message = await queue.get()
+                if isinstance(message, bytes):
+                    await websocket.send_bytes(message)
+                else:
+                    await websocket.send_text(message)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.info(f"Failed to send to client {connection_id}: {e}")
+            self.disconnect(connection_id)
+
     def disconnect(self, connection_id: str):
         """Disconnect a WebSocket client"""
         if connection_id in self.active_connections:
             del self.active_connections[connection_id]
+        self.send_queues.pop(connection_id, None)
+        writer = self.writers.pop(connection_id, None)
+        if writer is not None and writer is not asyncio.current_task():
+            writer.cancel()
+        buffer = self.status_buffers.pop(connection_id, None)
+        if buffer is not None:
+            self.unsubscribe(connection_id, list(buffer.document_ids), buffer)
+
+    def _get_status_buffer(self, connection_id: str) -> StatusBuffer:
+        return self.status_buffers.setdefault(
+            connection_id, StatusBuffer(settings.STATUS_MAX_SUBSCRIPTIONS)
+        )
+
+    def subscribe(self, connection_id: str, document_ids: List[str]) -> List[str]:
+        """Subscribe a client to document status events, returning the accepted ids"""
+        buffer = self._get_status_buffer(connection_id)
+        accepted = []
+        for document_id in document_ids:
+            if document_id not in buffer.document_ids:
+                if len(buffer.document_ids) >= buffer.max_documents:
+                    break
+                buffer.document_ids.add(document_id)
+                self.subscriptions.setdefault(document_id, set()).add(connection_id)
+            accepted.append(document_id)
+        return accepted
+
+    def unsubscribe(
+        self, connection_id: str, document_ids: List[str], buffer: StatusBuffer = None
+    ):
+        """Stop sending status events for the given documents to a client"""
+        buffer = buffer or self.status_buffers.get(connection_id)
+        for document_id in document_ids:
+            if buffer is not None:
+                buffer.document_ids.discard(document_id)
+                buffer.pending.pop(document_id, None)
+            subscribers = self.subscriptions.get(document_id)
+            if subscribers is not None:
+                subscribers.discard(connection_id)
+                if not subscribers:
+                    del self.subscriptions[document_id]
+
+    def queue_status_event(
+        self, connection_id: str, document_id: str, event: Dict[str, Any]
+    ):
+        """Queue a status event for one client"""
+        buffer = self.status_buffers.get(connection_id)
+        if buffer is not None:
+            buffer.push(document_id, event)
+
+    def dispatch_status_event(self, document_id: str, event: Dict[str, Any]):
+        """Queue a status event for every client subscribed to the document"""
+        for connection_id in self.subscriptions.get(document_id, ()):
+            self.queue_status_event(connection_id, document_id, event)
+
+    async def flush_status_events(self, connection_id: str):
+        """Send queued status events in batches until the client disconnects"""
+        buffer = self._get_status_buffer(connection_id)
+        while connection_id in self.active_connections:
+            await buffer.ready.wait()
+            # Let a burst of events for the same documents collapse into one frame
+            await asyncio.sleep(settings.STATUS_COALESCE_INTERVAL)
+            events = buffer.drain()
+            if events:
+                await self.send_message(
+                    connection_id, json.dumps({"type": "status", "events": events})
+                )
+
+    def _drop_slow_consumer(self, connection_id: str):
+        """Close a client that is not keeping up with its messages"""
+        websocket = self.active_connections.get(connection_id)
+        logger.warning(f"Disconnecting slow WebSocket client {connection_id}")
+        self.disconnect(connection_id)
+        if websocket is not None:
+            # 1013: try again later
+            asyncio.create_task(websocket.close(code=1013))
 
-    async def send_message(self, connection_id: str, message: str):
+    async def send_message(self, connection_id: str, message: Union[str, bytes]):
         """Send a message to a specific client"""
-        if connection_id in self.active_connections:
-            websocket = self.active_connections[connection_id]
-            await websocket.send_text(message)
+        queue = self.send_queues.get(connection_id)
+        if queue is None:
+            return
+        try:
+            # Waiting on a full queue slows this client's own streams down
+            await asyncio.wait_for(queue.put(message), settings.WS_SEND_TIMEOUT)
+        except asyncio.TimeoutError:
+            self._drop_slow_consumer(connection_id)
 
     async def broadcast(self, message: str):
         """Send a message to all connected clients"""
-        for connection_id, websocket in self.active_connections.items():
-            await websocket.send_text(message)
+        for connection_id, queue in list(self.send_queues.items()):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                if settings.WS_SLOW_CONSUMER_POLICY == "disconnect":
+                    self._drop_slow_consumer(connection_id)
+                else:
+                    logger.warning(
+                        f"Dropped broadcast to slow WebSocket client {connection_id}"
+                    )
 
 
 handler = ConnectionHandler()
+status_listener = StatusEventListener(handler.dispatch_status_event)
+
+
+async def run_query(
+    connection_id: str,
+    query_id: str,
+    document_id: str,
+    question: str,
+    binary: bool = False,
+    include_timings: bool = False,
+    profile: bool = False,
+):
+    """Stream the answer to one query, tagging every message with its query_id"""
+    try:
+        timings = StageTimings()
+        with profiled("ws-query", enabled=profile) as profile_id:
+            tokens = (
+                token
+                async for token, _ in rag_engine.process_query_stream(
+                    document_id, question, timings=timings
+                )
+            )
+            async for content in coalesce_tokens(
+                tokens, settings.WS_TOKEN_FLUSH_INTERVAL, settings.WS_TOKEN_FLUSH_BYTES
+            ):
+                if binary:
+                    message = encode_binary_token_frame(query_id, content)
+                else:
+                    message = json.dumps(
+                        {"type": "token", "query_id": query_id, "content": content}
+                    )
+                await handler.send_message(connection_id, message)
+
+        # Send completion message
+        complete = {
+            "type": "complete",
+            "query_id": query_id,
+            "timestamp": datetime.now().isoformat(),
+        }
+        if include_timings:
+            complete["timings"] = timings.as_dict()
+        if profile_id:
+            complete["profile_id"] = profile_id
+        await handler.send_message(connection_id, json.dumps(complete))
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"Error processing WebSocket query: {e}", exc_info=True)
+        await handler.send_message(
+            connection_id,
+            json.dumps(
+                {"query_id": query_id, "error": f"Error processing query: {str(e)}"}
+            ),
+        )
 
 
 @router.websocket("/ws/query")
 async def websocket_query(websocket: WebSocket):
-    """WebSocket endpoint for real-time queries"""
+    """
+    WebSocket endpoint for real-time queries.
+
+    Several queries can be in flight on one connection; each is identified by
+    the query_id returned in its ack (or supplied by the client), and can be
+    stopped with {"type": "cancel", "query_id": ...}.
+
+    Tokens are sent in coalesced frames. Connecting with ?framing=binary
+    sends them as binary frames (see app.utils.token_stream) instead of JSON.
+
+    A query with "include_timings": true gets a per-stage breakdown on its
+    complete message; "profile": true captures a sampling profile and
+    returns its profile_id there.
+    """
+    binary = websocket.query_params.get("framing") == "binary"
     connection_id = await handler.connect(websocket)
+    queries: Dict[str, asyncio.Task] = {}
     try:
         while True:
             # Receive query from client
@@ -52,6 +274,24 @@ async def websocket_query(websocket: WebSocket):
             try:
                 # Parse the query
                 query_data = json.loads(data)
+
+                if query_data.get("type") == "cancel":
+                    query_id = query_data.get("query_id")
+                    task = queries.pop(query_id, None)
+                    if task is not None:
+                        task.cancel()
+                    await handler.send_message(
+                        connection_id,
+                        json.dumps(
+                            {
+                                "type": "cancelled",
+                                "query_id": query_id,
+                                "found": task is not None,
+                            }
+                        ),
+                    )
+                    continue
+
                 document_id = query_data.get("document_id")
                 question = query_data.get("question")
 
@@ -65,6 +305,47 @@ async def websocket_query(websocket: WebSocket):
                         ),
                     )
                     continue
+                if cache.is_document_deleted(document_id):
+                    await handler.send_message(
+                        connection_id,
+                        json.dumps({"error": "Document not found."}),
+                    )
+                    continue
+
+                query_id = query_data.get("query_id") or str(uuid.uuid4())
+                if (
+                    not isinstance(query_id, str)
+                    or len(query_id.encode()) > MAX_QUERY_ID_BYTES
+                ):
+                    # It has to fit the length byte of every binary token frame
+                    await handler.send_message(
+                        connection_id,
+                        json.dumps(
+                            {
+                                "error": f"query_id must be a string of at most {MAX_QUERY_ID_BYTES} UTF-8 bytes."
+                            }
+                        ),
+                    )
+                    continue
+                if query_id in queries:
+                    await handler.send_message(
+                        connection_id,
+                        json.dumps(
+                            {"query_id": query_id, "error": "Query id already in use."}
+                        ),
+                    )
+                    continue
+                if len(queries) >= settings.WS_MAX_INFLIGHT_QUERIES:
+                    await handler.send_message(
+                        connection_id,
+                        json.dumps(
+                            {
+                                "query_id": query_id,
+                                "error": f"Too many queries in flight (max {settings.WS_MAX_INFLIGHT_QUERIES}).",
+                            }
+                        ),
+                    )
+                    continue
 
                 # Send acknowledgement
                 await handler.send_message(
@@ -72,27 +353,31 @@ async def websocket_query(websocket: WebSocket):
                     json.dumps(
                         {
                             "type": "ack",
-                            "query_id": str(uuid.uuid4()),
+                            "query_id": query_id,
                             "timestamp": datetime.now().isoformat(),
                         }
                     ),
                 )
 
-                # Process the query with streaming
-                async for token, _ in rag_engine.process_query_stream(
-                    document_id, question
-                ):
-                    await handler.send_message(
-                        connection_id, json.dumps({"type": "token", "content": token})
+                # Process the query with streaming without blocking the next message
+                task = asyncio.create_task(
+                    run_query(
+                        connection_id,
+                        query_id,
+                        document_id,
+                        question,
+                        binary,
+                        include_timings=bool(query_data.get("include_timings")),
+                        profile=bool(query_data.get("profile")),
                     )
-
-                # Send completion message
-                await handler.send_message(
-                    connection_id,
-                    json.dumps(
-                        {"type": "complete", "timestamp": datetime.now().isoformat()}
-                    ),
                 )
+                queries[query_id] = task
+
+                def forget_query(done: asyncio.Task, query_id: str = query_id):
+                    if queries.get(query_id) is done:
+                        del queries[query_id]
+
+                task.add_done_callback(forget_query)
 
             except json.JSONDecodeError:
                 await handler.send_message(
@@ -106,5 +391,75 @@ async def websocket_query(websocket: WebSocket):
                 )
 
     except WebSocketDisconnect:
-        handler.disconnect(connection_id)
         logger.info(f"Client disconnected: {connection_id}")
+    finally:
+        for task in queries.values():
+            task.cancel()
+        handler.disconnect(connection_id)
+
+
+@router.websocket("/ws/documents")
+async def websocket_document_status(websocket: WebSocket):
+    """
+    WebSocket endpoint for document status notifications.
+
+    Clients send {"action": "subscribe" | "unsubscribe", "document_ids": [...]}
+    and receive {"type": "status", "events": [...]} frames, starting with the
+    latest known status of each newly subscribed document.
+    """
+    connection_id = await handler.connect(websocket)
+    status_listener.start()
+    flusher = asyncio.create_task(handler.flush_status_events(connection_id))
+    try:
+        while True:
+            data = await websocket.receive_text()
+            try:
+                message = json.loads(data)
+                action = message.get("action")
+                document_ids = message.get("document_ids")
+                if action not in ("subscribe", "unsubscribe") or not isinstance(
+                    document_ids, list
+                ):
+                    await handler.send_message(
+                        connection_id,
+                        json.dumps(
+                            {
+                                "error": "Invalid message format. Please provide action and document_ids."
+                            }
+                        ),
+                    )
+                    continue
+
+                if action == "subscribe":
+                    accepted = handler.subscribe(connection_id, document_ids)
+                    # Replay the latest status so a finish that happened before
+                    # subscribing is not missed
+                    for document_id, event in cache.get_document_statuses(
+                        accepted
+                    ).items():
+                        handler.queue_status_event(connection_id, document_id, event)
+                    await handler.send_message(
+                        connection_id,
+                        json.dumps(
+                            {
+                                "type": "subscribed",
+                                "document_ids": accepted,
+                                "rejected": document_ids[len(accepted):],
+                            }
+                        ),
+                    )
+                else:
+                    handler.unsubscribe(connection_id, document_ids)
+                    await handler.send_message(
+                        connection_id,
+                        json.dumps({"type": "unsubscribed", "document_ids": document_ids}),
+                    )
+            except json.JSONDecodeError:
+                await handler.send_message(
+                    connection_id, json.dumps({"error": "Invalid JSON format."})
+                )
+    except WebSocketDisconnect:
+        logger.info(f"Status client disconnected: {connection_id}")
+    finally:
+        flusher.cancel()
+        handler.disconnect(connection_id)
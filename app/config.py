@@ -9,6 +9,15 @@ class Settings(BaseSettings):
     # App settings
     APP_NAME: str = "DocuQuery"
     DATABASE_URL: str = os.getenv("DATABASE_URL","")
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", 20))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", 1800))
+    DB_POOL_TIMEOUT: int = int(os.getenv("DB_POOL_TIMEOUT", 30))
+    DOCUMENT_COUNT_CACHE_TTL: int = int(os.getenv("DOCUMENT_COUNT_CACHE_TTL", 30))
+    DOCUMENT_COUNT_ESTIMATE_THRESHOLD: int = int(
+        os.getenv("DOCUMENT_COUNT_ESTIMATE_THRESHOLD", 100000)
+    )
+    STARTUP_WARMUP_TIMEOUT: float = float(os.getenv("STARTUP_WARMUP_TIMEOUT", 10))
 
     # MinIO settings
     MINIO_ENDPOINT: str = os.getenv("MINIO_ENDPOINT", "minio:9001")
@@ -21,6 +30,39 @@ class Settings(BaseSettings):
     REDIS_PORT: int = int(os.getenv("REDIS_PORT", 6379))
     REDIS_DB: int = int(os.getenv("REDIS_DB", 0))
 
+    # Answer cache TTLs follow recent popularity: QUERY_CACHE_MIN_TTL per
+    # (decayed) ask of the question, capped at QUERY_CACHE_MAX_TTL
+    QUERY_CACHE_MIN_TTL: int = int(os.getenv("QUERY_CACHE_MIN_TTL", 600))
+    QUERY_CACHE_MAX_TTL: int = int(os.getenv("QUERY_CACHE_MAX_TTL", 86400))
+    # Popularity counts halve over this many seconds; only the most popular
+    # QUERY_POPULARITY_MAX_TRACKED questions are remembered
+    QUERY_POPULARITY_HALF_LIFE: float = float(os.getenv("QUERY_POPULARITY_HALF_LIFE", 86400))
+    QUERY_POPULARITY_MAX_TRACKED: int = int(os.getenv("QUERY_POPULARITY_MAX_TRACKED", 10000))
+    # Every CACHE_WARM_INTERVAL seconds the answers of the CACHE_WARM_TOP_N
+    # most popular questions (with a count of at least CACHE_WARM_MIN_HITS)
+    # are regenerated if missing or due to expire within two intervals
+    CACHE_WARM_INTERVAL: float = float(os.getenv("CACHE_WARM_INTERVAL", 600))
+    CACHE_WARM_TOP_N: int = int(os.getenv("CACHE_WARM_TOP_N", 200))
+    CACHE_WARM_MIN_HITS: float = float(os.getenv("CACHE_WARM_MIN_HITS", 3))
+    # Questions answered for every newly ingested document, separated by "|"
+    CACHE_WARM_SEED_QUESTIONS: str = os.getenv("CACHE_WARM_SEED_QUESTIONS", "")
+
+    # Document status notification settings
+    STATUS_COALESCE_INTERVAL: float = float(os.getenv("STATUS_COALESCE_INTERVAL", 0.25))
+    STATUS_MAX_SUBSCRIPTIONS: int = int(os.getenv("STATUS_MAX_SUBSCRIPTIONS", 1000))
+
+    # WebSocket settings
+    WS_SEND_QUEUE_SIZE: int = int(os.getenv("WS_SEND_QUEUE_SIZE", 256))
+    WS_SEND_TIMEOUT: float = float(os.getenv("WS_SEND_TIMEOUT", 10))
+    WS_MAX_INFLIGHT_QUERIES: int = int(os.getenv("WS_MAX_INFLIGHT_QUERIES", 8))
+    # "drop" skips broadcasts to a client whose send queue is full, "disconnect" closes it
+    WS_SLOW_CONSUMER_POLICY: str = os.getenv("WS_SLOW_CONSUMER_POLICY", "disconnect")
+
+    # Token streaming: tokens are coalesced into one frame per interval or size
+    WS_TOKEN_FLUSH_INTERVAL: float = float(os.getenv("WS_TOKEN_FLUSH_INTERVAL", 0.03))
+    WS_TOKEN_FLUSH_BYTES: int = int(os.getenv("WS_TOKEN_FLUSH_BYTES", 1024))
+    WS_PER_MESSAGE_DEFLATE: bool = os.getenv("WS_PER_MESSAGE_DEFLATE", "true").lower() == "true"
+
     # Celery settings
     CELERY_BROKER_URL: str = os.getenv("CELERY_BROKER_URL", "redis://redis:6379/0")
     CELERY_RESULT_BACKEND: str = os.getenv(
@@ -37,10 +79,104 @@ class Settings(BaseSettings):
     AI_MODEL_NAME: str = os.getenv("AI_MODEL_NAME", "gpt-4")
     AI_API_KEY: str = os.getenv("AI_API_KEY", "")
 
+    # Size of the stored vectors. EMBEDDING_REDUCTION picks how embeddings
+    # get there: "" keeps the model's full vectors, "dimensions" asks the
+    # provider for shortened ones (text-embedding-3 models), "pca" projects
+    # full vectors with the matrix at EMBEDDING_PCA_PATH. Use
+    # benchmarks/embedding_dimensions.py to choose a size and fit the matrix
+    EMBEDDING_DIMENSIONS: int = int(os.getenv("EMBEDDING_DIMENSIONS", 1536))
+    EMBEDDING_REDUCTION: str = os.getenv("EMBEDDING_REDUCTION", "")
+    EMBEDDING_PCA_PATH: str = os.getenv("EMBEDDING_PCA_PATH", "")
+    # Seconds a process reuses its view of which Qdrant collection serves
+    # reads and writes; a migration cutover waits twice this long
+    VECTOR_ROUTING_TTL: float = float(os.getenv("VECTOR_ROUTING_TTL", 5))
+    # Documents a re-embedding migration keeps in flight at once
+    MIGRATION_CONCURRENCY: int = int(os.getenv("MIGRATION_CONCURRENCY", 4))
+    # Seconds after which an unfinished re-embed is retried
+    MIGRATION_DOCUMENT_TIMEOUT: int = int(os.getenv("MIGRATION_DOCUMENT_TIMEOUT", 900))
+    # Keep only document_id and chunk_index in Qdrant payloads and the chunk
+    # text in Redis (app.utils.chunk_store); points written before keep theirs
+    VECTOR_SLIM_PAYLOADS: bool = (
+        os.getenv("VECTOR_SLIM_PAYLOADS", "false").lower() == "true"
+    )
+    # Tenants with more chunks than this get a collection of their own when
+    # app.helpers.vector_partitions rebalances; under half of it, they are
+    # moved back into the shared collection
+    VECTOR_TENANT_DEDICATED_POINTS: int = int(
+        os.getenv("VECTOR_TENANT_DEDICATED_POINTS", 200000)
+    )
+
     # Document processing settings
     CHUNK_SIZE: int = int(os.getenv("CHUNK_SIZE", 1000))
     CHUNK_OVERLAP: int = int(os.getenv("CHUNK_OVERLAP", 200))
+
+    # Query pipeline stage timeouts, in seconds. A slow embedding or search
+    # falls back to the whole document; the LLM has no fallback
+    RAG_EMBED_TIMEOUT: float = float(os.getenv("RAG_EMBED_TIMEOUT", 10))
+    RAG_SEARCH_TIMEOUT: float = float(os.getenv("RAG_SEARCH_TIMEOUT", 5))
+    RAG_LLM_TIMEOUT: float = float(os.getenv("RAG_LLM_TIMEOUT", 60))
+    RAG_STREAM_IDLE_TIMEOUT: float = float(os.getenv("RAG_STREAM_IDLE_TIMEOUT", 30))
+    # Start loading the whole-document fallback once search takes this long
+    RAG_FALLBACK_PREFETCH_AFTER: float = float(
+        os.getenv("RAG_FALLBACK_PREFETCH_AFTER", 0.25)
+    )
+    # Start embedding the question before the answer cache is checked. It
+    # saves one cache round trip per miss but adds ~2-3 ms of request setup
+    # to every hit, so it only pays off with a remote cache and few hits
+    RAG_SPECULATIVE_EMBEDDING: bool = (
+        os.getenv("RAG_SPECULATIVE_EMBEDDING", "false").lower() == "true"
+    )
+    # Reranking: search over-fetches RERANK_CANDIDATES chunks, which are
+    # rescored and cut to at most RERANK_MAX_CHUNKS. A chunk is dropped below
+    # RERANK_MIN_SCORE, below RERANK_RELATIVE_CUTOFF x the best score, or
+    # after a drop of more than RERANK_MAX_GAP from the previous chunk
+    RERANK_ENABLED: bool = os.getenv("RERANK_ENABLED", "true").lower() == "true"
+    RERANK_CANDIDATES: int = int(os.getenv("RERANK_CANDIDATES", 30))
+    RERANK_MAX_CHUNKS: int = int(os.getenv("RERANK_MAX_CHUNKS", 8))
+    RERANK_MIN_SCORE: float = float(os.getenv("RERANK_MIN_SCORE", 0.2))
+    RERANK_RELATIVE_CUTOFF: float = float(os.getenv("RERANK_RELATIVE_CUTOFF", 0.5))
+    RERANK_MAX_GAP: float = float(os.getenv("RERANK_MAX_GAP", 0.15))
+    # Share of the lexical score that comes from vector similarity
+    RERANK_VECTOR_WEIGHT: float = float(os.getenv("RERANK_VECTOR_WEIGHT", 0.5))
+    # Optional sentence-transformers cross-encoder, e.g.
+    # "cross-encoder/ms-marco-MiniLM-L-6-v2"; empty uses lexical scoring
+    RERANK_MODEL: str = os.getenv("RERANK_MODEL", "")
+    RERANK_BATCH_SIZE: int = int(os.getenv("RERANK_BATCH_SIZE", 32))
+    RAG_RERANK_TIMEOUT: float = float(os.getenv("RAG_RERANK_TIMEOUT", 2))
+    # Corpus queries: the most documents a scope may cover, and how many
+    # chunks each matching document contributes to the merged context
+    RAG_CORPUS_MAX_DOCUMENTS: int = int(os.getenv("RAG_CORPUS_MAX_DOCUMENTS", 500))
+    RAG_CORPUS_CHUNKS_PER_DOCUMENT: int = int(
+        os.getenv("RAG_CORPUS_CHUNKS_PER_DOCUMENT", 3)
+    )
+    # Batch queries: questions per request and answers generated at once
+    RAG_BATCH_MAX_QUESTIONS: int = int(os.getenv("RAG_BATCH_MAX_QUESTIONS", 500))
+    RAG_BATCH_LLM_CONCURRENCY: int = int(os.getenv("RAG_BATCH_LLM_CONCURRENCY", 8))
     MAX_DOCUMENT_SIZE_MB: int = int(os.getenv("MAX_DOCUMENT_SIZE_MB", 10))
+    # Ingest lanes: documents up to INGEST_FAST_LANE_MAX_BYTES use the fast lane
+    INGEST_FAST_LANE_MAX_BYTES: int = int(os.getenv("INGEST_FAST_LANE_MAX_BYTES", 1024 * 1024))
+    INGEST_FAST_LANE_CONCURRENCY: int = int(os.getenv("INGEST_FAST_LANE_CONCURRENCY", 8))
+    INGEST_BULK_LANE_CONCURRENCY: int = int(os.getenv("INGEST_BULK_LANE_CONCURRENCY", 2))
+    # Seconds after which an unfinished ingest no longer holds a lane slot
+    INGEST_SLOT_TIMEOUT: int = int(os.getenv("INGEST_SLOT_TIMEOUT", 1800))
+    # Fair-share weights per tenant, e.g. "acme=3,globex=2"; unlisted tenants get 1
+    INGEST_TENANT_WEIGHTS: str = os.getenv("INGEST_TENANT_WEIGHTS", "")
+    # Number of chunks embedded and upserted by each ingest shard task
+    INGEST_SHARD_SIZE: int = int(os.getenv("INGEST_SHARD_SIZE", 64))
+    # Deleted documents are removed by a background task every
+    # DELETE_GC_INTERVAL seconds, DELETE_GC_BATCH_SIZE at a time
+    DELETE_GC_INTERVAL: float = float(os.getenv("DELETE_GC_INTERVAL", 60))
+    DELETE_GC_BATCH_SIZE: int = int(os.getenv("DELETE_GC_BATCH_SIZE", 500))
+    BULK_DELETE_MAX_DOCUMENTS: int = int(os.getenv("BULK_DELETE_MAX_DOCUMENTS", 1000))
+    # Sweep for data of documents without a row every RECONCILE_INTERVAL
+    # seconds, ignoring stored objects younger than RECONCILE_GRACE
+    RECONCILE_INTERVAL: float = float(os.getenv("RECONCILE_INTERVAL", 3600))
+    RECONCILE_GRACE: float = float(os.getenv("RECONCILE_GRACE", 3600))
+    # Also keep float32 chunk embeddings in each document's extraction
+    # artifact (4 bytes per dimension per chunk of extra MinIO storage)
+    EXTRACTION_STORE_EMBEDDINGS: bool = (
+        os.getenv("EXTRACTION_STORE_EMBEDDINGS", "false").lower() == "true"
+    )
 
     # Azure OpenAI settings
     AZURE_OPENAI_API_KEY: str = os.getenv("AZURE_OPENAI_API_KEY", "")
@@ -55,5 +191,32 @@ class Settings(BaseSettings):
         "AZURE_CHAT_MODEL_DEPLOYMENT_NAME", ""
     )
 
+    # Azure OpenAI quota shared by all API replicas and workers
+    AZURE_EMBEDDING_RPM: int = int(os.getenv("AZURE_EMBEDDING_RPM", 2100))
+    AZURE_EMBEDDING_TPM: int = int(os.getenv("AZURE_EMBEDDING_TPM", 350000))
+    AZURE_CHAT_RPM: int = int(os.getenv("AZURE_CHAT_RPM", 480))
+    AZURE_CHAT_TPM: int = int(os.getenv("AZURE_CHAT_TPM", 80000))
+    # Share of each budget that ingest may not use, kept for interactive queries
+    RATE_LIMIT_INTERACTIVE_RESERVE: float = float(
+        os.getenv("RATE_LIMIT_INTERACTIVE_RESERVE", 0.3)
+    )
+    # How long a call may queue for quota before failing
+    RATE_LIMIT_MAX_WAIT_INTERACTIVE: float = float(
+        os.getenv("RATE_LIMIT_MAX_WAIT_INTERACTIVE", 10)
+    )
+    RATE_LIMIT_MAX_WAIT_INGEST: float = float(os.getenv("RATE_LIMIT_MAX_WAIT_INGEST", 300))
+    # Pause after a 429 that carries no Retry-After header
+    RATE_LIMIT_DEFAULT_BACKOFF: float = float(os.getenv("RATE_LIMIT_DEFAULT_BACKOFF", 5))
+
+    # Port for the Celery worker's Prometheus endpoint (0 disables it). With a
+    # prefork pool, set PROMETHEUS_MULTIPROC_DIR so child metrics are included
+    WORKER_METRICS_PORT: int = int(os.getenv("WORKER_METRICS_PORT", 0))
+
+    # On-demand sampling profiler, triggered per request with X-Profile: 1
+    PROFILING_ENABLED: bool = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+    PROFILER_INTERVAL: float = float(os.getenv("PROFILER_INTERVAL", 0.005))
+    PROFILER_MAX_SECONDS: float = float(os.getenv("PROFILER_MAX_SECONDS", 120))
+    PROFILE_TTL: int = int(os.getenv("PROFILE_TTL", 86400))
+
 
 settings = Settings()
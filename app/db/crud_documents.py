@@ -1,3 +1,9 @@
+import base64
+import json
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+from sqlalchemy import or_, select, func, text, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app.models.document_table import Document, DocumentStatusEnum
 
@@ -10,16 +16,119 @@ def create_document(db: Session, doc_data: dict):
     return db_doc
 
 
-def get_document(db: Session, document_id: str):
-    return db.query(Document).filter(Document.id == document_id).first()
+def get_document(db: Session, document_id: str, include_deleted: bool = False):
+    query = db.query(Document).filter(Document.id == document_id)
+    if not include_deleted:
+        query = query.filter(Document.deleted_at.is_(None))
+    return query.first()
 
 
 def list_documents(db: Session, skip: int = 0, limit: int = 10):
-    docs = db.query(Document).offset(skip).limit(limit).all()
-    total = db.query(Document).count()
+    live = db.query(Document).filter(Document.deleted_at.is_(None))
+    docs = live.offset(skip).limit(limit).all()
+    total = live.count()
     return docs, total
 
 
+def get_ready_document_ids(db: Session, document_ids: List[str]) -> List[str]:
+    """The subset of ``document_ids`` that exist and are ready"""
+    rows = db.query(Document.id).filter(
+        Document.id.in_(document_ids),
+        Document.status == DocumentStatusEnum.ready,
+        Document.deleted_at.is_(None),
+    )
+    return [row.id for row in rows]
+
+
+def get_ready_document_page(
+    db: Session,
+    after_id: str,
+    limit: int,
+    exclude_tenants: Optional[List[str]] = None,
+) -> List[str]:
+    """Ids of ready documents after ``after_id`` in id order, for full scans"""
+    rows = db.query(Document.id).filter(
+        Document.status == DocumentStatusEnum.ready,
+        Document.deleted_at.is_(None),
+        Document.id > after_id,
+    )
+    if exclude_tenants:
+        rows = rows.filter(Document.tenant_id.notin_(exclude_tenants))
+    return [row.id for row in rows.order_by(Document.id).limit(limit)]
+
+
+def get_document_tenant(db: Session, document_id: str) -> Optional[str]:
+    row = db.query(Document.tenant_id).filter(Document.id == document_id).first()
+    return row.tenant_id if row else None
+
+
+def get_document_ids_by_tenant(
+    db: Session, tenant_id: Optional[str] = None
+) -> Dict[str, List[str]]:
+    """Ids of live documents per tenant, of every tenant or just ``tenant_id``"""
+    rows = db.query(Document.tenant_id, Document.id).filter(Document.deleted_at.is_(None))
+    if tenant_id is not None:
+        rows = rows.filter(Document.tenant_id == tenant_id)
+    document_ids: Dict[str, List[str]] = {}
+    for row in rows.order_by(Document.id):
+        document_ids.setdefault(row.tenant_id, []).append(row.id)
+    return document_ids
+
+
+def get_tombstoned_documents(
+    db: Session, limit: int, processing_deleted_before: datetime
+) -> List[Document]:
+    """
+    Deleted documents whose data can be collected, oldest first.
+
+    Documents deleted mid-ingest wait until ``processing_deleted_before``,
+    so their ingest cannot write data after it was collected.
+    """
+    return (
+        db.query(Document)
+        .filter(
+            Document.deleted_at.isnot(None),
+            or_(
+                Document.status != DocumentStatusEnum.processing,
+                Document.deleted_at < processing_deleted_before,
+            ),
+        )
+        .order_by(Document.deleted_at)
+        .limit(limit)
+        .all()
+    )
+
+
+def purge_documents(db: Session, document_ids: List[str]) -> int:
+    """Remove the rows of collected tombstones"""
+    deleted = (
+        db.query(Document)
+        .filter(Document.id.in_(document_ids), Document.deleted_at.isnot(None))
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return deleted
+
+
+def get_known_document_ids(db: Session, document_ids: List[str]) -> Set[str]:
+    """The subset of ``document_ids`` that have a row, tombstoned or not"""
+    known: Set[str] = set()
+    for start in range(0, len(document_ids), 1000):
+        rows = db.query(Document.id).filter(
+            Document.id.in_(document_ids[start:start + 1000])
+        )
+        known.update(row.id for row in rows)
+    return known
+
+
+def get_documents_created_before(db: Session, created_before: datetime) -> List[str]:
+    """Ids of live documents created before ``created_before``"""
+    rows = db.query(Document.id).filter(
+        Document.deleted_at.is_(None), Document.created_at < created_before
+    )
+    return [row.id for row in rows]
+
+
 def update_document_status(db: Session, document_id: str, status: DocumentStatusEnum):
     doc = db.query(Document).filter(Document.id == document_id).first()
     if doc:
@@ -35,3 +144,160 @@ def delete_document(db: Session, document_id: str):
         db.delete(doc)
         db.commit()
     return doc
+
+
+async def create_document_async(db: AsyncSession, doc_data: dict):
+    db_doc = Document(**doc_data)
+    db.add(db_doc)
+    await db.commit()
+    await db.refresh(db_doc)
+    return db_doc
+
+
+async def get_document_async(
+    db: AsyncSession, document_id: str, include_deleted: bool = False
+):
+    query = select(Document).where(Document.id == document_id)
+    if not include_deleted:
+        query = query.where(Document.deleted_at.is_(None))
+    result = await db.execute(query)
+    return result.scalars().first()
+
+
+async def tombstone_documents_async(
+    db: AsyncSession, document_ids: List[str]
+) -> List[str]:
+    """
+    Mark documents deleted; returns the ids that exist, including ones
+    already deleted but not yet collected, so a delete can be retried
+    """
+    result = await db.execute(
+        select(Document.id, Document.deleted_at).where(Document.id.in_(document_ids))
+    )
+    rows = result.all()
+    live = [row.id for row in rows if row.deleted_at is None]
+    if live:
+        await db.execute(
+            update(Document)
+            .where(Document.id.in_(live), Document.deleted_at.is_(None))
+            .values(deleted_at=datetime.utcnow())
+        )
+        await db.commit()
+    return [row.id for row in rows]
+
+
+def encode_cursor(doc: Document) -> str:
+    """Encode the (created_at, id) position of a document as an opaque cursor"""
+    payload = json.dumps({"created_at": doc.created_at.isoformat(), "id": doc.id})
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Decode a cursor produced by encode_cursor"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(payload["created_at"]), payload["id"]
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+async def list_documents_async(
+    db: AsyncSession,
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    status: Optional[DocumentStatusEnum] = None,
+) -> Tuple[List[Document], Optional[str]]:
+    """
+    Return a page of documents, newest first, and the cursor of the next page.
+
+    Pages are selected with a keyset predicate on (created_at, id) rather than
+    an offset, so deep pages cost the same as the first one.
+    """
+    query = (
+        select(Document)
+        .where(Document.deleted_at.is_(None))
+        .order_by(Document.created_at.desc(), Document.id.desc())
+    )
+    if status:
+        query = query.where(Document.status == status)
+    if cursor:
+        created_at, document_id = decode_cursor(cursor)
+        query = query.where(
+            tuple_(Document.created_at, Document.id) < (created_at, document_id)
+        )
+    # Fetch one extra row to learn whether another page exists
+    result = await db.execute(query.limit(limit + 1))
+    docs = result.scalars().all()
+    next_cursor = encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+    return docs[:limit], next_cursor
+
+
+async def count_documents_async(
+    db: AsyncSession, status: Optional[DocumentStatusEnum] = None
+) -> int:
+    query = select(func.count()).select_from(Document).where(Document.deleted_at.is_(None))
+    if status:
+        query = query.where(Document.status == status)
+    return await db.scalar(query)
+
+
+async def estimate_document_count_async(db: AsyncSession) -> Optional[int]:
+    """
+    Planner row estimate for the documents table, or None when unavailable.
+
+    Reads pg_class.reltuples, which is kept current by autovacuum/ANALYZE and
+    costs nothing compared to a full count.
+    """
+    if db.bind.dialect.name != "postgresql":
+        return None
+    estimate = await db.scalar(
+        text(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:table AS regclass)"
+        ),
+        {"table": Document.__tablename__},
+    )
+    # reltuples is -1 for a table that has never been analyzed
+    if estimate is None or estimate < 0:
+        return None
+    return estimate
+
+
+async def get_query_scope_async(
+    db: AsyncSession,
+    document_ids: Optional[List[str]] = None,
+    tenant_id: Optional[str] = None,
+    limit: int = 500,
+) -> List[Document]:
+    """
+    Ready documents a corpus query may search, in a stable id order.
+
+    Narrowed to ``document_ids`` and/or ``tenant_id``; at most ``limit`` rows.
+    """
+    query = select(Document).where(
+        Document.status == DocumentStatusEnum.ready, Document.deleted_at.is_(None)
+    )
+    if document_ids is not None:
+        query = query.where(Document.id.in_(document_ids))
+    if tenant_id is not None:
+        query = query.where(Document.tenant_id == tenant_id)
+    result = await db.execute(query.order_by(Document.id).limit(limit))
+    return result.scalars().all()
+
+
+async def update_document_status_async(
+    db: AsyncSession, document_id: str, status: DocumentStatusEnum
+):
+    doc = await get_document_async(db, document_id)
+    if doc:
+        doc.status = status
+        await db.commit()
+        await db.refresh(doc)
+    return doc
+
+
+async def delete_document_async(db: AsyncSession, document_id: str):
+    doc = await get_document_async(db, document_id)
+    if doc:
+        await db.delete(doc)
+        await db.commit()
+    return doc
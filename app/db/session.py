@@ -1,9 +1,98 @@
 import os
-from sqlalchemy import create_engine
+import logging
+from typing import AsyncGenerator
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from app.config import settings
 
+logger = logging.getLogger(__name__)
+
 DATABASE_URL = settings.DATABASE_URL
 
-engine = create_engine(DATABASE_URL)
+POOL_OPTIONS = {
+    "pool_size": settings.DB_POOL_SIZE,
+    "max_overflow": settings.DB_MAX_OVERFLOW,
+    "pool_recycle": settings.DB_POOL_RECYCLE,
+    "pool_timeout": settings.DB_POOL_TIMEOUT,
+    "pool_pre_ping": True,
+}
+
+
+def get_async_database_url(url: str) -> str:
+    """Convert a sync database URL into its async driver equivalent"""
+    if url.startswith("sqlite:"):
+        # Used for local runs and the offline benchmarks; urlsplit would
+        # collapse the empty host in sqlite:///path
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    parts = urlsplit(url)
+    scheme = parts.scheme
+    if scheme in ("postgresql", "postgres") or scheme.startswith("postgresql+"):
+        scheme = "postgresql+asyncpg"
+    # asyncpg takes ``ssl`` where libpq takes ``sslmode``
+    query = [
+        ("ssl" if key == "sslmode" else key, value)
+        for key, value in parse_qsl(parts.query)
+    ]
+    return urlunsplit(parts._replace(scheme=scheme, query=urlencode(query)))
+
+
+engine = create_engine(DATABASE_URL, **POOL_OPTIONS)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+async_engine = create_async_engine(get_async_database_url(DATABASE_URL), **POOL_OPTIONS)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
+
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """Per-request async session that returns its connection to the pool"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def init_db():
+    """Create the database tables"""
+    from app.models.document_table import Base
+
+    Base.metadata.create_all(bind=engine)
+    # create_all skips columns and indexes on tables that already exist
+    for table in Base.metadata.sorted_tables:
+        _add_missing_columns(table)
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def _add_missing_columns(table):
+    """Add columns declared on the model but missing from an existing table"""
+    existing = {column["name"] for column in inspect(engine).get_columns(table.name)}
+    with engine.begin() as connection:
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}"
+            if column.server_default is not None:
+                ddl += f" DEFAULT '{column.server_default.arg}'"
+            logger.info(f"Adding column {table.name}.{column.name}")
+            connection.execute(text(ddl))
+
+
+def health_check() -> bool:
+    """Check that the database accepts connections"""
+    try:
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        return True
+    except Exception as e:
+        logger.warning(f"Database health check failed: {e}")
+        return False
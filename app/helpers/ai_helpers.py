@@ -1,8 +1,10 @@
 import logging
-import asyncio
-from typing import List, AsyncGenerator
-import openai
+import time
+from typing import Any, Awaitable, Callable, Dict, List, AsyncGenerator, Optional
 from app.config import settings
+from app.helpers.rate_limiter import rate_limiter, INTERACTIVE
+from app.utils.embedding_projection import get_projection
+from app.utils.telemetry import LLM_TIME_TO_FIRST_TOKEN, OperationSpan, instrument
 
 logger = logging.getLogger(__name__)
 
@@ -14,42 +16,148 @@ class AIHelper:
         self.azure_endpoint = settings.AZURE_OPENAI_ENDPOINT
         self.embedding_deployment = settings.AZURE_EMBEDDING_DEPLOYMENT_NAME
         self.chat_deployment = settings.AZURE_CHAT_MODEL_DEPLOYMENT_NAME
+        self.client = None
+        self.async_client = None
 
-    async def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings for text chunks"""
-        try:
-            logger.info(
-                f"Generating embeddings for {len(texts)} texts using deployment '{self.embedding_deployment}'"
-            )
-            logger.debug(
-                f"Embedding payload: {{'input': {texts}, 'model': {self.embedding_deployment}}}"
+    def _init_client(self):
+        """Create the Azure OpenAI client on first use and reuse it afterwards"""
+        if self.client is None:
+            # openai is imported here so importing the app stays cheap
+            import openai
+
+            # 429s are retried by _call_with_rate_limit so the shared limiter sees them
+            self.client = openai.AzureOpenAI(
+                api_key=self.api_key,
+                api_version=self.api_version,
+                azure_endpoint=self.azure_endpoint,
+                max_retries=0,
             )
-            client = openai.AzureOpenAI(
+            logger.info(f"Azure OpenAI client created for {self.azure_endpoint}")
+
+    def _init_async_client(self):
+        """Create the async Azure OpenAI client used for API calls"""
+        if self.async_client is None:
+            import openai
+
+            self.async_client = openai.AsyncAzureOpenAI(
                 api_key=self.api_key,
                 api_version=self.api_version,
                 azure_endpoint=self.azure_endpoint,
+                max_retries=0,
+            )
+
+    async def close(self):
+        """Release the HTTP connection pools held by the clients"""
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+        if self.async_client is not None:
+            await self.async_client.close()
+            self.async_client = None
+
+    def health_check(self) -> bool:
+        """Check that the client can be built; avoids spending quota on a live call"""
+        try:
+            if not self.api_key or not self.azure_endpoint:
+                logger.warning("Azure OpenAI credentials are not configured")
+                return False
+            self._init_client()
+            return True
+        except Exception as e:
+            logger.warning(f"AI helper health check failed: {e}")
+            return False
+
+    def _estimate_tokens(self, text: str) -> int:
+        """Rough token count used for quota accounting (~4 characters per token)"""
+        return len(text) // 4 + 1
+
+    async def _call_with_rate_limit(
+        self,
+        deployment: str,
+        tokens: int,
+        priority: str,
+        call: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """
+        Make a raw-response API call within the deployment's shared quota.
+
+        Waits for budget from the distributed limiter, feeds the remaining
+        quota headers back into it, and on a 429 pauses all callers for the
+        advertised Retry-After before trying again until the deadline.
+        """
+        import openai
+
+        deadline = time.monotonic() + rate_limiter.max_wait(priority)
+        while True:
+            await rate_limiter.acquire(deployment, tokens, priority, deadline)
+            try:
+                raw = await call()
+            except openai.RateLimitError as e:
+                rate_limiter.block(deployment, e.response.headers)
+                continue
+            rate_limiter.observe(deployment, raw.headers)
+            return raw.parse()
+
+    @instrument("ai.embeddings")
+    async def generate_embeddings(
+        self,
+        texts: List[str],
+        priority: str = INTERACTIVE,
+        profile: Optional[Dict[str, Any]] = None,
+    ) -> List[List[float]]:
+        """
+        Generate embeddings for text chunks.
+
+        ``profile`` is the embedding profile of the collection the vectors
+        are for (see vector_store.default_profile); by default the
+        environment's deployment and reduction are used.
+        """
+        deployment = profile["deployment"] if profile else self.embedding_deployment
+        reduction = profile["reduction"] if profile else settings.EMBEDDING_REDUCTION
+        dimensions = profile["dimensions"] if profile else settings.EMBEDDING_DIMENSIONS
+        try:
+            logger.info(
+                f"Generating embeddings for {len(texts)} texts using deployment '{deployment}'"
+            )
+            logger.debug(
+                f"Embedding payload: {{'input': {texts}, 'model': {deployment}}}"
             )
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                lambda: client.embeddings.create(
-                    input=texts, model=self.embedding_deployment
+            # The async client keeps executor threads free for the blocking
+            # cache and vector store calls that run alongside it
+            self._init_async_client()
+            options = {}
+            if reduction == "dimensions":
+                options["dimensions"] = dimensions
+            response = await self._call_with_rate_limit(
+                deployment,
+                sum(self._estimate_tokens(text) for text in texts),
+                priority,
+                lambda: self.async_client.embeddings.with_raw_response.create(
+                    input=texts, model=deployment, **options
                 ),
             )
             embeddings = [item.embedding for item in response.data]
+            if reduction == "pca":
+                pca_path = profile["pca_path"] if profile else settings.EMBEDDING_PCA_PATH
+                embeddings = get_projection(pca_path, dimensions).project(embeddings)
             logger.info("Successfully generated embeddings.")
             return embeddings
         except Exception as e:
             logger.error(f"Error generating embeddings: {e}")
             raise ValueError(f"Failed to generate embeddings: {str(e)}")
 
-    async def generate_embedding(self, text: str) -> List[float]:
+    async def generate_embedding(
+        self, text: str, profile: Optional[Dict[str, Any]] = None
+    ) -> List[float]:
         """Generate embedding for a single text"""
         logger.debug(f"Generating embedding for single text: {text[:30]}...")
-        embeddings = await self.generate_embeddings([text])
+        embeddings = await self.generate_embeddings([text], profile=profile)
         return embeddings[0]
 
-    async def generate_answer(self, question: str, context: str) -> str:
+    @instrument("ai.chat")
+    async def generate_answer(
+        self, question: str, context: str, priority: str = INTERACTIVE
+    ) -> str:
         """Generate answer using the Azure OpenAI chat model"""
         try:
             logger.info(
@@ -79,14 +187,14 @@ class AIHelper:
                 "max_tokens": 500,
             }
             logger.debug(f"Chat completion payload: {payload}")
-            client = openai.AzureOpenAI(
-                api_key=self.api_key,
-                api_version=self.api_version,
-                azure_endpoint=self.azure_endpoint,
-            )
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None, lambda: client.chat.completions.create(**payload)
+            self._init_async_client()
+            response = await self._call_with_rate_limit(
+                self.chat_deployment,
+                self._estimate_tokens(prompt) + payload["max_tokens"],
+                priority,
+                lambda: self.async_client.chat.completions.with_raw_response.create(
+                    **payload
+                ),
             )
             logger.debug(f"Chat completion response: {response}")
             logger.info("Successfully generated answer.")
@@ -96,9 +204,10 @@ class AIHelper:
             raise ValueError(f"Failed to generate answer: {str(e)}")
 
     async def generate_answer_stream(
-        self, question: str, context: str
+        self, question: str, context: str, priority: str = INTERACTIVE
     ) -> AsyncGenerator[str, None]:
         """Generate streaming answer using the Azure OpenAI chat model"""
+        op = OperationSpan("ai.chat_stream", priority=priority)
         try:
             logger.info(
                 f"Generating streaming answer for question: '{question}' using deployment '{self.chat_deployment}'"
@@ -128,26 +237,41 @@ class AIHelper:
                 "stream": True,
             }
             logger.debug(f"Chat completion stream payload: {payload}")
-            client = openai.AzureOpenAI(
-                api_key=self.api_key,
-                api_version=self.api_version,
-                azure_endpoint=self.azure_endpoint,
-            )
-            stream = client.chat.completions.create(**payload)
+            # The async client keeps the event loop free between tokens, so
+            # several streams can be served concurrently
+            self._init_async_client()
+            with op.activate():
+                stream = await self._call_with_rate_limit(
+                    self.chat_deployment,
+                    self._estimate_tokens(prompt) + payload["max_tokens"],
+                    priority,
+                    lambda: self.async_client.chat.completions.with_raw_response.create(
+                        **payload
+                    ),
+                )
             logger.debug("Streaming response started.")
-            for chunk in stream:
+            first_token = True
+            async for chunk in stream:
                 logger.debug(f"Streaming token chunk: {chunk}")
                 if (
                     chunk.choices
                     and chunk.choices[0].delta
                     and chunk.choices[0].delta.content
                 ):
+                    if first_token:
+                        first_token = False
+                        ttft = time.perf_counter() - op.start
+                        LLM_TIME_TO_FIRST_TOKEN.observe(ttft)
+                        op.span.set_attribute("llm.time_to_first_token", ttft)
                     logger.debug(f"Streaming token: {chunk.choices[0].delta.content}")
                     yield chunk.choices[0].delta.content
             logger.info("Completed streaming answer.")
         except Exception as e:
+            op.fail(e)
             logger.error(f"Error generating streaming answer: {e}")
             raise ValueError(f"Failed to generate streaming answer: {str(e)}")
+        finally:
+            op.end()
 
 
 ai_helper = AIHelper()
@@ -0,0 +1,151 @@
+"""
+Removal of deleted documents' data, and repair of what removal missed.
+
+Deleting a document only tombstones its row (deleted_at) and adds its id
+to a Redis set that queries check, so the request returns at once and the
+document disappears immediately. collect_deleted then removes tombstoned
+documents in batches: their points in every Qdrant collection with one
+filtered delete per batch, their MinIO objects with multi-object deletes
+and their cache entries with pipelines. The row goes last, so a batch that
+fails part-way is simply retried by the next run.
+
+reconcile sweeps the four stores for data whose document row no longer
+exists, e.g. points written by an ingest or re-embed that finished after
+its document was collected.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Set
+import logging
+from app.config import settings
+from app.db.crud_documents import (
+    get_documents_created_before,
+    get_known_document_ids,
+    get_tombstoned_documents,
+    purge_documents,
+)
+from app.db.session import SessionLocal
+from app.helpers.minio_helpers import minio_helper
+from app.utils.cache import DELETED_DOCUMENTS_KEY, DOCUMENT_TENANTS_KEY, cache
+from app.utils.telemetry import traced
+from app.utils.vector_store import vector_store
+
+logger = logging.getLogger(__name__)
+
+# Per-document Redis keys the reconciler checks, by type prefix
+DOCUMENT_KEY_TYPES = ("document_chunks", "document_status", "ingest_progress", "chunk_text")
+
+
+def collect_deleted(batch_size: int) -> Dict[str, Any]:
+    """Remove the data of tombstoned documents, batch by batch, then their rows"""
+    collected, failed = 0, 0
+    # A document deleted mid-ingest waits for that ingest to give up, so it
+    # cannot write points after they were removed
+    processing_deleted_before = datetime.utcnow() - timedelta(
+        seconds=settings.INGEST_SLOT_TIMEOUT
+    )
+    db = SessionLocal()
+    try:
+        while True:
+            docs = get_tombstoned_documents(db, batch_size, processing_deleted_before)
+            if not docs:
+                break
+            document_ids = [doc.id for doc in docs]
+            with traced("gc.vector_store", documents=len(docs)):
+                if not vector_store.delete_documents_chunks(document_ids):
+                    failed += len(docs)
+                    break
+            with traced("gc.storage", documents=len(docs)):
+                try:
+                    storage_failed = minio_helper.delete_documents(
+                        [(doc.id, doc.file_name) for doc in docs]
+                    )
+                except Exception as e:
+                    logger.error(f"Error deleting objects of {len(docs)} documents: {e}")
+                    failed += len(docs)
+                    break
+            with traced("gc.cache", documents=len(docs)):
+                cache.delete_documents_cache(document_ids)
+            done = [document_id for document_id in document_ids if document_id not in storage_failed]
+            purge_documents(db, done)
+            cache.unmark_documents_deleted(done)
+            collected += len(done)
+            failed += len(storage_failed)
+            # Failed documents would come straight back in the next batch
+            if storage_failed or len(docs) < batch_size:
+                break
+    finally:
+        db.close()
+    if collected or failed:
+        logger.info(f"Collected {collected} deleted documents; {failed} left for the next run")
+    return {"collected": collected, "failed": failed}
+
+
+def _orphans(db, document_ids: Set[str]) -> List[str]:
+    """The ids in ``document_ids`` without a document row"""
+    return sorted(document_ids - get_known_document_ids(db, list(document_ids)))
+
+
+def reconcile(grace: float) -> Dict[str, Any]:
+    """
+    Remove data of documents that have no row, in every store.
+
+    Storage objects younger than ``grace`` seconds are left alone: uploads
+    store the file before creating the row. Live documents without any
+    stored object are only reported; their points may still answer queries.
+    """
+    report: Dict[str, Any] = {}
+    db = SessionLocal()
+    try:
+        vector_orphans: Set[str] = set()
+        for collection in vector_store.routing()["all"]:
+            with traced("reconcile.vector_store", collection=collection):
+                vector_orphans.update(
+                    _orphans(db, vector_store.stored_document_ids(collection))
+                )
+        if vector_orphans:
+            vector_store.delete_documents_chunks(sorted(vector_orphans))
+        report["vector_store"] = len(vector_orphans)
+
+        with traced("reconcile.storage"):
+            stored = minio_helper.stored_documents()
+            cutoff = datetime.now(timezone.utc) - timedelta(seconds=grace)
+            storage_orphans = [
+                document_id
+                for document_id in _orphans(db, set(stored))
+                if stored[document_id] < cutoff
+            ]
+            if storage_orphans:
+                minio_helper.delete_document_prefixes(storage_orphans)
+        report["storage"] = len(storage_orphans)
+
+        with traced("reconcile.cache"):
+            keys: Dict[str, List[str]] = {}
+            for key_type in DOCUMENT_KEY_TYPES:
+                for key in cache.redis.scan_iter(match=f"{key_type}:*", count=1000):
+                    keys.setdefault(key.split(":", 1)[1], []).append(key)
+            tombstones = cache.redis.smembers(DELETED_DOCUMENTS_KEY)
+            tenants = set(cache.redis.hkeys(DOCUMENT_TENANTS_KEY))
+            cache_orphans = _orphans(db, set(keys) | tombstones | tenants)
+            stale_keys = [key for document_id in cache_orphans for key in keys.get(document_id, [])]
+            for start in range(0, len(stale_keys), 1000):
+                cache.redis.delete(*stale_keys[start:start + 1000])
+            cache.unmark_documents_deleted([d for d in cache_orphans if d in tombstones])
+            stale_tenants = [d for d in cache_orphans if d in tenants]
+            if stale_tenants:
+                cache.redis.hdel(DOCUMENT_TENANTS_KEY, *stale_tenants)
+        report["cache"] = len(cache_orphans)
+
+        # Rows are never removed here, only reported
+        missing = sorted(
+            set(get_documents_created_before(db, datetime.utcnow() - timedelta(seconds=grace)))
+            - set(stored)
+        )
+        if missing:
+            logger.warning(
+                f"{len(missing)} documents have no stored objects, e.g. {missing[:10]}"
+            )
+        report["documents_without_objects"] = len(missing)
+    finally:
+        db.close()
+    logger.info(f"Reconciled stores: {report}")
+    return report
@@ -0,0 +1,232 @@
+import json
+import time
+import logging
+from typing import Any, Dict, List, Optional
+from app.config import settings
+from app.utils.cache import cache
+
+logger = logging.getLogger(__name__)
+
+FAST_LANE = "ingest_fast"
+BULK_LANE = "ingest_bulk"
+LANES = (FAST_LANE, BULK_LANE)
+
+
+class IngestScheduler:
+    """
+    Admits document ingests into Celery with per-lane concurrency limits.
+
+    Uploads wait in Redis in one list per (lane, tenant). Whenever a lane has
+    free slots, tenants are visited in weighted round-robin order, so a
+    tenant with a large backlog cannot starve the others. Small documents go
+    to a separate fast lane with its own slots.
+    """
+
+    def __init__(self):
+        self.tenant_weights = self._parse_weights(settings.INGEST_TENANT_WEIGHTS)
+
+    @property
+    def redis(self):
+        return cache.redis
+
+    def _parse_weights(self, raw: str) -> Dict[str, int]:
+        weights = {}
+        for item in raw.split(","):
+            if "=" in item:
+                tenant, weight = item.split("=", 1)
+                weights[tenant.strip()] = max(1, int(weight))
+        return weights
+
+    def _pending_key(self, lane: str, tenant_id: str) -> str:
+        return f"ingest_pending:{lane}:{tenant_id}"
+
+    def _tenants_key(self, lane: str) -> str:
+        return f"ingest_tenants:{lane}"
+
+    def _inflight_key(self, lane: str) -> str:
+        return f"ingest_inflight:{lane}"
+
+    def _stats_key(self, lane: str) -> str:
+        return f"ingest_stats:{lane}"
+
+    def lane_for_size(self, file_size: Optional[int]) -> str:
+        if file_size is not None and file_size <= settings.INGEST_FAST_LANE_MAX_BYTES:
+            return FAST_LANE
+        return BULK_LANE
+
+    def lane_limit(self, lane: str) -> int:
+        if lane == FAST_LANE:
+            return settings.INGEST_FAST_LANE_CONCURRENCY
+        return settings.INGEST_BULK_LANE_CONCURRENCY
+
+    def tenant_weight(self, tenant_id: str) -> int:
+        return self.tenant_weights.get(tenant_id, 1)
+
+    def enqueue(
+        self, document_id: str, object_name: str, file_size: int, tenant_id: str
+    ) -> str:
+        """Queue a document for ingest and return the lane it was placed in"""
+        lane = self.lane_for_size(file_size)
+        job = json.dumps(
+            {
+                "document_id": document_id,
+                "object_name": object_name,
+                "tenant_id": tenant_id,
+                "enqueued_at": time.time(),
+            }
+        )
+        pipe = self.redis.pipeline()
+        pipe.rpush(self._pending_key(lane, tenant_id), job)
+        pipe.sadd(self._tenants_key(lane), tenant_id)
+        pipe.execute()
+        self.dispatch(lane)
+        return lane
+
+    def release(self, lane: str, document_id: str):
+        """Free the slot held by a finished ingest and admit the next one"""
+        self.redis.zrem(self._inflight_key(lane), document_id)
+        self.dispatch(lane)
+
+    def dispatch(self, lane: str) -> int:
+        """
+        Start as many queued ingests as the lane has free slots for.
+
+        One process dispatches a lane at a time. A call that finds the lane
+        busy leaves a request behind instead of waiting, and the process
+        holding the lock makes another pass for it, so an upload or a freed
+        slot never waits for the next beat.
+        """
+        wanted_key = f"ingest_dispatch_wanted:{lane}"
+        dispatched = 0
+        while True:
+            self.redis.set(wanted_key, 1, ex=60)
+            lock = self.redis.lock(f"ingest_dispatch:{lane}", timeout=30)
+            if not lock.acquire(blocking=False):
+                # Another process is dispatching this lane and will see the request
+                return dispatched
+            try:
+                self.redis.delete(wanted_key)
+                dispatched += self._dispatch_locked(lane)
+            finally:
+                try:
+                    lock.release()
+                except Exception as e:
+                    # The lock still expires on its own
+                    logger.warning(f"Failed to release dispatch lock for {lane}: {e}")
+            if not self.redis.exists(wanted_key):
+                return dispatched
+
+    def _dispatch_locked(self, lane: str) -> int:
+        inflight_key = self._inflight_key(lane)
+        now = time.time()
+        # Slots of ingests that never reported back (e.g. a killed worker)
+        self.redis.zremrangebyscore(
+            inflight_key, "-inf", now - settings.INGEST_SLOT_TIMEOUT
+        )
+        capacity = self.lane_limit(lane) - self.redis.zcard(inflight_key)
+        tenants = sorted(self.redis.smembers(self._tenants_key(lane)))
+        if capacity <= 0 or not tenants:
+            return 0
+
+        # Rotate the starting tenant so ties don't always favour the same one
+        offset = self.redis.incr(f"ingest_rr:{lane}") % len(tenants)
+        tenants = tenants[offset:] + tenants[:offset]
+
+        dispatched = 0
+        while capacity > 0 and tenants:
+            still_pending = []
+            for tenant_id in tenants:
+                taken = 0
+                while taken < self.tenant_weight(tenant_id) and capacity > 0:
+                    raw = self.redis.lpop(self._pending_key(lane, tenant_id))
+                    if raw is None:
+                        break
+                    if not self._start(lane, raw):
+                        # The broker is unreachable; leave the rest for later
+                        return dispatched + taken
+                    taken += 1
+                    capacity -= 1
+                dispatched += taken
+                if raw is None:
+                    self._forget_tenant_if_idle(lane, tenant_id)
+                else:
+                    still_pending.append(tenant_id)
+                if capacity <= 0:
+                    break
+            tenants = still_pending
+        return dispatched
+
+    def _forget_tenant_if_idle(self, lane: str, tenant_id: str):
+        self.redis.srem(self._tenants_key(lane), tenant_id)
+        # An upload may have arrived between the empty pop and the removal
+        if self.redis.llen(self._pending_key(lane, tenant_id)):
+            self.redis.sadd(self._tenants_key(lane), tenant_id)
+
+    def _start(self, lane: str, raw: str) -> bool:
+        """Publish a popped job; on failure it goes back to the head of its queue"""
+        from app.helpers.celery_tasks import process_document_task
+
+        job: Dict[str, Any] = json.loads(raw)
+        now = time.time()
+        wait = now - job["enqueued_at"]
+        self.redis.zadd(self._inflight_key(lane), {job["document_id"]: now})
+        try:
+            process_document_task.apply_async(
+                args=[job["document_id"], job["object_name"], lane], queue=lane
+            )
+        except Exception as e:
+            logger.error(f"Failed to dispatch document {job['document_id']}; requeued: {e}")
+            pipe = self.redis.pipeline()
+            pipe.lpush(self._pending_key(lane, job["tenant_id"]), raw)
+            pipe.sadd(self._tenants_key(lane), job["tenant_id"])
+            pipe.zrem(self._inflight_key(lane), job["document_id"])
+            pipe.execute()
+            return False
+        pipe = self.redis.pipeline()
+        pipe.hincrbyfloat(self._stats_key(lane), "wait_seconds_total", wait)
+        pipe.hincrby(self._stats_key(lane), "dispatched_total", 1)
+        pipe.hset(self._stats_key(lane), "last_wait_seconds", wait)
+        pipe.execute()
+        logger.info(
+            f"Dispatched document {job['document_id']} of tenant {job['tenant_id']} to {lane} after {wait:.1f}s"
+        )
+        return True
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Queue depth, in-flight count and wait times for every lane"""
+        now = time.time()
+        lanes = []
+        for lane in LANES:
+            tenants = sorted(self.redis.smembers(self._tenants_key(lane)))
+            pending = {}
+            oldest = None
+            for tenant_id in tenants:
+                key = self._pending_key(lane, tenant_id)
+                pending[tenant_id] = self.redis.llen(key)
+                head = self.redis.lindex(key, 0)
+                if head:
+                    enqueued_at = json.loads(head)["enqueued_at"]
+                    oldest = enqueued_at if oldest is None else min(oldest, enqueued_at)
+            counters = self.redis.hgetall(self._stats_key(lane))
+            dispatched = int(counters.get("dispatched_total", 0))
+            lanes.append(
+                {
+                    "lane": lane,
+                    "pending": sum(pending.values()),
+                    "pending_by_tenant": pending,
+                    "in_flight": self.redis.zcard(self._inflight_key(lane)),
+                    "concurrency_limit": self.lane_limit(lane),
+                    "oldest_wait_seconds": round(now - oldest, 3) if oldest else 0.0,
+                    "last_wait_seconds": float(counters.get("last_wait_seconds", 0)),
+                    "avg_wait_seconds": (
+                        float(counters.get("wait_seconds_total", 0)) / dispatched
+                        if dispatched
+                        else 0.0
+                    ),
+                    "dispatched_total": dispatched,
+                }
+            )
+        return lanes
+
+
+ingest_scheduler = IngestScheduler()
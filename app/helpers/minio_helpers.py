@@ -1,9 +1,13 @@
 import io
 from minio import Minio
 from minio.error import S3Error
+from minio.deleteobjects import DeleteObject
 import uuid
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
 from fastapi import UploadFile, HTTPException
 from app.config import settings
+from app.utils.telemetry import instrument
 import logging
 
 logger = logging.getLogger(__name__)
@@ -56,6 +60,17 @@ class MinioHelper:
             logger.error(f"Error creating bucket: {e}")
             raise HTTPException(status_code=500, detail="Failed to initialize storage")
 
+    def health_check(self) -> bool:
+        """Check that MinIO is reachable and the bucket exists, connecting if needed"""
+        try:
+            self._init_client()
+            self.client.bucket_exists(settings.MINIO_BUCKET_NAME)
+            return True
+        except Exception as e:
+            logger.warning(f"MinIO health check failed: {e}")
+            return False
+
+    @instrument("storage.upload")
     async def upload_document(self, file: UploadFile) -> dict:
         """Upload a document to MinIO storage"""
         try:
@@ -95,6 +110,7 @@ class MinioHelper:
                 status_code=500, detail=f"Failed to upload document: {str(e)}"
             )
 
+    @instrument("storage.download")
     def get_document(self, document_id: str, file_name: str) -> io.BytesIO:
         """Get a document from MinIO storage"""
         try:
@@ -106,6 +122,7 @@ class MinioHelper:
             logger.error(f"Error retrieving document {document_id}: {e}")
             raise HTTPException(status_code=404, detail="Document not found")
 
+    @instrument("storage.delete")
     def delete_document(self, document_id: str, file_name: str) -> bool:
         """Delete a document from MinIO storage"""
         try:
@@ -118,5 +135,155 @@ class MinioHelper:
             raise HTTPException(status_code=404, detail="Document not found")
 
 
+    def _extraction_name(self, document_id: str) -> str:
+        # Outside artifacts/, which is removed once ingest finishes
+        return f"{document_id}/extracted/extraction.arrow"
+
+    @instrument("storage.put_extraction")
+    def put_extraction(self, document_id: str, data: bytes):
+        """Store a document's extraction artifact (see ExtractionArtifact)"""
+        self._init_client()
+        self.client.put_object(
+            settings.MINIO_BUCKET_NAME,
+            self._extraction_name(document_id),
+            io.BytesIO(data),
+            len(data),
+            "application/vnd.apache.arrow.file",
+        )
+
+    @instrument("storage.get_extraction")
+    def get_extraction(self, document_id: str) -> Optional[bytes]:
+        """A document's extraction artifact, or None if it was ingested before they were kept"""
+        self._init_client()
+        try:
+            response = self.client.get_object(
+                settings.MINIO_BUCKET_NAME, self._extraction_name(document_id)
+            )
+        except S3Error as e:
+            if e.code == "NoSuchKey":
+                return None
+            raise
+        try:
+            return response.read()
+        finally:
+            response.close()
+            response.release_conn()
+
+    def delete_extraction(self, document_id: str) -> bool:
+        try:
+            self._init_client()
+            self.client.remove_object(
+                settings.MINIO_BUCKET_NAME, self._extraction_name(document_id)
+            )
+            return True
+        except Exception as e:
+            logger.error(f"Error deleting extraction of document {document_id}: {e}")
+            return False
+
+    @instrument("storage.delete_many")
+    def delete_documents(self, documents: List[Tuple[str, str]]) -> Set[str]:
+        """
+        Delete the original and extraction of each (document_id, file_name)
+        in bulk; returns the ids whose objects could not be deleted.
+
+        Leftover ingest artifacts are rare (finalize removes them) and are
+        swept by the reconciler.
+        """
+        self._init_client()
+        names = {}
+        for document_id, file_name in documents:
+            names[f"{document_id}/{file_name}"] = document_id
+            names[self._extraction_name(document_id)] = document_id
+        # remove_objects sends them in multi-object requests of up to 1000
+        errors = self.client.remove_objects(
+            settings.MINIO_BUCKET_NAME, (DeleteObject(name) for name in names)
+        )
+        failed = set()
+        for error in errors:
+            logger.error(f"Error deleting {error.name}: {error}")
+            failed.add(names.get(error.name) or error.name.split("/")[0])
+        return failed
+
+    def stored_documents(self) -> Dict[str, datetime]:
+        """Every document id with objects in the bucket, with its newest object's time"""
+        self._init_client()
+        latest: Dict[str, datetime] = {}
+        for obj in self.client.list_objects(settings.MINIO_BUCKET_NAME, recursive=True):
+            document_id = obj.object_name.split("/")[0]
+            if document_id not in latest or obj.last_modified > latest[document_id]:
+                latest[document_id] = obj.last_modified
+        return latest
+
+    def delete_document_prefixes(self, document_ids: List[str]) -> bool:
+        """Delete every object stored under each document's prefix"""
+        try:
+            self._init_client()
+            names = [
+                obj.object_name
+                for document_id in document_ids
+                for obj in self.client.list_objects(
+                    settings.MINIO_BUCKET_NAME, prefix=f"{document_id}/", recursive=True
+                )
+            ]
+            errors = self.client.remove_objects(
+                settings.MINIO_BUCKET_NAME, (DeleteObject(name) for name in names)
+            )
+            for error in errors:
+                logger.error(f"Error deleting {error.name}: {error}")
+            return True
+        except Exception as e:
+            logger.error(f"Error deleting objects of {len(document_ids)} documents: {e}")
+            return False
+
+    def _artifact_prefix(self, document_id: str) -> str:
+        return f"{document_id}/artifacts/"
+
+    @instrument("storage.put_artifact")
+    def put_artifact(self, document_id: str, name: str, data: bytes) -> str:
+        """Store an intermediate processing artifact for a document"""
+        self._init_client()
+        object_name = f"{self._artifact_prefix(document_id)}{name}"
+        self.client.put_object(
+            settings.MINIO_BUCKET_NAME,
+            object_name,
+            io.BytesIO(data),
+            len(data),
+            "application/octet-stream",
+        )
+        return object_name
+
+    @instrument("storage.get_artifact")
+    def get_artifact(self, document_id: str, name: str) -> bytes:
+        """Read an intermediate processing artifact for a document"""
+        self._init_client()
+        object_name = f"{self._artifact_prefix(document_id)}{name}"
+        response = self.client.get_object(settings.MINIO_BUCKET_NAME, object_name)
+        try:
+            return response.read()
+        finally:
+            response.close()
+            response.release_conn()
+
+    def delete_artifacts(self, document_id: str) -> bool:
+        """Delete every intermediate artifact stored for a document"""
+        try:
+            self._init_client()
+            objects = self.client.list_objects(
+                settings.MINIO_BUCKET_NAME,
+                prefix=self._artifact_prefix(document_id),
+                recursive=True,
+            )
+            errors = self.client.remove_objects(
+                settings.MINIO_BUCKET_NAME,
+                (DeleteObject(obj.object_name) for obj in objects),
+            )
+            for error in errors:
+                logger.error(f"Error deleting artifact for {document_id}: {error}")
+            return True
+        except Exception as e:
+            logger.error(f"Error deleting artifacts for document {document_id}: {e}")
+            return False
+
+
 # Create a singleton instance
 minio_helper = MinioHelper()
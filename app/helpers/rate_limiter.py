@@ -0,0 +1,225 @@
+import asyncio
+import time
+import logging
+from typing import Any, Dict, Optional
+from app.config import settings
+from app.utils.cache import cache
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = "interactive"
+INGEST = "ingest"
+# Bulk question batches; like ingest, they leave the interactive reserve alone
+BATCH = "batch"
+
+# Two buckets per deployment (requests and tokens) refilled continuously over
+# one minute, plus a "blocked until" timestamp set after a 429. Ingest calls
+# must leave the reserved share of each bucket for interactive calls.
+#
+# KEYS: request bucket, token bucket, blocked-until key
+# ARGV: requests per minute, tokens per minute, tokens needed, reserve fraction
+_ACQUIRE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local blocked = tonumber(redis.call('GET', KEYS[3]) or '0')
+if blocked > now then
+  return {0, tostring(blocked - now)}
+end
+
+local rpm = tonumber(ARGV[1])
+local tpm = tonumber(ARGV[2])
+local reserve = tonumber(ARGV[4])
+local floor_r = rpm * reserve
+local floor_t = tpm * reserve
+-- Oversized requests are clamped so they can still run once the bucket is full
+local need_t = math.min(tonumber(ARGV[3]), tpm - floor_t)
+
+local function level(key, capacity)
+  local b = redis.call('HMGET', key, 'level', 'ts')
+  local lvl = tonumber(b[1])
+  if lvl == nil then
+    return capacity
+  end
+  return math.min(capacity, lvl + (now - tonumber(b[2])) * capacity / 60)
+end
+
+local r = level(KEYS[1], rpm)
+local tk = level(KEYS[2], tpm)
+if r - 1 >= floor_r and tk - need_t >= floor_t then
+  redis.call('HSET', KEYS[1], 'level', tostring(r - 1), 'ts', tostring(now))
+  redis.call('HSET', KEYS[2], 'level', tostring(tk - need_t), 'ts', tostring(now))
+  redis.call('EXPIRE', KEYS[1], 120)
+  redis.call('EXPIRE', KEYS[2], 120)
+  return {1, '0'}
+end
+local wait = math.max((1 + floor_r - r) * 60 / rpm, (need_t + floor_t - tk) * 60 / tpm, 0.05)
+return {0, tostring(wait)}
+"""
+
+# Lower the bucket levels to what the provider reports as remaining.
+# KEYS: request bucket, token bucket
+# ARGV: remaining requests (or -1), remaining tokens (or -1)
+_OBSERVE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+for i, key in ipairs(KEYS) do
+  local remaining = tonumber(ARGV[i])
+  if remaining >= 0 then
+    local lvl = tonumber(redis.call('HGET', key, 'level'))
+    if lvl == nil or remaining < lvl then
+      redis.call('HSET', key, 'level', tostring(remaining), 'ts', tostring(now))
+      redis.call('EXPIRE', key, 120)
+    end
+  end
+end
+return 1
+"""
+
+
+class RateLimitExceeded(Exception):
+    """Raised when quota could not be acquired before the caller's deadline"""
+
+
+class AzureRateLimiter:
+    """
+    Token-bucket limiter for Azure OpenAI shared by every API replica and worker.
+
+    State lives in Redis so all processes draw from the same per-deployment
+    RPM/TPM budget. Interactive calls may use the whole budget; ingest calls
+    leave RATE_LIMIT_INTERACTIVE_RESERVE of it untouched.
+    """
+
+    def __init__(self):
+        self._acquire = None
+        self._observe = None
+
+    @property
+    def redis(self):
+        return cache.redis
+
+    def _init_scripts(self):
+        if self._acquire is None:
+            self._acquire = self.redis.register_script(_ACQUIRE_SCRIPT)
+            self._observe = self.redis.register_script(_OBSERVE_SCRIPT)
+
+    def _keys(self, deployment: str):
+        return (
+            f"ratelimit:{deployment}:requests",
+            f"ratelimit:{deployment}:tokens",
+            f"ratelimit:{deployment}:blocked_until",
+        )
+
+    def limits(self, deployment: str):
+        """(requests per minute, tokens per minute) configured for a deployment"""
+        # Anything but the chat deployment is an embedding model, including
+        # one a re-embedding migration targets
+        if deployment == settings.AZURE_CHAT_MODEL_DEPLOYMENT_NAME:
+            return settings.AZURE_CHAT_RPM, settings.AZURE_CHAT_TPM
+        return settings.AZURE_EMBEDDING_RPM, settings.AZURE_EMBEDDING_TPM
+
+    def max_wait(self, priority: str) -> float:
+        if priority == INTERACTIVE:
+            return settings.RATE_LIMIT_MAX_WAIT_INTERACTIVE
+        return settings.RATE_LIMIT_MAX_WAIT_INGEST
+
+    async def acquire(
+        self,
+        deployment: str,
+        tokens: int,
+        priority: str = INTERACTIVE,
+        deadline: Optional[float] = None,
+    ):
+        """Wait until the deployment has budget for one request of ``tokens`` tokens"""
+        self._init_scripts()
+        rpm, tpm = self.limits(deployment)
+        reserve = 0 if priority == INTERACTIVE else settings.RATE_LIMIT_INTERACTIVE_RESERVE
+        if deadline is None:
+            deadline = time.monotonic() + self.max_wait(priority)
+        while True:
+            allowed, wait = self._acquire(
+                keys=self._keys(deployment), args=[rpm, tpm, tokens, reserve]
+            )
+            if int(allowed):
+                return
+            wait = float(wait)
+            remaining = deadline - time.monotonic()
+            if wait > remaining:
+                raise RateLimitExceeded(
+                    f"No {priority} quota for '{deployment}' within deadline (needs {wait:.1f}s)"
+                )
+            logger.debug(f"Waiting {wait:.2f}s for {priority} quota on '{deployment}'")
+            await asyncio.sleep(wait)
+
+    def observe(self, deployment: str, headers: Any):
+        """Align the buckets with the remaining quota reported in response headers"""
+        try:
+            self._init_scripts()
+            remaining_requests = headers.get("x-ratelimit-remaining-requests")
+            remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+            if remaining_requests is None and remaining_tokens is None:
+                return
+            self._observe(
+                keys=self._keys(deployment)[:2],
+                args=[
+                    remaining_requests if remaining_requests is not None else -1,
+                    remaining_tokens if remaining_tokens is not None else -1,
+                ],
+            )
+        except Exception as e:
+            logger.warning(f"Failed to record rate limit headers: {e}")
+
+    def block(self, deployment: str, headers: Any):
+        """Pause every caller of a deployment after a 429, honouring Retry-After"""
+        retry_after = None
+        if headers is not None:
+            if headers.get("retry-after-ms"):
+                retry_after = float(headers["retry-after-ms"]) / 1000
+            elif headers.get("retry-after"):
+                retry_after = float(headers["retry-after"])
+        retry_after = retry_after or settings.RATE_LIMIT_DEFAULT_BACKOFF
+        until = self.redis.time()
+        until = until[0] + until[1] / 1_000_000 + retry_after
+        key = self._keys(deployment)[2]
+        pipe = self.redis.pipeline()
+        pipe.set(key, until, ex=int(retry_after) + 1)
+        # Drain the buckets so callers resume gradually after the pause
+        pipe.hset(self._keys(deployment)[0], mapping={"level": 0, "ts": until})
+        pipe.hset(self._keys(deployment)[1], mapping={"level": 0, "ts": until})
+        pipe.execute()
+        logger.warning(f"Rate limited on '{deployment}'; pausing for {retry_after:.1f}s")
+
+    def utilization(self) -> Dict[str, Dict[str, Any]]:
+        """Share of each deployment's per-minute budget currently in use"""
+        now = self.redis.time()
+        now = now[0] + now[1] / 1_000_000
+        report = {}
+        for deployment in {
+            settings.AZURE_EMBEDDING_DEPLOYMENT_NAME,
+            settings.AZURE_CHAT_MODEL_DEPLOYMENT_NAME,
+        }:
+            requests_key, tokens_key, blocked_key = self._keys(deployment)
+            entry = {}
+            for name, key, capacity in zip(
+                ("requests", "tokens"), (requests_key, tokens_key), self.limits(deployment)
+            ):
+                bucket = self.redis.hgetall(key)
+                if bucket:
+                    level = min(
+                        capacity,
+                        float(bucket["level"])
+                        + (now - float(bucket["ts"])) * capacity / 60,
+                    )
+                else:
+                    level = capacity
+                entry[name] = {
+                    "limit_per_minute": capacity,
+                    "available": round(max(level, 0), 1),
+                    "utilization": round(1 - max(level, 0) / capacity, 3),
+                }
+            blocked_until = float(self.redis.get(blocked_key) or 0)
+            entry["blocked_for_seconds"] = round(max(0.0, blocked_until - now), 2)
+            report[deployment] = entry
+        return report
+
+
+rate_limiter = AzureRateLimiter()
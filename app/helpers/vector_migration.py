@@ -0,0 +1,416 @@
+"""
+Online re-embedding of every document into a new Qdrant collection.
+
+A migration builds a collection with a new embedding profile (model
+deployment, vector size, reduction, chunking) next to the one being served,
+re-embeds every ready document into it from its extracted text, then moves
+the active alias over in one step:
+
+    python -m app.helpers.vector_migration start --deployment text-embedding-3-large --dimensions 1024
+    python -m app.helpers.vector_migration status
+    python -m app.helpers.vector_migration retry      # documents that failed
+    python -m app.helpers.vector_migration cutover
+    python -m app.helpers.vector_migration cleanup
+
+The vector_migration_tick beat task does the work: it walks ready
+documents in id order and keeps MIGRATION_CONCURRENCY re-embeds in flight.
+A pass that finds nothing left to do marks the migration ready (or cuts
+over, with --auto-cutover). Queries keep being served from the source
+collection throughout.
+
+Cutover first sends new ingests to the target and waits for every process
+to see that (twice VECTOR_ROUTING_TTL), so one more pass catches the
+documents ingested into the source meanwhile. Then the alias moves. Reads
+fall back to the source collection for documents missing from the target
+until cleanup deletes it.
+
+Only the shared collection is migrated. Tenants with a partition of their
+own (app.helpers.vector_partitions) keep the profile it was created with.
+"""
+import argparse
+import json
+import sys
+import time
+from typing import Any, Dict, List, Optional
+import logging
+import redis
+from app.config import settings
+from app.db.crud_documents import get_ready_document_page
+from app.db.session import SessionLocal
+from app.utils.cache import cache
+from app.utils.vector_store import (
+    ACTIVE_ALIAS,
+    COLLECTION_NAME,
+    MIGRATION_STATE_KEY,
+    default_profile,
+    vector_store,
+)
+
+logger = logging.getLogger(__name__)
+
+# Per-document outcome (DONE or FAILED), and deadlines of in-flight re-embeds
+DOCUMENTS_KEY = f"{MIGRATION_STATE_KEY}:documents"
+IN_FLIGHT_KEY = f"{MIGRATION_STATE_KEY}:in_flight"
+
+DONE = "done"
+FAILED = "failed"
+
+# Ready documents read per scan query
+SCAN_PAGE_SIZE = 500
+
+
+def get_state() -> Optional[Dict[str, Any]]:
+    return vector_store.migration_state()
+
+
+def save_state(state: Dict[str, Any], expected_status: str) -> bool:
+    """
+    Save the state unless its status is no longer ``expected_status``.
+
+    The tick and the CLI both write the state; a transaction keeps a tick
+    that started before a cutover from undoing it.
+    """
+    with cache.redis.pipeline() as pipe:
+        try:
+            pipe.watch(MIGRATION_STATE_KEY)
+            current = pipe.get(MIGRATION_STATE_KEY)
+            if current is None or json.loads(current)["status"] != expected_status:
+                pipe.unwatch()
+                return False
+            pipe.multi()
+            pipe.set(MIGRATION_STATE_KEY, json.dumps(state))
+            pipe.execute()
+        except redis.WatchError:
+            return False
+    vector_store.refresh_routing()
+    return True
+
+
+def clear_state():
+    cache.redis.delete(MIGRATION_STATE_KEY, DOCUMENTS_KEY, IN_FLIGHT_KEY)
+    vector_store.refresh_routing()
+
+
+def start(overrides: Dict[str, Any], auto_cutover: bool = False) -> Dict[str, Any]:
+    """Create the target collection and start migrating into it"""
+    if get_state():
+        raise RuntimeError("A migration is already in progress")
+    moving = [
+        tenant
+        for tenant, partition in vector_store.partitions().items()
+        if partition["status"] != "dedicated"
+    ]
+    if moving:
+        raise RuntimeError(f"Tenants {moving} are moving between partitions; wait for them")
+    vector_store._init_client()
+    vector_store.refresh_routing()
+    source = vector_store.write_route()
+    # Pin the source profile, so changing the settings for the target
+    # cannot change how the source is queried
+    vector_store.register_profile(source["collection"], source["profile"])
+    profile = {**source["profile"], **overrides}
+    target = f"{COLLECTION_NAME}_{int(time.time())}"
+    vector_store.create_collection(vector_store.client, target, profile["dimensions"])
+    vector_store.register_profile(target, profile)
+    state = {
+        "source": source["collection"],
+        "target": target,
+        "status": "running",
+        "started_at": time.time(),
+        "auto_cutover": auto_cutover,
+        "cursor": "",
+        # Whether the current pass over the documents found work; a pass
+        # that finds none means the target is complete
+        "pass_found_work": False,
+        "passes": 0,
+    }
+    cache.redis.delete(DOCUMENTS_KEY, IN_FLIGHT_KEY)
+    if not cache.redis.set(MIGRATION_STATE_KEY, json.dumps(state), nx=True):
+        vector_store.client.delete_collection(target)
+        vector_store.forget_profile(target)
+        raise RuntimeError("A migration is already in progress")
+    vector_store.refresh_routing()
+    logger.info(f"Started re-embedding {source['collection']} into {target}: {profile}")
+    return state
+
+
+def status() -> Optional[Dict[str, Any]]:
+    """The migration state with progress counts, or None"""
+    state = get_state()
+    if state is None:
+        return None
+    outcomes = cache.redis.hvals(DOCUMENTS_KEY)
+    return {
+        **state,
+        "profile": vector_store.profile_of(state["target"]),
+        "documents_done": sum(1 for outcome in outcomes if outcome == DONE),
+        "documents_failed": sum(1 for outcome in outcomes if outcome == FAILED),
+        "in_flight": cache.redis.zcard(IN_FLIGHT_KEY),
+    }
+
+
+def begin_cutover(force: bool = False) -> Dict[str, Any]:
+    """Send new ingests to the target; the tick moves the alias once it has caught up"""
+    state = get_state()
+    if state is None or state["status"] not in ("running", "ready"):
+        raise RuntimeError(f"Cannot cut over a migration in state {state and state['status']}")
+    expected_status = state["status"]
+    failed = [
+        document_id
+        for document_id, outcome in cache.redis.hgetall(DOCUMENTS_KEY).items()
+        if outcome == FAILED
+    ]
+    if failed and not force:
+        raise RuntimeError(
+            f"{len(failed)} documents failed to re-embed (e.g. {failed[:5]}); "
+            f"run retry, or cut over with --force"
+        )
+    state.update(
+        status="cutover",
+        cutover_at=time.time(),
+        cursor="",
+        pass_found_work=False,
+        # The pass must start after every process routes writes to the target
+        settled_at=time.time() + 2 * settings.VECTOR_ROUTING_TTL,
+    )
+    if not save_state(state, expected_status):
+        raise RuntimeError("The migration changed state meanwhile; check its status")
+    logger.info(f"Cutting over to {state['target']}")
+    return state
+
+
+def retry_failed() -> Dict[str, Any]:
+    """Forget failed documents so the next pass re-embeds them"""
+    state = get_state()
+    if state is None or state["status"] not in ("running", "ready", "cutover"):
+        raise RuntimeError(f"Cannot retry in migration state {state and state['status']}")
+    failed = [
+        document_id
+        for document_id, outcome in cache.redis.hgetall(DOCUMENTS_KEY).items()
+        if outcome == FAILED
+    ]
+    if failed:
+        cache.redis.hdel(DOCUMENTS_KEY, *failed)
+        expected_status = state["status"]
+        state.update(
+            status="running" if expected_status == "ready" else expected_status,
+            pass_found_work=True,
+        )
+        if not save_state(state, expected_status):
+            raise RuntimeError("The migration changed state meanwhile; check its status")
+    logger.info(f"Retrying {len(failed)} failed documents")
+    return {**state, "retried": len(failed)}
+
+
+def swap_alias(state: Dict[str, Any]):
+    """Point the active alias at the target in one atomic alias update"""
+    from qdrant_client.http.models import (
+        CreateAlias,
+        CreateAliasOperation,
+        DeleteAlias,
+        DeleteAliasOperation,
+    )
+
+    vector_store._init_client()
+    operations = []
+    if any(
+        alias.alias_name == ACTIVE_ALIAS
+        for alias in vector_store.client.get_aliases().aliases
+    ):
+        operations.append(
+            DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=ACTIVE_ALIAS))
+        )
+    operations.append(
+        CreateAliasOperation(
+            create_alias=CreateAlias(
+                collection_name=state["target"], alias_name=ACTIVE_ALIAS
+            )
+        )
+    )
+    vector_store.client.update_collection_aliases(change_aliases_operations=operations)
+    state.update(status="complete", completed_at=time.time())
+    save_state(state, "cutover")
+    logger.info(f"Alias {ACTIVE_ALIAS} now points at {state['target']}")
+
+
+def abort() -> Dict[str, Any]:
+    """Drop the target collection; only before cutover, when nothing depends on it"""
+    state = get_state()
+    if state is None or state["status"] not in ("running", "ready"):
+        raise RuntimeError(f"Cannot abort a migration in state {state and state['status']}")
+    vector_store._init_client()
+    vector_store.client.delete_collection(state["target"])
+    vector_store.forget_profile(state["target"])
+    clear_state()
+    logger.info(f"Aborted migration into {state['target']}")
+    return state
+
+
+def cleanup() -> Dict[str, Any]:
+    """Delete the old collection once the alias has moved"""
+    state = get_state()
+    if state is None or state["status"] != "complete":
+        raise RuntimeError(f"Cannot clean up a migration in state {state and state['status']}")
+    vector_store._init_client()
+    vector_store.client.delete_collection(state["source"])
+    vector_store.forget_profile(state["source"])
+    clear_state()
+    logger.info(f"Deleted {state['source']}; migration into {state['target']} finished")
+    return state
+
+
+def claim(document_id: str) -> bool:
+    """Mark a document in flight; False if it already is"""
+    deadline = time.time() + settings.MIGRATION_DOCUMENT_TIMEOUT
+    return bool(cache.redis.zadd(IN_FLIGHT_KEY, {document_id: deadline}, nx=True))
+
+
+def finish(document_id: str, outcome: str):
+    pipe = cache.redis.pipeline()
+    pipe.hset(DOCUMENTS_KEY, document_id, outcome)
+    pipe.zrem(IN_FLIGHT_KEY, document_id)
+    pipe.execute()
+
+
+def record_ingest(document_id: str, collection: str):
+    """Count a document ingested straight into the target as migrated"""
+    state = get_state()
+    if state and state["target"] == collection:
+        cache.redis.hset(DOCUMENTS_KEY, document_id, DONE)
+
+
+def next_documents(state: Dict[str, Any], slots: int) -> List[str]:
+    """
+    Claim up to ``slots`` documents that still need re-embedding.
+
+    Advances ``state["cursor"]``; at the end of a pass that found work a
+    new pass starts, since documents may have been ingested behind the
+    cursor. Sets ``state["caught_up"]`` once a whole pass finds nothing.
+    """
+    claimed: List[str] = []
+    state["caught_up"] = False
+    # Partitioned tenants' documents are not in the shared collection
+    partitioned = list(vector_store.partitions())
+    db = SessionLocal()
+    try:
+        while len(claimed) < slots:
+            page = get_ready_document_page(
+                db, state["cursor"], SCAN_PAGE_SIZE, exclude_tenants=partitioned
+            )
+            if not page:
+                if cache.redis.zcard(IN_FLIGHT_KEY) or claimed:
+                    # Wait for in-flight documents before judging the pass
+                    break
+                if not state["pass_found_work"]:
+                    state["caught_up"] = True
+                    break
+                state.update(cursor="", pass_found_work=False, passes=state["passes"] + 1)
+                continue
+            outcomes = cache.redis.hmget(DOCUMENTS_KEY, page)
+            for document_id, outcome in zip(page, outcomes):
+                if len(claimed) == slots:
+                    break
+                state["cursor"] = document_id
+                if outcome is None and claim(document_id):
+                    claimed.append(document_id)
+                    state["pass_found_work"] = True
+            else:
+                state["cursor"] = page[-1]
+    finally:
+        db.close()
+    return claimed
+
+
+def tick(enqueue) -> Dict[str, Any]:
+    """
+    Advance the migration by one step; ``enqueue(document_id, collection)``
+    schedules a re-embed.
+    """
+    state = get_state()
+    if state is None or state["status"] not in ("running", "cutover"):
+        return {"status": state and state["status"]}
+    if state["status"] == "cutover" and time.time() < state["settled_at"]:
+        return {"status": "cutover", "waiting": True}
+
+    # Re-embeds that outlived their deadline died with their worker
+    expired = cache.redis.zrangebyscore(IN_FLIGHT_KEY, "-inf", time.time())
+    if expired:
+        cache.redis.zrem(IN_FLIGHT_KEY, *expired)
+        logger.warning(f"Retrying {len(expired)} stalled re-embeds")
+        state["pass_found_work"] = True
+
+    slots = settings.MIGRATION_CONCURRENCY - cache.redis.zcard(IN_FLIGHT_KEY)
+    claimed = next_documents(state, max(0, slots))
+    for document_id in claimed:
+        enqueue(document_id, state["target"])
+    caught_up = state.pop("caught_up")
+    if caught_up and state["status"] == "cutover":
+        swap_alias(state)
+    elif caught_up:
+        state["status"] = "ready"
+        if save_state(state, "running"):
+            logger.info(f"Collection {state['target']} is complete and ready for cutover")
+            if state["auto_cutover"]:
+                begin_cutover()
+    else:
+        save_state(state, state["status"])
+    return {"status": state["status"], "enqueued": len(claimed)}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Re-embed every document into a new collection")
+    commands = parser.add_subparsers(dest="command", required=True)
+    begin = commands.add_parser("start", help="create the target collection and start")
+    begin.add_argument("--deployment", help="embedding deployment")
+    begin.add_argument("--dimensions", type=int, help="stored vector size")
+    begin.add_argument("--reduction", choices=("", "dimensions", "pca"))
+    begin.add_argument("--pca-path")
+    begin.add_argument("--chunk-size", type=int)
+    begin.add_argument("--chunk-overlap", type=int)
+    begin.add_argument(
+        "--auto-cutover", action="store_true", help="cut over as soon as every document is done"
+    )
+    commands.add_parser("status")
+    cutover = commands.add_parser("cutover", help="move the active alias to the target")
+    cutover.add_argument("--force", action="store_true", help="even if some documents failed")
+    commands.add_parser("retry", help="re-embed the documents that failed")
+    commands.add_parser("abort", help="drop the target collection (before cutover)")
+    commands.add_parser("cleanup", help="delete the old collection (after cutover)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        if args.command == "start":
+            overrides = {
+                key: value
+                for key, value in {
+                    "deployment": args.deployment,
+                    "dimensions": args.dimensions,
+                    "reduction": args.reduction,
+                    "pca_path": args.pca_path,
+                    "chunk_size": args.chunk_size,
+                    "chunk_overlap": args.chunk_overlap,
+                }.items()
+                if value is not None
+            }
+            result = start(overrides, args.auto_cutover)
+        elif args.command == "status":
+            result = status() or {"status": None, "profile": default_profile()}
+        elif args.command == "cutover":
+            result = begin_cutover(args.force)
+        elif args.command == "retry":
+            result = retry_failed()
+        elif args.command == "abort":
+            result = abort()
+        else:
+            result = cleanup()
+    except RuntimeError as e:
+        raise SystemExit(str(e))
+    json.dump(result, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
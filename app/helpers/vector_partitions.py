@@ -0,0 +1,240 @@
+"""
+Tenant partitions of the vector store.
+
+Every tenant's chunks start out in the shared collection, where a few large
+tenants make the graph, and everyone's filtered searches, slower. A tenant
+with more than VECTOR_TENANT_DEDICATED_POINTS chunks can be moved to a
+collection of its own, which can also be exported or dropped as a whole:
+
+    python -m app.helpers.vector_partitions plan
+    python -m app.helpers.vector_partitions rebalance    # carry out the plan
+    python -m app.helpers.vector_partitions move acme
+    python -m app.helpers.vector_partitions release acme
+
+A move creates the partition with the shared collection's profile and sends
+the tenant's new chunks there, waits until every process routes that way
+(twice VECTOR_ROUTING_TTL), then copies the tenant's points over with their
+vectors, so nothing is re-embedded. Reads fall back to the shared
+collection until the copy is done; then the tenant's points are removed
+from it. Release does the same the other way round. Both can be run again
+after an interruption and continue where they stopped.
+"""
+import argparse
+import hashlib
+import json
+import re
+import sys
+import time
+from typing import Any, Dict, List
+import logging
+from app.config import settings
+from app.db.crud_documents import get_document_ids_by_tenant
+from app.db.session import SessionLocal
+from app.utils.cache import DOCUMENT_TENANTS_KEY, cache
+from app.utils.vector_store import (
+    TENANT_COLLECTION_PREFIX,
+    TENANT_PARTITIONS_KEY,
+    same_query_embedding,
+    vector_store,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def partition_name(tenant_id: str) -> str:
+    """Collection name for a tenant; the hash keeps sanitized names apart"""
+    slug = re.sub(r"[^A-Za-z0-9_-]", "_", tenant_id)[:48]
+    digest = hashlib.blake2b(tenant_id.encode("utf-8"), digest_size=4).hexdigest()
+    return f"{TENANT_COLLECTION_PREFIX}{slug}_{digest}"
+
+
+def set_partition(tenant_id: str, collection: str, status: str):
+    cache.redis.hset(
+        TENANT_PARTITIONS_KEY,
+        tenant_id,
+        json.dumps({"collection": collection, "status": status, "updated_at": time.time()}),
+    )
+    vector_store.refresh_routing()
+
+
+def settle():
+    """Wait until every process has picked up a routing change"""
+    time.sleep(2 * settings.VECTOR_ROUTING_TTL)
+
+
+def tenant_documents(tenant_id: str) -> List[str]:
+    db = SessionLocal()
+    try:
+        return get_document_ids_by_tenant(db, tenant_id).get(tenant_id, [])
+    finally:
+        db.close()
+
+
+def record_tenant(tenant_id: str, document_ids: List[str]):
+    """Record the tenant of documents uploaded before tenants were recorded"""
+    for start in range(0, len(document_ids), 1000):
+        cache.redis.hset(
+            DOCUMENT_TENANTS_KEY,
+            mapping={document_id: tenant_id for document_id in document_ids[start:start + 1000]},
+        )
+
+
+def check_no_migration():
+    if vector_store.migration_state():
+        raise RuntimeError("A re-embedding migration is in progress; wait for it to finish")
+
+
+def plan() -> Dict[str, Any]:
+    """Chunks per tenant, and which tenants the size policy would move"""
+    vector_store.refresh_routing()
+    routing = vector_store.routing()
+    partitions = vector_store.partitions()
+    db = SessionLocal()
+    try:
+        documents = get_document_ids_by_tenant(db)
+    finally:
+        db.close()
+    sizes = {}
+    for tenant_id, document_ids in documents.items():
+        collection = (
+            partitions[tenant_id]["collection"]
+            if tenant_id in partitions
+            else routing["write"]["collection"]
+        )
+        sizes[tenant_id] = vector_store.count_document_points(collection, document_ids)
+    threshold = settings.VECTOR_TENANT_DEDICATED_POINTS
+    return {
+        "threshold": threshold,
+        "points": dict(sorted(sizes.items(), key=lambda item: -item[1])),
+        "partitions": partitions,
+        "move": sorted(
+            tenant_id
+            for tenant_id, points in sizes.items()
+            if points > threshold and tenant_id not in partitions
+        ),
+        # Half the threshold, so a tenant near it does not move back and forth
+        "release": sorted(
+            tenant_id
+            for tenant_id, partition in partitions.items()
+            if partition["status"] == "dedicated" and sizes.get(tenant_id, 0) < threshold // 2
+        ),
+    }
+
+
+def move(tenant_id: str) -> Dict[str, Any]:
+    """Move a tenant's chunks from the shared collection to a partition of its own"""
+    check_no_migration()
+    vector_store._init_client()
+    vector_store.refresh_routing()
+    partition = vector_store.partitions().get(tenant_id)
+    if partition and partition["status"] != "moving":
+        raise RuntimeError(f"Tenant {tenant_id} is already {partition['status']}")
+    shared = vector_store.routing()["write"]
+    if partition is None:
+        collection = partition_name(tenant_id)
+        existing = {c.name for c in vector_store.client.get_collections().collections}
+        if collection not in existing:
+            vector_store.create_collection(
+                vector_store.client, collection, shared["profile"]["dimensions"]
+            )
+        vector_store.register_profile(collection, shared["profile"])
+        # Routing needs every document's tenant before the partition exists
+        record_tenant(tenant_id, tenant_documents(tenant_id))
+        set_partition(tenant_id, collection, "moving")
+    else:
+        collection = partition["collection"]
+    logger.info(f"Moving tenant {tenant_id} from {shared['collection']} to {collection}")
+    settle()
+
+    document_ids = tenant_documents(tenant_id)
+    copied = vector_store.copy_document_points(shared["collection"], collection, document_ids)
+    set_partition(tenant_id, collection, "dedicated")
+    settle()
+    # Read again: documents whose ingest started in the shared collection
+    # were re-embedded into the partition meanwhile
+    document_ids = tenant_documents(tenant_id)
+    if not vector_store.delete_documents_chunks(document_ids, shared["collection"]):
+        logger.warning(
+            f"Tenant {tenant_id} moved, but its points are still in {shared['collection']}"
+        )
+    logger.info(f"Tenant {tenant_id} now has collection {collection} ({copied} points)")
+    return {"tenant_id": tenant_id, "collection": collection, "copied": copied}
+
+
+def release(tenant_id: str) -> Dict[str, Any]:
+    """Move a tenant's chunks back into the shared collection and drop its partition"""
+    check_no_migration()
+    vector_store._init_client()
+    vector_store.refresh_routing()
+    partition = vector_store.partitions().get(tenant_id)
+    if partition is None:
+        raise RuntimeError(f"Tenant {tenant_id} has no partition")
+    if partition["status"] == "moving":
+        raise RuntimeError(f"Tenant {tenant_id} is still moving; run move to finish it first")
+    collection = partition["collection"]
+    shared = vector_store.routing()["write"]
+    if not same_query_embedding(vector_store.profile_of(collection), shared["profile"]):
+        # Points can only be copied between collections of one embedding model
+        raise RuntimeError(
+            f"{collection} and {shared['collection']} have different embedding profiles"
+        )
+    if partition["status"] != "releasing":
+        set_partition(tenant_id, collection, "releasing")
+    logger.info(f"Releasing tenant {tenant_id} from {collection} to {shared['collection']}")
+    settle()
+
+    copied = vector_store.copy_document_points(
+        collection, shared["collection"], tenant_documents(tenant_id)
+    )
+    cache.redis.hdel(TENANT_PARTITIONS_KEY, tenant_id)
+    vector_store.refresh_routing()
+    settle()
+    vector_store.client.delete_collection(collection)
+    vector_store.forget_profile(collection)
+    logger.info(f"Tenant {tenant_id} is back in {shared['collection']} ({copied} points)")
+    return {"tenant_id": tenant_id, "collection": shared["collection"], "copied": copied}
+
+
+def rebalance() -> Dict[str, Any]:
+    """Move and release tenants as the size policy says"""
+    check_no_migration()
+    proposed = plan()
+    return {
+        "moved": [move(tenant_id) for tenant_id in proposed["move"]],
+        "released": [release(tenant_id) for tenant_id in proposed["release"]],
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Give large tenants a collection of their own")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("plan", help="chunks per tenant and the moves the policy suggests")
+    commands.add_parser("rebalance", help="carry out the plan")
+    for name, help_text in (
+        ("move", "move a tenant to a collection of its own"),
+        ("release", "move a tenant back into the shared collection"),
+    ):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("tenant_id")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        if args.command == "plan":
+            result = plan()
+        elif args.command == "rebalance":
+            result = rebalance()
+        elif args.command == "move":
+            result = move(args.tenant_id)
+        else:
+            result = release(args.tenant_id)
+    except RuntimeError as e:
+        raise SystemExit(str(e))
+    json.dump(result, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,103 @@
-from fastapi import FastAPI, Request
-from fastapi.middleware.cors import CORSMiddleware
-from app.api import documents, query, websocket
-from app.config import settings
-from app.models.document_table import Base
-from app.db.session import engine
-import os
-import logging
-import time
+from app.utils.startup import startup_report, warm_up_services
+
+with startup_report.stage("imports"):
+    from contextlib import asynccontextmanager
+    from fastapi import FastAPI, Request
+    from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.responses import JSONResponse, Response
+    from app.api import documents, profiles, query, websocket
+    from app.config import settings
+    from app.db import session as db_session
+    from app.helpers.ai_helpers import ai_helper
+    from app.helpers.minio_helpers import minio_helper
+    from app.helpers.rate_limiter import rate_limiter
+    from app.utils.cache import cache
+    from app.utils.rag_engine import rag_engine
+    from app.utils.telemetry import (
+        HTTP_REQUEST_DURATION,
+        configure_tracing,
+        metrics_payload,
+        tracer,
+    )
+    from app.utils.vector_store import vector_store
+    from prometheus_client import CONTENT_TYPE_LATEST
+    import asyncio
+    import os
+    import logging
+    import time
 
 log_level = os.getenv("LOG_LEVEL", "info").upper()
 logging.basicConfig(level=log_level)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    logging.info("Starting application")
+    configure_tracing("docuquery-api")
+
+    # Create the database tables; a database that is still starting up
+    # should not keep the API from serving health checks
+    with startup_report.stage("database"):
+        try:
+            await asyncio.wait_for(
+                asyncio.to_thread(db_session.init_db), settings.STARTUP_WARMUP_TIMEOUT
+            )
+            startup_report.services["database"] = True
+            logging.info("Database connection successful")
+        except Exception as e:
+            startup_report.services["database"] = False
+            logging.exception(f"Database connection failed: {e}")
+
+    with startup_report.stage("warmup"):
+        await warm_up_services(
+            {
+                "vector_store": vector_store.health_check,
+                "cache": cache.health_check,
+                "storage": minio_helper.health_check,
+                "ai": ai_helper.health_check,
+            },
+            timeout=settings.STARTUP_WARMUP_TIMEOUT,
+        )
+    startup_report.log()
+    yield
+    await rag_engine.drain()
+    await websocket.status_listener.stop()
+    await db_session.async_engine.dispose()
+
+
 app = FastAPI(
     title=settings.APP_NAME,
     description="Document-based Question Answering System with RAG",
+    lifespan=lifespan,
 )
 
 @app.middleware("http")
 async def add_process_time_header(request: Request, call_next):
     start_time = time.time()
-    try:
-        response = await call_next(request)
-        return response
-    except Exception as e:
-        logging.exception(f"Request failed: {e}")
-        # Re-raise to let FastAPI handle it
-        raise
-    finally:
-        process_time = time.time() - start_time
-        logging.info(f"Request processed in {process_time:.2f} seconds")
+    status_code = 500
+    with tracer.start_as_current_span(
+        "http.request", attributes={"http.method": request.method}
+    ) as span:
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+            return response
+        except Exception as e:
+            logging.exception(f"Request failed: {e}")
+            # Re-raise to let FastAPI handle it
+            raise
+        finally:
+            process_time = time.time() - start_time
+            logging.info(f"Request processed in {process_time:.2f} seconds")
+            # Label by route template so ids in paths don't explode cardinality
+            route = request.scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            span.update_name(f"{request.method} {route_path}")
+            span.set_attribute("http.route", route_path)
+            span.set_attribute("http.status_code", status_code)
+            HTTP_REQUEST_DURATION.labels(
+                request.method, route_path, str(status_code)
+            ).observe(process_time)
 
 # CORS middleware
 app.add_middleware(
@@ -40,12 +109,10 @@ app.add_middleware(
 )
 
 # Include API routers
-app.include_router(documents.router) 
+app.include_router(documents.router)
 app.include_router(query.router)
 app.include_router(websocket.router)
-
-# Create the database tables
-Base.metadata.create_all(bind=engine)
+app.include_router(profiles.router)
 
 
 @app.get("/")
@@ -59,23 +126,48 @@ async def root():
 async def health():
     return {"status": "ok"}
 
-@app.on_event("startup")
-async def startup_event():
-    logging.info("Starting application")
-    try:
-        # Test database connection
-        from app.db.session import SessionLocal
-        from sqlalchemy import text  # Add this import
-        db = SessionLocal()
-        db.execute(text("SELECT 1"))  # Use text() here
-        db.close()
-        logging.info("Database connection successful")
-    except Exception as e:
-        logging.exception(f"Database connection failed: {e}")
+@app.get("/health/ready")
+async def readiness():
+    """Report whether every backing service is reachable"""
+    checks = {
+        "database": db_session.health_check,
+        "vector_store": vector_store.health_check,
+        "cache": cache.health_check,
+        "storage": minio_helper.health_check,
+    }
+    results = await asyncio.gather(
+        *(asyncio.to_thread(check) for check in checks.values())
+    )
+    services = dict(zip(checks.keys(), results))
+    ready = all(services.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "degraded", "services": services},
+    )
+
+@app.get("/health/quota")
+async def quota_utilization():
+    """Azure OpenAI quota in use per deployment, as seen by the shared limiter"""
+    return await asyncio.to_thread(rate_limiter.utilization)
+
+@app.get("/health/startup")
+async def startup_breakdown():
+    """Time spent on each startup stage"""
+    return startup_report.as_dict()
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics for this process"""
+    return Response(metrics_payload(), media_type=CONTENT_TYPE_LATEST)
 
 
 if __name__ == "__main__":
     import uvicorn
     print("Starting Uvicorn on port 8080")
-    uvicorn.run(app, host="0.0.0.0", port=8080)
-
+    # permessage-deflate is negotiated per connection during the WebSocket handshake
+    uvicorn.run(
+        app,
+        host="0.0.0.0",
+        port=8080,
+        ws_per_message_deflate=settings.WS_PER_MESSAGE_DEFLATE,
+    )
@@ -23,6 +23,7 @@ class DocumentResponse(BaseModel):
     file_type: Optional[str]
     created_at: Optional[datetime] = None  # <-- Make this optional
     status: DocumentStatusEnum
+    tenant_id: Optional[str] = "default"
 
     class Config:
         orm_mode = True
@@ -30,4 +31,18 @@ class DocumentResponse(BaseModel):
 
 class DocumentList(BaseModel):
     documents: List[DocumentResponse]
-    total: int
+    total: Optional[int] = None
+    # True when total comes from the planner estimate rather than a count
+    total_estimated: bool = False
+    next_cursor: Optional[str] = None
+
+
+class BulkDeleteRequest(BaseModel):
+    document_ids: List[str] = Field(..., min_length=1)
+
+
+class BulkDeleteResponse(BaseModel):
+    # Tombstoned now; their data is removed in the background
+    deleted: List[str]
+    # Unknown or already deleted
+    not_found: List[str]
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, Integer, Enum
+from sqlalchemy import Column, String, DateTime, Integer, Enum, Index
 from sqlalchemy.ext.declarative import declarative_base
 import enum
 from datetime import datetime
@@ -23,3 +23,13 @@ class Document(Base):
     file_type = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
     status = Column(Enum(DocumentStatusEnum), default=DocumentStatusEnum.processing)
+    tenant_id = Column(String, default="default", server_default="default", index=True)
+    # Set when the document is deleted; its data is removed in the
+    # background and the row last. Tombstoned documents are hidden everywhere
+    deleted_at = Column(DateTime, nullable=True, index=True)
+
+    # Support keyset pagination ordered by (created_at, id), optionally by status
+    __table_args__ = (
+        Index("ix_documents_created_at_id", "created_at", "id"),
+        Index("ix_documents_status_created_at_id", "status", "created_at", "id"),
+    )
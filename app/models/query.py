@@ -0,0 +1,55 @@
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+
+
+class QueryRequest(BaseModel):
+    document_id: str
+    question: str
+    include_timings: bool = False
+
+
+class QueryResponse(BaseModel):
+    answer: str
+    execution_time: float
+    context_chunks: List[str] = []
+    # Milliseconds per stage, when requested with include_timings
+    timings: Optional[Dict[str, float]] = None
+    # Set when the request was profiled (X-Profile: 1); see GET /profiles/{id}
+    profile_id: Optional[str] = None
+
+
+class BatchQueryRequest(BaseModel):
+    document_id: str
+    questions: List[str] = Field(..., min_length=1)
+    top_k: int = Field(5, ge=1, le=50)
+
+
+class CorpusQueryRequest(BaseModel):
+    question: str
+    # Search these documents, all ready documents of the tenant, or both
+    # combined; at least one must be given
+    document_ids: Optional[List[str]] = None
+    tenant_id: Optional[str] = None
+    # How many of the best-matching documents feed the answer
+    max_documents: int = Field(8, ge=1, le=50)
+    include_timings: bool = False
+
+
+class Citation(BaseModel):
+    # The [n] marker the answer uses for this chunk
+    source: int
+    document_id: str
+    title: Optional[str] = None
+    chunk_index: Optional[int] = None
+    score: Optional[float] = None
+    text: str
+
+
+class CorpusQueryResponse(BaseModel):
+    answer: str
+    execution_time: float
+    citations: List[Citation] = []
+    # Number of documents the question was searched against
+    documents_searched: int
+    timings: Optional[Dict[str, float]] = None
+    profile_id: Optional[str] = None
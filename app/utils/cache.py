@@ -1,12 +1,35 @@
 import redis
 import json
 import hashlib
-from typing import Any, Optional, Dict
+import secrets
+from typing import Any, Optional, Dict, List
 from app.config import settings
+from app.utils.telemetry import CACHE_REQUESTS, instrument
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Pub/sub channel prefix for document status events
+DOCUMENT_EVENTS_CHANNEL = "document_events"
+
+# Deletes a lock only if it still holds the releasing owner's token
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+# Ids of documents deleted but not yet collected; queries treat them as gone
+DELETED_DOCUMENTS_KEY = "deleted_documents"
+
+# Hash of document id -> tenant id, for routing vector operations
+DOCUMENT_TENANTS_KEY = "document_tenants"
+
+# Decayed ask counts per query key, and the question behind each key
+POPULAR_QUERIES_KEY = "query_popularity"
+POPULAR_QUESTIONS_KEY = "query_popularity_questions"
+
 
 class RedisCache:
     def __init__(self):
@@ -18,6 +41,14 @@ class RedisCache:
         )
         self.default_ttl = 3600  # 1 hour
 
+    def health_check(self) -> bool:
+        """Check that Redis is reachable"""
+        try:
+            return bool(self.redis.ping())
+        except Exception as e:
+            logger.warning(f"Cache health check failed: {e}")
+            return False
+
     def _generate_key(self, key_type: str, identifier: str) -> str:
         """Generate a Redis key with a type prefix"""
         return f"{key_type}:{identifier}"
@@ -28,6 +59,7 @@ class RedisCache:
         question_hash = hashlib.md5(question.lower().strip().encode()).hexdigest()
         return self._generate_key("query", f"{document_id}:{question_hash}")
 
+    @instrument("cache.set")
     def set(
         self, key_type: str, identifier: str, data: Any, ttl: Optional[int] = None
     ) -> bool:
@@ -48,6 +80,7 @@ class RedisCache:
             logger.error(f"Error setting cache: {e}")
             return False
 
+    @instrument("cache.get")
     def get(self, key_type: str, identifier: str) -> Optional[Any]:
         """Get data from cache"""
         try:
@@ -73,16 +106,171 @@ class RedisCache:
     def cache_query(
         self, document_id: str, question: str, answer: str, ttl: Optional[int] = None
     ) -> bool:
-        """Cache a query result"""
+        """Cache a query result, for longer the more popular the question is"""
         key = self._generate_query_key(document_id, question)
-        return self.set("query_result", key, {"answer": answer}, ttl)
+        return self.set("query_result", key, {"answer": answer}, ttl or self.popularity_ttl(key))
+
+    def popularity_ttl(self, query_key: str) -> int:
+        """Answer TTL for a query key from its recent popularity"""
+        try:
+            hits = self.redis.zscore(POPULAR_QUERIES_KEY, query_key) or 0
+        except Exception as e:
+            logger.error(f"Error reading query popularity: {e}")
+            hits = 0
+        return int(
+            min(
+                settings.QUERY_CACHE_MAX_TTL,
+                settings.QUERY_CACHE_MIN_TTL * max(1.0, hits),
+            )
+        )
 
+    @instrument("cache.get")
     def get_cached_query(
         self, document_id: str, question: str
     ) -> Optional[Dict[str, str]]:
-        """Get a cached query result"""
+        """
+        Get a cached query result and count the question towards its popularity
+
+        Both happen in one pipelined round trip, so tracking adds no latency.
+        """
         key = self._generate_query_key(document_id, question)
-        return self.get("query_result", key)
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.get(self._generate_key("query_result", key))
+            pipe.zincrby(POPULAR_QUERIES_KEY, 1, key)
+            pipe.hsetnx(
+                POPULAR_QUESTIONS_KEY,
+                key,
+                json.dumps({"document_id": document_id, "question": question}),
+            )
+            data = pipe.execute()[0]
+            result = json.loads(data) if data else None
+        except Exception as e:
+            logger.error(f"Error getting from cache: {e}")
+            result = None
+        CACHE_REQUESTS.labels("query_result", "hit" if result else "miss").inc()
+        return result
+
+    def popular_queries(self, limit: int, min_hits: float) -> List[Dict[str, Any]]:
+        """
+        The most popular questions with their answer's remaining TTL.
+
+        Each entry has ``key``, ``document_id``, ``question``, ``hits`` and
+        ``ttl`` (seconds; -2 when the answer is no longer cached).
+        """
+        try:
+            ranked = self.redis.zrevrangebyscore(
+                POPULAR_QUERIES_KEY, "+inf", min_hits, start=0, num=limit, withscores=True
+            )
+            if not ranked:
+                return []
+            keys = [key for key, _ in ranked]
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.hmget(POPULAR_QUESTIONS_KEY, keys)
+            for key in keys:
+                pipe.ttl(self._generate_key("query_result", key))
+            questions, *ttls = pipe.execute()
+        except Exception as e:
+            logger.error(f"Error reading popular queries: {e}")
+            return []
+        return [
+            {"key": key, "hits": hits, "ttl": ttl, **json.loads(question)}
+            for (key, hits), question, ttl in zip(ranked, questions, ttls)
+            if question
+        ]
+
+    def forget_popular_queries(self, keys: List[str]):
+        """Stop tracking query keys, e.g. of deleted documents"""
+        if keys:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.zrem(POPULAR_QUERIES_KEY, *keys)
+            pipe.hdel(POPULAR_QUESTIONS_KEY, *keys)
+            pipe.execute()
+
+    def decay_popularity(self, factor: float, max_tracked: int):
+        """
+        Scale every popularity count by ``factor`` and keep the top ``max_tracked``.
+
+        ZUNIONSTORE with a weight rescales the whole set in one command.
+        """
+        pipe = self.redis.pipeline()
+        pipe.zunionstore(POPULAR_QUERIES_KEY, {POPULAR_QUERIES_KEY: factor})
+        pipe.zrange(POPULAR_QUERIES_KEY, 0, -max_tracked - 1)
+        pipe.zremrangebyrank(POPULAR_QUERIES_KEY, 0, -max_tracked - 1)
+        dropped = pipe.execute()[1]
+        if dropped:
+            self.redis.hdel(POPULAR_QUESTIONS_KEY, *dropped)
+        return len(dropped)
+
+    def acquire_lock(self, name: str, ttl: int) -> Optional[str]:
+        """
+        Best-effort lock that expires after ``ttl`` seconds. Returns the
+        owner token release_lock needs, or None if the lock is taken.
+        """
+        token = secrets.token_hex(16)
+        try:
+            if self.redis.set(self._generate_key("lock", name), token, nx=True, ex=ttl):
+                return token
+        except Exception as e:
+            logger.error(f"Error acquiring lock {name}: {e}")
+        return None
+
+    def release_lock(self, name: str, token: str):
+        """Release a lock unless it expired and was taken by someone else meanwhile"""
+        try:
+            if not self.redis.eval(
+                _RELEASE_LOCK_SCRIPT, 1, self._generate_key("lock", name), token
+            ):
+                logger.warning(f"Lock {name} expired before it was released")
+        except Exception as e:
+            # It still expires on its own
+            logger.error(f"Error releasing lock {name}: {e}")
+
+    def get_cached_queries(
+        self, document_id: str, questions: List[str]
+    ) -> List[Optional[Dict[str, str]]]:
+        """Cached results for many questions in one round trip, None for misses"""
+        try:
+            keys = [
+                self._generate_key(
+                    "query_result", self._generate_query_key(document_id, question)
+                )
+                for question in questions
+            ]
+            results = [json.loads(data) if data else None for data in self.redis.mget(keys)]
+        except Exception as e:
+            logger.error(f"Error getting from cache: {e}")
+            results = [None] * len(questions)
+        hits = sum(1 for result in results if result)
+        CACHE_REQUESTS.labels("query_result", "hit").inc(hits)
+        CACHE_REQUESTS.labels("query_result", "miss").inc(len(results) - hits)
+        return results
+
+    def _generate_scope_key(self, document_ids: List[str], question: str) -> str:
+        """Key for a question over a set of documents, independent of their order"""
+        scope_hash = hashlib.md5(",".join(sorted(set(document_ids))).encode()).hexdigest()
+        question_hash = hashlib.md5(question.lower().strip().encode()).hexdigest()
+        return self._generate_key("scope", f"{scope_hash}:{question_hash}")
+
+    def cache_scoped_query(
+        self,
+        document_ids: List[str],
+        question: str,
+        result: Dict[str, Any],
+        ttl: Optional[int] = None,
+    ) -> bool:
+        """Cache a corpus query result (answer and citations)"""
+        key = self._generate_scope_key(document_ids, question)
+        return self.set("query_result", key, result, ttl)
+
+    def get_cached_scoped_query(
+        self, document_ids: List[str], question: str
+    ) -> Optional[Dict[str, Any]]:
+        """Get a cached corpus query result"""
+        key = self._generate_scope_key(document_ids, question)
+        result = self.get("query_result", key)
+        CACHE_REQUESTS.labels("scoped_query_result", "hit" if result else "miss").inc()
+        return result
 
     def cache_document_chunks(
         self, document_id: str, chunks: Any, ttl: Optional[int] = None
@@ -94,22 +282,164 @@ class RedisCache:
         """Get cached document chunks"""
         return self.get("document_chunks", document_id)
 
+    def cache_document_count(
+        self, scope: str, total: int, estimated: bool, ttl: Optional[int] = None
+    ) -> bool:
+        """Cache the document total for a listing scope (a status or "all")"""
+        return self.set(
+            "document_count", scope, {"total": total, "estimated": estimated}, ttl
+        )
+
+    def get_cached_document_count(self, scope: str) -> Optional[Dict[str, Any]]:
+        """Get a cached document total"""
+        return self.get("document_count", scope)
+
+    def publish_document_event(self, document_id: str, event: Dict[str, Any]) -> bool:
+        """Publish a document status event and keep it as the latest known status"""
+        try:
+            payload = json.dumps(event)
+            pipe = self.redis.pipeline()
+            pipe.set(
+                self._generate_key("document_status", document_id),
+                payload,
+                ex=self.default_ttl,
+            )
+            pipe.publish(self._generate_key(DOCUMENT_EVENTS_CHANNEL, document_id), payload)
+            pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Error publishing document event: {e}")
+            return False
+
+    def get_document_statuses(self, document_ids: List[str]) -> Dict[str, Any]:
+        """Get the latest published status of several documents in one round trip"""
+        if not document_ids:
+            return {}
+        try:
+            keys = [self._generate_key("document_status", d) for d in document_ids]
+            values = self.redis.mget(keys)
+            return {
+                document_id: json.loads(value)
+                for document_id, value in zip(document_ids, values)
+                if value
+            }
+        except Exception as e:
+            logger.error(f"Error getting document statuses: {e}")
+            return {}
+
+    def increment_ingest_progress(self, document_id: str, amount: int) -> int:
+        """Add to the number of chunks indexed for a document and return the total"""
+        try:
+            key = self._generate_key("ingest_progress", document_id)
+            pipe = self.redis.pipeline()
+            pipe.incrby(key, amount)
+            pipe.expire(key, self.default_ttl)
+            return pipe.execute()[0]
+        except Exception as e:
+            logger.error(f"Error updating ingest progress: {e}")
+            return 0
+
     def delete_document_cache(self, document_id: str) -> bool:
         """Delete all cache entries related to a document"""
-        try:
-            # Delete document chunks
-            self.delete("document_chunks", document_id)
+        return self.delete_documents_cache([document_id])
 
-            pattern = self._generate_key("query_result", f"{document_id}:*")
-            keys = self.redis.keys(pattern)
-            if keys:
-                self.redis.delete(*keys)
+    def delete_documents_cache(self, document_ids: List[str]) -> bool:
+        """
+        Delete all cache entries related to several documents.
+
+        Per-document keys go in one pipeline. Cached answers are found with
+        a single SCAN for the whole batch rather than one per document.
+        """
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for document_id in document_ids:
+                for key_type in (
+                    "document_chunks",
+                    "document_status",
+                    "ingest_progress",
+                    "chunk_text",
+                ):
+                    pipe.delete(self._generate_key(key_type, document_id))
+            if document_ids:
+                pipe.hdel(DOCUMENT_TENANTS_KEY, *document_ids)
+            pipe.execute()
 
+            wanted = set(document_ids)
+            prefix = self._generate_key("query_result", "")
+            query_keys = []
+            batch = []
+            for key in self.redis.scan_iter(
+                match=self._generate_key("query_result", self._generate_key("query", "*")),
+                count=1000,
+            ):
+                # query_result:query:{document_id}:{question hash}
+                query_key = key[len(prefix):]
+                if query_key.split(":")[1] in wanted:
+                    query_keys.append(query_key)
+                    batch.append(key)
+                    if len(batch) >= 1000:
+                        self.redis.delete(*batch)
+                        batch = []
+            if batch:
+                self.redis.delete(*batch)
+            self.forget_popular_queries(query_keys)
             return True
         except Exception as e:
             logger.error(f"Error deleting document cache: {e}")
             return False
 
+    def mark_documents_deleted(self, document_ids: List[str]) -> bool:
+        try:
+            if document_ids:
+                self.redis.sadd(DELETED_DOCUMENTS_KEY, *document_ids)
+            return True
+        except Exception as e:
+            logger.error(f"Error marking documents deleted: {e}")
+            return False
+
+    def unmark_documents_deleted(self, document_ids: List[str]):
+        if document_ids:
+            self.redis.srem(DELETED_DOCUMENTS_KEY, *document_ids)
+
+    def is_document_deleted(self, document_id: str) -> bool:
+        try:
+            return bool(self.redis.sismember(DELETED_DOCUMENTS_KEY, document_id))
+        except Exception as e:
+            logger.error(f"Error checking whether {document_id} is deleted: {e}")
+            return False
+
+    def set_document_tenant(self, document_id: str, tenant_id: str):
+        self.redis.hset(DOCUMENT_TENANTS_KEY, document_id, tenant_id)
+
+    def get_document_tenant(self, document_id: str) -> Optional[str]:
+        return self.redis.hget(DOCUMENT_TENANTS_KEY, document_id)
+
+    def store_profile(self, profile_id: str, folded: str) -> bool:
+        """Keep a captured profile around for on-call to download"""
+        return self.set("profile", profile_id, folded, ttl=settings.PROFILE_TTL)
+
+    def get_profile(self, profile_id: str) -> Optional[str]:
+        return self.get("profile", profile_id)
+
+    def list_profiles(self, prefix: str) -> List[str]:
+        """Ids of stored profiles starting with ``prefix``"""
+        try:
+            key_prefix = self._generate_key("profile", "")
+            return sorted(
+                key[len(key_prefix):]
+                for key in self.redis.scan_iter(match=f"{key_prefix}{prefix}*")
+            )
+        except Exception as e:
+            logger.error(f"Error listing profiles: {e}")
+            return []
+
+    def request_ingest_profile(self, document_id: str) -> bool:
+        """Ask the workers to profile each ingest task of a document"""
+        return self.set("profile_request", document_id, True, ttl=settings.PROFILE_TTL)
+
+    def ingest_profile_requested(self, document_id: str) -> bool:
+        return bool(self.get("profile_request", document_id))
+
 
 # Create a singleton instance
 cache = RedisCache()
@@ -0,0 +1,85 @@
+from typing import Dict, List, Optional, Tuple
+import logging
+from app.utils.cache import cache
+from app.utils.telemetry import instrument
+
+logger = logging.getLogger(__name__)
+
+KEY_TYPE = "chunk_text"
+
+
+def chunking_of(profile: Dict) -> str:
+    """Tag of the chunking a profile produces; texts are stored per chunking"""
+    return f"{profile['chunk_size']}:{profile['chunk_overlap']}"
+
+
+class ChunkStore:
+    """
+    Chunk texts kept out of Qdrant payloads (VECTOR_SLIM_PAYLOADS).
+
+    One Redis hash per document, with a field per chunk named after the
+    chunking that produced it, so collections chunked differently during a
+    migration do not overwrite each other's texts. The texts of a search's
+    hits are fetched in one pipelined round trip. Texts that are missing,
+    e.g. evicted, are rebuilt from the pages in the document's extraction
+    artifact, re-chunked if the artifact was written for another chunking
+    (a re-embed replaces it while the old collection is still read).
+    """
+
+    def _key(self, document_id: str) -> str:
+        return cache._generate_key(KEY_TYPE, document_id)
+
+    def put(self, document_id: str, chunking: str, texts: Dict[int, str]):
+        cache.redis.hset(
+            self._key(document_id),
+            mapping={f"{chunking}:{index}": text for index, text in texts.items()},
+        )
+
+    @instrument("chunk_store.get")
+    def get_many(
+        self, chunking: str, chunks: List[Tuple[str, int]]
+    ) -> List[Optional[str]]:
+        """Texts of (document_id, chunk_index) pairs, None where unknown"""
+        by_document: Dict[str, List[int]] = {}
+        for document_id, index in chunks:
+            by_document.setdefault(document_id, []).append(index)
+        pipe = cache.redis.pipeline(transaction=False)
+        for document_id, indexes in by_document.items():
+            pipe.hmget(
+                self._key(document_id), [f"{chunking}:{index}" for index in indexes]
+            )
+        texts: Dict[Tuple[str, int], Optional[str]] = {}
+        for (document_id, indexes), found in zip(by_document.items(), pipe.execute()):
+            if any(text is None for text in found):
+                found = self._from_extraction(document_id, chunking, indexes) or found
+            texts.update(((document_id, index), text) for index, text in zip(indexes, found))
+        return [texts[chunk] for chunk in chunks]
+
+    def _from_extraction(
+        self, document_id: str, chunking: str, indexes: List[int]
+    ) -> Optional[List[Optional[str]]]:
+        """Restore a document's texts from the pages of its extraction artifact"""
+        from app.utils.document_processor import document_processor
+
+        try:
+            artifact = document_processor.load_extraction(document_id)
+        except Exception as e:
+            logger.error(f"Error reading extraction artifact of {document_id}: {e}")
+            return None
+        if artifact is None:
+            return None
+        if chunking_of(artifact.metadata) == chunking:
+            all_texts = artifact.chunk_texts()
+        else:
+            chunk_size, chunk_overlap = (int(value) for value in chunking.split(":"))
+            text = artifact.text
+            all_texts = [
+                text[start:end]
+                for start, end in document_processor.chunk_spans(text, chunk_size, chunk_overlap)
+            ]
+        self.put(document_id, chunking, dict(enumerate(all_texts)))
+        logger.info(f"Restored {len(all_texts)} chunk texts of {document_id}")
+        return [all_texts[index] if index < len(all_texts) else None for index in indexes]
+
+
+chunk_store = ChunkStore()
@@ -1,12 +1,14 @@
 import io
 import os
-from typing import List, Dict, Any, Tuple
+import time
+from typing import List, Dict, Any, Optional, Tuple
 import logging
-from PyPDF2 import PdfReader
-import docx
 from app.config import settings
 from app.helpers.minio_helpers import minio_helper
 from app.helpers.ai_helpers import ai_helper
+from app.utils.docx_text import iter_docx_blocks
+from app.utils.extraction_artifact import ExtractionArtifact
+from app.utils.telemetry import EXTRACTION_SECONDS_PER_PAGE, traced
 
 logger = logging.getLogger(__name__)
 
@@ -18,53 +20,77 @@ class DocumentProcessor:
 
     def extract_text(self, file_content: io.BytesIO, file_type: str) -> str:
         """Extract text from a document"""
+        return "".join(self.extract_pages(file_content, file_type))
+
+    def extract_pages(self, file_content: io.BytesIO, file_type: str) -> List[str]:
+        """Extract a document's text page by page; formats without pages give one"""
         if file_type == "application/pdf":
             return self._extract_from_pdf(file_content)
         elif file_type in [
             "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
             "application/msword",
         ]:
-            return self._extract_from_docx(file_content)
+            return [self._extract_from_docx(file_content)]
         elif file_type == "text/plain":
-            return file_content.read().decode("utf-8")
+            return [file_content.read().decode("utf-8")]
         else:
             raise ValueError(f"Unsupported file type: {file_type}")
 
-    def _extract_from_pdf(self, file_content: io.BytesIO) -> str:
-        """Extract text from PDF"""
+    def _extract_from_pdf(self, file_content: io.BytesIO) -> List[str]:
+        """Extract text from PDF, one string per page"""
         try:
+            from PyPDF2 import PdfReader
+
+            start = time.perf_counter()
             reader = PdfReader(file_content)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
-            return text
+            pages = [page.extract_text() + "\n" for page in reader.pages]
+            if reader.pages:
+                EXTRACTION_SECONDS_PER_PAGE.labels("pdf").observe(
+                    (time.perf_counter() - start) / len(reader.pages)
+                )
+            return pages
         except Exception as e:
             logger.error(f"Error extracting text from PDF: {e}")
             raise ValueError(f"Failed to extract text from PDF: {str(e)}")
 
     def _extract_from_docx(self, file_content: io.BytesIO) -> str:
-        """Extract text from DOCX"""
+        """Extract text from DOCX, paragraphs and table rows in document order"""
         try:
-            doc = docx.Document(file_content)
-            text = ""
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
-            return text
+            return "".join(f"{block}\n" for block in iter_docx_blocks(file_content))
         except Exception as e:
             logger.error(f"Error extracting text from DOCX: {e}")
             raise ValueError(f"Failed to extract text from DOCX: {str(e)}")
 
-    def chunk_text(self, text: str) -> List[str]:
-        """Split text into overlapping chunks"""
+    def chunk_text(
+        self,
+        text: str,
+        chunk_size: Optional[int] = None,
+        chunk_overlap: Optional[int] = None,
+    ) -> List[str]:
+        """Split text into overlapping chunks, by default of CHUNK_SIZE/CHUNK_OVERLAP"""
+        return [
+            text[start:end]
+            for start, end in self.chunk_spans(text, chunk_size, chunk_overlap)
+        ]
+
+    def chunk_spans(
+        self,
+        text: str,
+        chunk_size: Optional[int] = None,
+        chunk_overlap: Optional[int] = None,
+    ) -> List[Tuple[int, int]]:
+        """(start, end) offsets of the chunks chunk_text returns"""
         if not text:
             return []
+        chunk_size = chunk_size or self.chunk_size
+        chunk_overlap = self.chunk_overlap if chunk_overlap is None else chunk_overlap
 
-        chunks = []
+        spans = []
         start_idx = 0
 
         while start_idx < len(text):
             # Extract chunk with size chunk_size
-            end_idx = min(start_idx + self.chunk_size, len(text))
+            end_idx = min(start_idx + chunk_size, len(text))
 
             # Find the nearest end of paragraph or sentence
             if end_idx < len(text):
@@ -72,7 +98,7 @@ class DocumentProcessor:
                 paragraph_end = text.rfind("\n\n", start_idx, end_idx)
                 if (
                     paragraph_end != -1
-                    and paragraph_end > start_idx + self.chunk_size // 2
+                    and paragraph_end > start_idx + chunk_size // 2
                 ):
                     end_idx = paragraph_end + 2
                 else:
@@ -82,37 +108,106 @@ class DocumentProcessor:
                         sentence_end = text.rfind(marker, start_idx, end_idx)
                         if (
                             sentence_end != -1
-                            and sentence_end > start_idx + self.chunk_size // 2
+                            and sentence_end > start_idx + chunk_size // 2
                         ):
                             end_idx = sentence_end + len(marker)
                             break
 
-            # Extract the chunk
-            chunk = text[start_idx:end_idx].strip()
-            if chunk:
-                chunks.append(chunk)
+            # Extract the chunk, without surrounding whitespace
+            chunk = text[start_idx:end_idx]
+            stripped = chunk.lstrip()
+            if stripped:
+                chunk_start = start_idx + len(chunk) - len(stripped)
+                spans.append((chunk_start, chunk_start + len(stripped.rstrip())))
+
+            # Stepping back by the overlap from the end of the text would
+            # only produce ever-shorter copies of the last chunk
+            if end_idx >= len(text):
+                break
 
             # Move the start index for the next chunk, accounting for overlap
-            start_idx = max(start_idx + 1, end_idx - self.chunk_overlap)
+            start_idx = max(start_idx + 1, end_idx - chunk_overlap)
 
-        return chunks
+        return spans
 
-    def process_document(
-        self, document_id: str, object_name: str
-    ) -> Tuple[List[str], List[Dict]]:
-        """Process a document and return chunks with metadata"""
-        # Retrieve file info from object_name
-        file_name = object_name.split("/")[-1]
+    def extract_document(self, document_id: str, file_name: str) -> List[str]:
+        """Download and parse a stored document; returns its page texts"""
         file_type = self._get_content_type(file_name)
 
         # Get document content from MinIO
         file_content = minio_helper.get_document(document_id, file_name)
 
         # Extract text from document
-        text = self.extract_text(file_content, file_type)
+        with traced("ingest.extract_text", file_type=file_type):
+            return self.extract_pages(file_content, file_type)
+
+    def load_extraction(self, document_id: str) -> Optional[ExtractionArtifact]:
+        """The document's extraction artifact, or None if it has none"""
+        data = minio_helper.get_extraction(document_id)
+        return ExtractionArtifact.from_bytes(data) if data is not None else None
+
+    def process_document(
+        self,
+        document_id: str,
+        object_name: str,
+        profile: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[List[str], List[Dict]]:
+        """Process a document and return chunks with metadata"""
+        # Retrieve file info from object_name
+        file_name = object_name.split("/")[-1]
+        pages = self.extract_document(document_id, file_name)
+        return self.chunk_document(document_id, file_name, pages, profile)
 
+    def rechunk_document(
+        self, document_id: str, file_name: str, profile: Optional[Dict[str, Any]] = None
+    ) -> Tuple[List[str], List[Dict]]:
+        """
+        Chunk an ingested document again, e.g. for another embedding profile.
+
+        Starts from the extraction artifact; documents ingested before
+        artifacts were written are parsed once more.
+        """
+        artifact = self.load_extraction(document_id)
+        if artifact is not None:
+            pages = artifact.pages
+        else:
+            pages = self.extract_document(document_id, file_name)
+        return self.chunk_document(document_id, file_name, pages, profile)
+
+    def chunk_document(
+        self,
+        document_id: str,
+        file_name: str,
+        pages: List[str],
+        profile: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[List[str], List[Dict]]:
+        """
+        Chunk a document's pages, store the extraction artifact and build
+        the chunk metadata.
+
+        ``profile`` is the embedding profile of the collection the chunks are
+        for; its chunk size and overlap override the settings.
+        """
+        text = "".join(pages)
+        chunk_size = profile["chunk_size"] if profile else self.chunk_size
+        chunk_overlap = profile["chunk_overlap"] if profile else self.chunk_overlap
         # Split text into chunks
-        chunks = self.chunk_text(text)
+        with traced("ingest.chunk"):
+            spans = self.chunk_spans(text, chunk_size, chunk_overlap)
+            chunks = [text[start:end] for start, end in spans]
+
+        with traced("ingest.write_extraction"):
+            artifact = ExtractionArtifact.build(
+                pages,
+                spans,
+                {
+                    "document_id": document_id,
+                    "filename": file_name,
+                    "chunk_size": chunk_size,
+                    "chunk_overlap": chunk_overlap,
+                },
+            )
+            minio_helper.put_extraction(document_id, artifact.to_bytes())
 
         # Create metadata for each chunk
         metadatas = []
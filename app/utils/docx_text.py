@@ -0,0 +1,102 @@
+"""
+Text of a DOCX file, streamed from word/document.xml.
+
+python-docx builds the whole object model of a document before giving out
+any text, which for large exports with many tables costs hundreds of MB.
+Here the XML is parsed incrementally straight out of the zip, and every
+element is dropped as soon as its text has been taken, so memory stays
+bounded by the largest paragraph or table row rather than the document.
+"""
+from typing import IO, Iterator, List, Union
+import xml.etree.ElementTree as ET
+import zipfile
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_MC = "{http://schemas.openxmlformats.org/markup-compatibility/2006}"
+
+BODY = f"{_W}body"
+PARAGRAPH = f"{_W}p"
+TABLE = f"{_W}tbl"
+ROW = f"{_W}tr"
+CELL = f"{_W}tc"
+TEXT = f"{_W}t"
+TAB = f"{_W}tab"
+BREAKS = (f"{_W}br", f"{_W}cr")
+# Alternate renderings of content already given by the preferred choice
+FALLBACK = f"{_MC}Fallback"
+
+
+def _paragraph_text(paragraph: ET.Element) -> str:
+    pieces = []
+    for element in paragraph.iter():
+        if element.tag == TEXT:
+            pieces.append(element.text or "")
+        elif element.tag == TAB:
+            pieces.append("\t")
+        elif element.tag in BREAKS:
+            pieces.append("\n")
+    return "".join(pieces)
+
+
+def iter_docx_blocks(file: Union[str, IO[bytes]]) -> Iterator[str]:
+    """
+    Paragraphs and table rows of a DOCX file in document order.
+
+    A body paragraph gives one block, as python-docx's paragraph text
+    would. A table gives one block per row, its cells' text separated by
+    tabs; the paragraphs of a cell are joined by spaces, and a table nested
+    in a cell becomes part of that cell's text. Deleted revisions and
+    fallback renderings are skipped.
+    """
+    # Open tables, innermost last: each is the list of cells of its
+    # current row, each cell the list of its paragraphs and nested rows
+    tables: List[List[List[str]]] = []
+    body = None
+    fallback_depth = 0
+    with zipfile.ZipFile(file) as package:
+        with package.open("word/document.xml") as xml:
+            for event, element in ET.iterparse(xml, events=("start", "end")):
+                tag = element.tag
+                if event == "start":
+                    if tag == BODY:
+                        body = element
+                    elif tag == FALLBACK:
+                        fallback_depth += 1
+                    elif fallback_depth:
+                        continue
+                    elif tag == TABLE:
+                        tables.append([])
+                    elif tag == CELL and tables:
+                        tables[-1].append([])
+                    continue
+
+                if tag == FALLBACK:
+                    fallback_depth -= 1
+                    element.clear()
+                    continue
+                if fallback_depth:
+                    continue
+                if tag == PARAGRAPH:
+                    text = _paragraph_text(element)
+                    # Cleared so an enclosing paragraph (a text box's anchor)
+                    # does not repeat this text
+                    element.clear()
+                    if tables and tables[-1]:
+                        tables[-1][-1].append(text)
+                    else:
+                        yield text
+                elif tag == ROW and tables:
+                    row = "\t".join(" ".join(filter(None, cell)) for cell in tables[-1])
+                    tables[-1] = []
+                    element.clear()
+                    if len(tables) > 1 and tables[-2]:
+                        tables[-2][-1].append(row)
+                    else:
+                        yield row
+                elif tag == TABLE and tables:
+                    tables.pop()
+                    element.clear()
+                if body is not None and tag in (PARAGRAPH, TABLE) and not tables:
+                    # Drop finished top-level blocks; iterparse would keep
+                    # their (cleared) elements attached to the body
+                    body.clear()
@@ -0,0 +1,92 @@
+from typing import Dict, List
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PCAProjection:
+    """
+    Linear projection of full-size embeddings onto their top principal
+    components, fitted on a sample of our own corpus.
+
+    The data is not mean-centred (a truncated SVD): centring changes the
+    angles between vectors, and cosine search is what has to survive the
+    projection. Stored as an .npz with ``components`` (d, n); projected
+    vectors are re-normalized.
+    """
+
+    def __init__(self, components):
+        self.components = components
+
+    @property
+    def input_dimensions(self) -> int:
+        return self.components.shape[1]
+
+    @property
+    def dimensions(self) -> int:
+        return self.components.shape[0]
+
+    @classmethod
+    def fit(cls, vectors, dimensions: int) -> "PCAProjection":
+        """Fit on an (N, n) array of full-size embeddings"""
+        import numpy as np
+
+        data = np.asarray(vectors, dtype=np.float64)
+        if dimensions > min(data.shape):
+            raise ValueError(
+                f"Cannot fit {dimensions} components on {data.shape[0]} vectors of size {data.shape[1]}"
+            )
+        # Rows of vt are the principal directions, largest first
+        _, _, vt = np.linalg.svd(data, full_matrices=False)
+        return cls(vt[:dimensions].astype(np.float32))
+
+    def truncate(self, dimensions: int) -> "PCAProjection":
+        """The same projection keeping only the first ``dimensions`` components"""
+        return PCAProjection(self.components[:dimensions])
+
+    @classmethod
+    def load(cls, path: str) -> "PCAProjection":
+        import numpy as np
+
+        with np.load(path) as data:
+            return cls(data["components"])
+
+    def save(self, path: str):
+        import numpy as np
+
+        np.savez(path, components=self.components)
+
+    def transform(self, vectors):
+        """Project an (N, n) array; returns unit-length (N, d) float32 rows"""
+        import numpy as np
+
+        projected = np.asarray(vectors, dtype=np.float32) @ self.components.T
+        norms = np.linalg.norm(projected, axis=1, keepdims=True)
+        return projected / np.maximum(norms, 1e-12)
+
+    def project(self, embeddings: List[List[float]]) -> List[List[float]]:
+        if embeddings and len(embeddings[0]) != self.input_dimensions:
+            raise ValueError(
+                f"PCA projection expects {self.input_dimensions}-dimension embeddings, got {len(embeddings[0])}"
+            )
+        return self.transform(embeddings).tolist()
+
+
+# Loaded projections by path; a re-embedding migration may use a second one
+_projections: Dict[str, PCAProjection] = {}
+
+
+def get_projection(path: str, dimensions: int) -> PCAProjection:
+    """The projection stored at ``path``, loaded once per process"""
+    projection = _projections.get(path)
+    if projection is None:
+        projection = PCAProjection.load(path)
+        logger.info(
+            f"Loaded PCA projection {path}: {projection.input_dimensions} -> {projection.dimensions} dimensions"
+        )
+        _projections[path] = projection
+    if projection.dimensions != dimensions:
+        raise ValueError(
+            f"PCA projection {path} outputs {projection.dimensions} dimensions, expected {dimensions}"
+        )
+    return projection
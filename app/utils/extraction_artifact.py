@@ -0,0 +1,181 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import hashlib
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bumped when the layout changes; readers refuse newer versions
+FORMAT_VERSION = 1
+
+_METADATA_KEY = b"docuquery"
+
+
+def chunk_hash(text: str) -> bytes:
+    """16-byte digest identifying a chunk's text"""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+class ExtractionArtifact:
+    """
+    What ingest extracted from a document, kept so later pipelines do not
+    have to download and parse the original again.
+
+    Stored as an uncompressed Arrow IPC file holding a single row of list
+    columns: the text of every page, the chunk boundaries as offsets into
+    the concatenated page text (with the page each chunk starts on), a
+    hash of every chunk, and optionally the float32 chunk embeddings.
+    Reading from a buffer or a memory-mapped file is zero-copy; only the
+    page text is decoded into Python strings, when asked for.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.metadata: Dict[str, Any] = json.loads(
+            (table.schema.metadata or {}).get(_METADATA_KEY, b"{}")
+        )
+        if self.metadata.get("version", FORMAT_VERSION) > FORMAT_VERSION:
+            raise ValueError(
+                f"Extraction artifact version {self.metadata['version']} is newer than {FORMAT_VERSION}"
+            )
+
+    @classmethod
+    def build(
+        cls,
+        pages: Sequence[str],
+        spans: Sequence[Tuple[int, int]],
+        metadata: Dict[str, Any],
+        embeddings=None,
+    ) -> "ExtractionArtifact":
+        """
+        Build from page texts and chunk ``spans``, (start, end) offsets into
+        ``"".join(pages)``. ``embeddings`` is an optional (chunks, d) array.
+        """
+        import numpy as np
+        import pyarrow as pa
+
+        text = "".join(pages)
+        starts = np.fromiter((start for start, _ in spans), dtype=np.int64, count=len(spans))
+        ends = np.fromiter((end for _, end in spans), dtype=np.int64, count=len(spans))
+        page_starts = np.cumsum([0] + [len(page) for page in pages[:-1]], dtype=np.int64)
+        chunk_pages = (np.searchsorted(page_starts, starts, side="right") - 1).astype(np.int32)
+        hashes = [chunk_hash(text[start:end]) for start, end in spans]
+
+        columns = {
+            "pages": pa.array([list(pages)], type=pa.list_(pa.large_string())),
+            "chunk_start": pa.array([starts], type=pa.list_(pa.int64())),
+            "chunk_end": pa.array([ends], type=pa.list_(pa.int64())),
+            "chunk_page": pa.array([chunk_pages], type=pa.list_(pa.int32())),
+            "chunk_hash": pa.array([hashes], type=pa.list_(pa.binary(16))),
+        }
+        if embeddings is not None:
+            columns["embedding"] = cls._embedding_column(embeddings, len(spans))
+        table = pa.table(
+            columns,
+            metadata={
+                _METADATA_KEY: json.dumps({**metadata, "version": FORMAT_VERSION})
+            },
+        )
+        return cls(table)
+
+    @staticmethod
+    def _embedding_column(embeddings, chunks: int):
+        import numpy as np
+        import pyarrow as pa
+
+        vectors = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if vectors.ndim != 2 or vectors.shape[0] != chunks:
+            raise ValueError(
+                f"Expected {chunks} embeddings, got an array of shape {vectors.shape}"
+            )
+        dimensions = vectors.shape[1]
+        rows = pa.FixedSizeListArray.from_arrays(pa.array(vectors.reshape(-1)), dimensions)
+        return pa.ListArray.from_arrays(pa.array([0, chunks], type=pa.int32()), rows)
+
+    def with_embeddings(self, embeddings, profile: Dict[str, Any]) -> "ExtractionArtifact":
+        """The same artifact with ``embeddings`` made with ``profile`` attached"""
+        import pyarrow as pa
+
+        table = self.table
+        if "embedding" in table.column_names:
+            table = table.drop_columns(["embedding"])
+        table = table.append_column(
+            "embedding", pa.chunked_array([self._embedding_column(embeddings, len(self))])
+        )
+        metadata = {**self.metadata, "embedding_profile": profile}
+        return ExtractionArtifact(
+            table.replace_schema_metadata({_METADATA_KEY: json.dumps(metadata)})
+        )
+
+    def to_bytes(self) -> bytes:
+        import pyarrow as pa
+
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_file(sink, self.table.schema) as writer:
+            writer.write_table(self.table)
+        return sink.getvalue().to_pybytes()
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "ExtractionArtifact":
+        """Read without copying; the columns keep referencing ``data``"""
+        import pyarrow as pa
+
+        return cls(pa.ipc.open_file(pa.BufferReader(data)).read_all())
+
+    @classmethod
+    def open(cls, path: str) -> "ExtractionArtifact":
+        """Memory-map a local copy; pages are only read when touched"""
+        import pyarrow as pa
+
+        return cls(pa.ipc.open_file(pa.memory_map(path, "r")).read_all())
+
+    def _values(self, column: str):
+        """The single row's list values, as an Arrow array sharing the file's buffers"""
+        return self.table.column(column).chunk(0).flatten()
+
+    def __len__(self) -> int:
+        return len(self._values("chunk_start"))
+
+    @property
+    def pages(self) -> List[str]:
+        return self._values("pages").to_pylist()
+
+    @property
+    def text(self) -> str:
+        return "".join(self.pages)
+
+    @property
+    def chunk_starts(self):
+        return self._values("chunk_start").to_numpy(zero_copy_only=True)
+
+    @property
+    def chunk_ends(self):
+        return self._values("chunk_end").to_numpy(zero_copy_only=True)
+
+    @property
+    def chunk_pages(self):
+        """Index into ``pages`` of the page each chunk starts on"""
+        return self._values("chunk_page").to_numpy(zero_copy_only=True)
+
+    @property
+    def chunk_hashes(self) -> List[bytes]:
+        return self._values("chunk_hash").to_pylist()
+
+    @property
+    def embeddings(self):
+        """(chunks, d) float32 array backed by the file, or None"""
+        if "embedding" not in self.table.column_names:
+            return None
+        rows = self._values("embedding")
+        return rows.flatten().to_numpy(zero_copy_only=True).reshape(len(rows), -1)
+
+    def chunk_texts(self, text: Optional[str] = None) -> List[str]:
+        text = self.text if text is None else text
+        return [
+            text[start:end]
+            for start, end in zip(self.chunk_starts.tolist(), self.chunk_ends.tolist())
+        ]
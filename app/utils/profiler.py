@@ -0,0 +1,93 @@
+import os
+import sys
+import time
+import uuid
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterator, Optional
+from app.config import settings
+from app.utils.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of one thread from a background thread.
+
+    The result is in folded-stack format ("outer;inner;leaf count" per line),
+    which flamegraph.pl, speedscope and inferno read directly. Profiling an
+    event-loop thread also captures whatever else the loop ran meanwhile.
+    """
+
+    def __init__(
+        self,
+        thread_id: Optional[int] = None,
+        interval: float = settings.PROFILER_INTERVAL,
+        max_seconds: float = settings.PROFILER_MAX_SECONDS,
+    ):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> str:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.folded()
+
+    def _run(self):
+        deadline = time.monotonic() + self.max_seconds
+        while not self._stop.wait(self.interval):
+            if time.monotonic() > deadline:
+                logger.warning(f"Profiler stopped after {self.max_seconds}s limit")
+                break
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                break
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(
+                    f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                )
+                frame = frame.f_back
+            self.samples[";".join(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common())
+
+
+@contextmanager
+def profiled(
+    label: str, enabled: bool = True, profile_id: Optional[str] = None
+) -> Iterator[Optional[str]]:
+    """
+    Profile the block if enabled and store the result for GET /profiles/{id}.
+
+    Yields the profile id (``profile_id`` if given, else a random one based
+    on ``label``), or None when profiling is off.
+    """
+    if not (enabled and settings.PROFILING_ENABLED):
+        yield None
+        return
+    profile_id = profile_id or f"{label}-{uuid.uuid4().hex[:12]}"
+    profiler = SamplingProfiler()
+    profiler.start()
+    try:
+        yield profile_id
+    finally:
+        folded = profiler.stop()
+        cache.store_profile(profile_id, folded)
+        logger.info(
+            f"Stored profile {profile_id} ({sum(profiler.samples.values())} samples)"
+        )
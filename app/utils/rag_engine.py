@@ -1,139 +1,676 @@
-from typing import List, Dict, Any, Tuple, Optional, AsyncGenerator
+from typing import List, Dict, Any, Tuple, Optional, AsyncGenerator, Callable, Set
+import asyncio
 import time
-from app.utils.vector_store import vector_store
+from app.config import settings
+from app.utils.vector_store import same_query_embedding, vector_store
 from app.helpers.ai_helpers import ai_helper
+from app.helpers.rate_limiter import BATCH
 from app.utils.cache import cache
+from app.utils.document_processor import document_processor
+from app.utils.reranker import reranker
+from app.utils.telemetry import CONTEXT_CHUNKS, OperationSpan, instrument, traced
+from app.utils.timing import StageTimings
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Same cap the whole-document scroll in the vector store uses
+MAX_FALLBACK_CHUNKS = 1000
+
+NO_ANSWER = "I don't have enough information to answer this question."
+
 
 class RAGEngine:
+    """
+    Answers questions as a small graph of overlapping stages.
+
+    With RAG_SPECULATIVE_EMBEDDING (off by default) the question embedding
+    starts alongside the cache lookup and is cancelled on a hit; otherwise
+    it starts after a miss. Search and the whole-document fallback race once
+    search is slow. Search over-fetches candidates and the reranker keeps
+    only those worth prompting with. Answers are cached in the background
+    after they are returned. Every stage has its own timeout; an embedding
+    or search that times out falls back to the whole document instead of
+    failing the query.
+    """
+
     def __init__(self):
+        self._background: Set[asyncio.Task] = set()
         logger.info("RAGEngine initialized.")
 
-    async def process_query(
-        self, document_id: str, question: str
-    ) -> Tuple[str, float, List[str]]:
+    async def _in_thread(
+        self, timings: StageTimings, stage: str, timeout: float, func: Callable, *args
+    ) -> Any:
+        """Run a blocking stage off the event loop under its timeout"""
+        with timings.stage(stage):
+            return await asyncio.wait_for(asyncio.to_thread(func, *args), timeout)
+
+    def _discard(self, task: asyncio.Task):
+        """Cancel a speculative stage whose result is no longer needed"""
+        if not task.cancel() and not task.cancelled():
+            # Already finished; retrieve a failure so it is not reported as unhandled
+            task.exception()
+
+    async def _embed(
+        self, question: str, timings: StageTimings, route: Optional[Dict] = None
+    ) -> List[float]:
+        """Embed the question for ``route``, by default the shared collection searched first"""
+        route = route or vector_store.read_routes()[0]
+        with timings.stage("embed"):
+            return await ai_helper.generate_embedding(question, profile=route["profile"])
+
+    async def _search(
+        self,
+        question: str,
+        question_embedding: List[float],
+        document_id: str,
+        limit: int,
+        timings: StageTimings,
+    ) -> Dict:
         """
-        Process a query using RAG and return the answer, execution time, and relevant context chunks
+        Search the collections the vector store routes reads to, in order.
+
+        Normally there is just one. While a re-embedding migration cuts over,
+        documents it has not reached yet only exist in the old collection,
+        which may need its own question embedding. The same goes for a
+        tenant being moved to or from a partition of its own.
         """
-        logger.info(
-            f"Processing query for document_id={document_id}, question='{question}'"
-        )
-        start_time = time.time()
+        routes = vector_store.read_routes(document_id)
+        search_results = {"documents": [], "metadatas": [], "distances": []}
+        for index, route in enumerate(routes):
+            if index and not same_query_embedding(route["profile"], routes[0]["profile"]):
+                question_embedding = await asyncio.wait_for(
+                    self._embed(question, timings, route), settings.RAG_EMBED_TIMEOUT
+                )
+            search_results = await self._in_thread(
+                timings,
+                "search",
+                settings.RAG_SEARCH_TIMEOUT,
+                vector_store.search_chunks,
+                question_embedding,
+                document_id,
+                limit,
+                route["collection"],
+            )
+            if search_results["documents"]:
+                break
+        return search_results
+
+    def _candidates(self, top_k: int) -> int:
+        """How many chunks to fetch so the reranker has room to choose"""
+        return max(top_k, settings.RERANK_CANDIDATES) if settings.RERANK_ENABLED else top_k
 
-        # Check cache first
-        cached_result = cache.get_cached_query(document_id, question)
+    async def _rerank(
+        self, question: str, search_results: Dict, top_k: int, timings: StageTimings
+    ) -> Dict:
+        """Keep the candidates that matter, at most min(top_k, RERANK_MAX_CHUNKS)"""
+        if not settings.RERANK_ENABLED or not search_results["documents"]:
+            return search_results
+        max_chunks = min(top_k, settings.RERANK_MAX_CHUNKS)
+        if not reranker.uses_model:
+            # Lexical scoring is a few milliseconds of pure Python; a thread
+            # would not run it any sooner under the GIL
+            with timings.stage("rerank"):
+                return reranker.rerank(question, search_results, max_chunks)
+        try:
+            return await self._in_thread(
+                timings,
+                "rerank",
+                settings.RAG_RERANK_TIMEOUT,
+                reranker.rerank,
+                question,
+                search_results,
+                max_chunks,
+            )
+        except asyncio.TimeoutError:
+            logger.warning("Reranking timed out; using the search order")
+            return {key: values[:max_chunks] for key, values in search_results.items()}
+
+    def _load_document_chunks(self, document_id: str) -> List[str]:
+        """
+        Every chunk of a document: from the ingest-time cache if it is still
+        there, else from the extraction artifact, else from the vector store
+        """
+        chunks = cache.get_cached_document_chunks(document_id)
+        if chunks:
+            return chunks[:MAX_FALLBACK_CHUNKS]
+        try:
+            artifact = document_processor.load_extraction(document_id)
+            if artifact is not None and len(artifact):
+                chunks = artifact.chunk_texts()[:MAX_FALLBACK_CHUNKS]
+                cache.cache_document_chunks(document_id, chunks)
+                return chunks
+        except Exception as e:
+            logger.error(f"Error reading extraction artifact of {document_id}: {e}")
+        for route in vector_store.read_routes(document_id):
+            chunks = vector_store.search_chunks_via_document_id(
+                document_id, route["collection"]
+            )["documents"]
+            if chunks:
+                break
+        return chunks
+
+    async def _search_context(
+        self,
+        document_id: str,
+        question: str,
+        question_embedding: Optional[List[float]],
+        top_k: int,
+        timings: StageTimings,
+    ) -> List[str]:
+        """Chunks most similar to the question, or the whole document as a fallback"""
+
+        def load_fallback() -> asyncio.Task:
+            return asyncio.create_task(
+                self._in_thread(
+                    timings,
+                    "fallback_context",
+                    settings.RAG_SEARCH_TIMEOUT,
+                    self._load_document_chunks,
+                    document_id,
+                )
+            )
+
+        fallback = None
+        if question_embedding is not None:
+            search = asyncio.create_task(
+                self._search(
+                    question,
+                    question_embedding,
+                    document_id,
+                    self._candidates(top_k),
+                    timings,
+                )
+            )
+            done, _ = await asyncio.wait(
+                {search}, timeout=settings.RAG_FALLBACK_PREFETCH_AFTER
+            )
+            if not done:
+                # Search is slow; start loading the fallback so a timeout or
+                # an empty result does not cost another round trip
+                fallback = load_fallback()
+            try:
+                try:
+                    search_results = await search
+                except asyncio.TimeoutError:
+                    logger.warning(f"Vector search timed out for document_id={document_id}")
+                    search_results = {"documents": [], "metadatas": [], "distances": []}
+                if search_results["documents"] and search_results["documents"][0]:
+                    context_chunks = (
+                        await self._rerank(question, search_results, top_k, timings)
+                    )["documents"]
+                    if fallback is not None:
+                        self._discard(fallback)
+                    return context_chunks
+            except BaseException:
+                # A failed or cancelled query must not leave the fallback loading
+                if fallback is not None:
+                    self._discard(fallback)
+                raise
+
+        logger.warning(f"No relevant information found for document_id={document_id}")
+        logger.warning("Falling back to entire document.....")
+        if fallback is None:
+            fallback = load_fallback()
+        try:
+            return await fallback
+        except asyncio.TimeoutError:
+            logger.error(
+                f"Loading the whole document timed out for document_id={document_id}"
+            )
+            return []
+
+    async def _retrieve(
+        self, document_id: str, question: str, top_k: int, timings: StageTimings
+    ) -> Tuple[Optional[str], List[str]]:
+        """Return (cached answer, []) on a cache hit, else (None, context chunks)"""
+        # The embedding is only needed on a miss; starting it now, when
+        # RAG_SPECULATIVE_EMBEDDING is on, hides its latency behind the lookup
+        embedding = None
+        route = vector_store.read_routes(document_id)[0]
+        if settings.RAG_SPECULATIVE_EMBEDDING:
+            embedding = asyncio.create_task(self._embed(question, timings, route))
+            # Let the request go out before blocking on Redis. The lookup
+            # stays on the loop: it is sub-millisecond, and a thread hop
+            # would cost more than that in GIL hand-offs
+            await asyncio.sleep(0)
+        with timings.stage("cache_lookup"):
+            cached_result = cache.get_cached_query(document_id, question)
         if cached_result:
+            if embedding is not None:
+                self._discard(embedding)
             logger.info(f"Cache hit for query {document_id}:{question}")
-            end_time = time.time()
-            execution_time = end_time - start_time
             logger.debug(f"Returning cached answer: {cached_result['answer']}")
-            return cached_result["answer"], execution_time, []
+            return cached_result["answer"], []
 
-        # Generate embedding for the question
-        logger.debug(f"Generating embedding for question: '{question}'")
-        question_embedding = await ai_helper.generate_embedding(question)
-        logger.debug(f"Generated embedding for question: {question_embedding}")
+        if embedding is None:
+            embedding = asyncio.create_task(self._embed(question, timings, route))
+        try:
+            question_embedding = await asyncio.wait_for(
+                embedding, settings.RAG_EMBED_TIMEOUT
+            )
+            logger.debug(f"Generated embedding for question: {question_embedding}")
+        except asyncio.TimeoutError:
+            logger.warning("Question embedding timed out; using the whole document")
+            question_embedding = None
 
-        # Search for relevant chunks
         logger.debug(
             f"Searching for relevant chunks in vector store for document_id={document_id}"
         )
-        search_results = vector_store.search_chunks(
-            query_embedding=question_embedding, document_id=document_id, top_k=5
+        context_chunks = await self._search_context(
+            document_id, question, question_embedding, top_k, timings
         )
-        logger.debug(f"Search results: {search_results}")
+        CONTEXT_CHUNKS.observe(len(context_chunks))
+        logger.debug(f"Context chunks: {context_chunks}")
+        return None, context_chunks
 
-        if not search_results["documents"] or not search_results["documents"][0]:
-            logger.warning(
-                f"No relevant information found for document_id={document_id}, question='{question}'"
-            )
-            logger.warning("Falling back to entire document.....")
-            search_results = vector_store.search_chunks_via_document_id(document_id)
+    def _in_background(self, func: Callable):
+        """Run a blocking write in a thread without holding up the response"""
+        task = asyncio.create_task(asyncio.to_thread(func))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def _cache_in_background(self, document_id: str, question: str, answer: str):
+        """Store the answer without holding up the response"""
+
+        def write():
+            with traced("rag.cache_write"):
+                cache.cache_query(document_id, question, answer)
+
+        self._in_background(write)
+
+    async def drain(self):
+        """Wait for pending background cache writes, e.g. at shutdown"""
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+
+    @instrument("rag.process_query")
+    async def process_query(
+        self, document_id: str, question: str, timings: Optional[StageTimings] = None
+    ) -> Tuple[str, float, List[str]]:
+        """
+        Process a query using RAG and return the answer, execution time, and relevant context chunks
+
+        Time spent in each stage is recorded in ``timings`` when given.
+        """
+        logger.info(
+            f"Processing query for document_id={document_id}, question='{question}'"
+        )
+        start_time = time.time()
+        timings = timings if timings is not None else StageTimings()
+
+        cached_answer, context_chunks = await self._retrieve(
+            document_id, question, top_k=5, timings=timings
+        )
+        if cached_answer is not None:
+            timings.log(f"query {document_id}")
+            return cached_answer, time.time() - start_time, []
 
         # Construct context from retrieved chunks
-        context_chunks = search_results["documents"]
-        logger.debug(f"Context chunks: {context_chunks}")
-        context = "\n\n".join(context_chunks)
+        with timings.stage("context_build"):
+            context = "\n\n".join(context_chunks)
 
         # Generate answer
         logger.debug(f"Generating answer for question: '{question}' with context.")
-        answer = await ai_helper.generate_answer(question, context)
+        with timings.stage("llm_total"):
+            answer = await asyncio.wait_for(
+                ai_helper.generate_answer(question, context), settings.RAG_LLM_TIMEOUT
+            )
         logger.info(f"Generated answer: {answer}")
 
         # Cache the result
         logger.debug(
             f"Caching result for document_id={document_id}, question='{question}'"
         )
-        cache.cache_query(document_id, question, answer)
+        self._cache_in_background(document_id, question, answer)
 
-        end_time = time.time()
-        execution_time = end_time - start_time
+        execution_time = time.time() - start_time
         logger.info(f"Query processed in {execution_time:.2f} seconds.")
+        timings.log(f"query {document_id}")
 
         return answer, execution_time, context_chunks
 
-    async def process_query_stream(
-        self, document_id: str, question: str
-    ) -> AsyncGenerator[Tuple[str, Optional[List[str]]], None]:
+    def _build_cited_context(
+        self, search_results: Dict, titles: Dict[str, str]
+    ) -> Tuple[str, List[Dict[str, Any]]]:
+        """Number each retrieved chunk so the answer can cite it as [n]"""
+        citations = []
+        sections = [
+            "Excerpts are numbered; cite the ones the answer relies on as [n]."
+        ]
+        for text, metadata, score in zip(
+            search_results["documents"],
+            search_results["metadatas"],
+            search_results["distances"],
+        ):
+            source = len(citations) + 1
+            document_id = metadata["document_id"]
+            title = titles.get(document_id)
+            citations.append(
+                {
+                    "source": source,
+                    "document_id": document_id,
+                    "title": title,
+                    "chunk_index": metadata.get("chunk_index"),
+                    "score": score,
+                    "text": text,
+                }
+            )
+            sections.append(f"[{source}] {title or document_id}:\n{text}")
+        return "\n\n".join(sections), citations
+
+    @instrument("rag.process_corpus_query")
+    async def process_corpus_query(
+        self,
+        document_ids: List[str],
+        question: str,
+        titles: Optional[Dict[str, str]] = None,
+        max_documents: int = 8,
+        timings: Optional[StageTimings] = None,
+    ) -> Tuple[str, float, List[Dict[str, Any]]]:
         """
-        Process a query using RAG and stream the answer tokens
+        Answer a question over several documents with one embedding and one search
+
+        Returns the answer, execution time and citations. The question is
+        searched once across all ``document_ids`` with results grouped per
+        document, and the answer is cached for exactly this set of documents.
         """
         logger.info(
-            f"Processing streaming query for document_id={document_id}, question='{question}'"
+            f"Processing corpus query over {len(document_ids)} documents, question='{question}'"
         )
-        # Check cache first
-        cached_result = cache.get_cached_query(document_id, question)
+        start_time = time.time()
+        timings = timings if timings is not None else StageTimings()
+        titles = titles or {}
+
+        with timings.stage("cache_lookup"):
+            cached_result = cache.get_cached_scoped_query(document_ids, question)
         if cached_result:
-            logger.info(f"Cache hit for streaming query {document_id}:{question}")
-            logger.debug(f"Yielding cached answer: {cached_result['answer']}")
-            yield cached_result["answer"], []
-            return
+            logger.info(f"Cache hit for corpus query: {question}")
+            timings.log("corpus query")
+            return (
+                cached_result["answer"],
+                time.time() - start_time,
+                cached_result["citations"],
+            )
+
+        search_results = await self._search_corpus(
+            question, document_ids, max_documents, timings
+        )
 
-        # Generate embedding for the question
-        logger.debug(f"Generating embedding for question: '{question}'")
-        question_embedding = await ai_helper.generate_embedding(question)
-        logger.debug(f"Generated embedding for question: {question_embedding}")
+        with timings.stage("context_build"):
+            context, citations = self._build_cited_context(search_results, titles)
 
-        # Search for relevant chunks
-        logger.debug(
-            f"Searching for relevant chunks in vector store for document_id={document_id}"
+        if not citations:
+            # Nothing in scope resembles the question; a whole-corpus
+            # fallback would not fit in the prompt
+            logger.warning(f"No relevant chunks found across {len(document_ids)} documents")
+            answer = NO_ANSWER
+        else:
+            with timings.stage("llm_total"):
+                answer = await asyncio.wait_for(
+                    ai_helper.generate_answer(question, context), settings.RAG_LLM_TIMEOUT
+                )
+            logger.info(f"Generated answer: {answer}")
+
+            def write():
+                with traced("rag.cache_write"):
+                    cache.cache_scoped_query(
+                        document_ids, question, {"answer": answer, "citations": citations}
+                    )
+
+            self._in_background(write)
+
+        execution_time = time.time() - start_time
+        logger.info(f"Corpus query processed in {execution_time:.2f} seconds.")
+        timings.log("corpus query")
+        return answer, execution_time, citations
+
+    async def _search_corpus(
+        self,
+        question: str,
+        document_ids: List[str],
+        max_documents: int,
+        timings: StageTimings,
+    ) -> Dict:
+        """
+        Grouped search over documents that may live in several partitions.
+
+        Each partition is searched concurrently for its own documents, and
+        the groups are merged best first.
+        """
+        partitions = vector_store.partition_documents(document_ids)
+        embeddings: List[Tuple[Dict, List[float]]] = []
+        for route, _ in partitions:
+            embedding = next(
+                (
+                    embedding
+                    for profile, embedding in embeddings
+                    if same_query_embedding(profile, route["profile"])
+                ),
+                None,
+            )
+            if embedding is None:
+                embedding = await asyncio.wait_for(
+                    self._embed(question, timings, route), settings.RAG_EMBED_TIMEOUT
+                )
+            embeddings.append((route["profile"], embedding))
+        results = await asyncio.gather(
+            *(
+                self._in_thread(
+                    timings,
+                    "search",
+                    settings.RAG_SEARCH_TIMEOUT,
+                    vector_store.search_chunks_grouped,
+                    embedding,
+                    partition_ids,
+                    max_documents,
+                    settings.RAG_CORPUS_CHUNKS_PER_DOCUMENT,
+                    route["collection"],
+                )
+                for (route, partition_ids), (_, embedding) in zip(partitions, embeddings)
+            )
         )
-        search_results = vector_store.search_chunks(
-            query_embedding=question_embedding, document_id=document_id, top_k=50
+        if len(results) == 1:
+            return results[0]
+        groups: Dict[str, List[int]] = {}
+        hits = []
+        for result in results:
+            for text, metadata, distance in zip(
+                result["documents"], result["metadatas"], result["distances"]
+            ):
+                groups.setdefault(metadata["document_id"], []).append(len(hits))
+                hits.append((text, metadata, distance))
+        # Groups come best hit first, so a group ranks by its first hit
+        ranked = sorted(groups.values(), key=lambda group: hits[group[0]][2], reverse=True)
+        merged = [hits[index] for group in ranked[:max_documents] for index in group]
+        return {
+            "documents": [hit[0] for hit in merged],
+            "metadatas": [hit[1] for hit in merged],
+            "distances": [hit[2] for hit in merged],
+        }
+
+    async def process_query_batch(
+        self,
+        document_id: str,
+        questions: List[str],
+        top_k: int = 5,
+        timings: Optional[StageTimings] = None,
+        use_cache: bool = True,
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Answer many questions about one document, yielding results as they finish
+
+        Cached answers come first from a single multi-get. The misses are
+        embedded in one request and searched in one batch request, then
+        answered with at most RAG_BATCH_LLM_CONCURRENCY chat calls in flight.
+        Each result carries the question's ``index`` in ``questions``.
+        With ``use_cache`` off every question is answered afresh, which
+        refreshes cached answers.
+
+        Model calls use the batch priority, so they wait for quota behind
+        interactive traffic instead of timing out like interactive stages.
+        """
+        logger.info(
+            f"Processing batch of {len(questions)} questions for document_id={document_id}"
         )
-        logger.debug(f"Search results: {search_results}")
+        timings = timings if timings is not None else StageTimings()
 
-        if not search_results["documents"] or not search_results["documents"][0]:
-            logger.warning(
-                f"No relevant information found for document_id={document_id}, question='{question}'"
+        with timings.stage("cache_lookup"):
+            cached = (
+                cache.get_cached_queries(document_id, questions)
+                if use_cache
+                else [None] * len(questions)
             )
-            logger.warning("Falling back to entire document.....")
-            search_results = vector_store.search_chunks_via_document_id(document_id)
+        misses = []
+        for index, (question, result) in enumerate(zip(questions, cached)):
+            if result:
+                yield {
+                    "index": index,
+                    "question": question,
+                    "answer": result["answer"],
+                    "cached": True,
+                }
+            else:
+                misses.append(index)
+        logger.info(f"Batch cache hits: {len(questions) - len(misses)}/{len(questions)}")
+        if not misses:
+            timings.log(f"batch query {document_id}")
+            return
 
-        # Construct context from retrieved chunks
-        context_chunks = search_results["documents"]
-        context = "\n\n".join(context_chunks)
-        logger.debug(f"Context: {context}")
-
-        # Generate and stream the answer
-        logger.debug(f"Streaming answer for question: '{question}' with context.")
-        full_answer = ""
-        async for token in ai_helper.generate_answer_stream(question, context):
-            full_answer += token
-            logger.debug(f"Streaming token: {token}")
-            yield token, None
-
-        # Cache the complete answer
-        logger.debug(
-            f"Caching streamed result for document_id={document_id}, question='{question}'"
+        route = vector_store.read_routes(document_id)[0]
+        with timings.stage("embed"):
+            embeddings = await ai_helper.generate_embeddings(
+                [questions[index] for index in misses],
+                priority=BATCH,
+                profile=route["profile"],
+            )
+        search_results = await self._in_thread(
+            timings,
+            "search",
+            settings.RAG_SEARCH_TIMEOUT,
+            vector_store.search_chunks_batch,
+            embeddings,
+            document_id,
+            self._candidates(top_k),
+            route["collection"],
         )
-        cache.cache_query(document_id, question, full_answer)
+
+        fallback: Optional[asyncio.Task] = None
+        semaphore = asyncio.Semaphore(settings.RAG_BATCH_LLM_CONCURRENCY)
+
+        async def answer(index: int, result: Dict) -> Dict[str, Any]:
+            nonlocal fallback
+            question = questions[index]
+            try:
+                context_chunks = (
+                    await self._rerank(question, result, top_k, timings)
+                )["documents"]
+                if not (context_chunks and context_chunks[0]):
+                    # Loaded once and shared by every question without matches
+                    if fallback is None:
+                        fallback = asyncio.create_task(
+                            asyncio.to_thread(self._load_document_chunks, document_id)
+                        )
+                    context_chunks = await fallback
+                CONTEXT_CHUNKS.observe(len(context_chunks))
+                async with semaphore:
+                    text = await ai_helper.generate_answer(
+                        question, "\n\n".join(context_chunks), priority=BATCH
+                    )
+                self._cache_in_background(document_id, question, text)
+                return {
+                    "index": index,
+                    "question": question,
+                    "answer": text,
+                    "cached": False,
+                    "context_chunks": context_chunks,
+                }
+            except Exception as e:
+                logger.error(f"Batch question {index} failed: {e}")
+                return {"index": index, "question": question, "error": str(e)}
+
+        llm_start = time.perf_counter()
+        tasks = [
+            asyncio.create_task(answer(index, result))
+            for index, result in zip(misses, search_results)
+        ]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield await finished
+        finally:
+            # The client went away; stop generating answers nobody will read
+            for task in tasks:
+                task.cancel()
+        timings.record("llm_total", time.perf_counter() - llm_start)
+        timings.log(f"batch query {document_id}")
+
+    async def process_query_stream(
+        self, document_id: str, question: str, timings: Optional[StageTimings] = None
+    ) -> AsyncGenerator[Tuple[str, Optional[List[str]]], None]:
+        """
+        Process a query using RAG and stream the answer tokens
+
+        Time spent in each stage is recorded in ``timings`` when given.
+        """
         logger.info(
-            f"Streaming query processed and cached for document_id={document_id}, question='{question}'"
+            f"Processing streaming query for document_id={document_id}, question='{question}'"
         )
+        op = OperationSpan("rag.process_query_stream")
+        timings = timings if timings is not None else StageTimings()
+        try:
+            with op.activate():
+                cached_answer, context_chunks = await self._retrieve(
+                    document_id, question, top_k=50, timings=timings
+                )
+            if cached_answer is not None:
+                yield cached_answer, []
+                return
+
+            # Construct context from retrieved chunks
+            with op.activate(), timings.stage("context_build"):
+                context = "\n\n".join(context_chunks)
+                logger.debug(f"Context: {context}")
+
+            # Generate and stream the answer
+            logger.debug(f"Streaming answer for question: '{question}' with context.")
+            full_answer = ""
+            # Measured by hand because the stage spans the yields to the consumer
+            llm_start = time.perf_counter()
+            tokens = ai_helper.generate_answer_stream(question, context)
+            while True:
+                # The first token gets the whole LLM budget; after that the
+                # stream only has to keep moving
+                timeout = (
+                    settings.RAG_LLM_TIMEOUT
+                    if not full_answer
+                    else settings.RAG_STREAM_IDLE_TIMEOUT
+                )
+                try:
+                    token = await asyncio.wait_for(tokens.__anext__(), timeout)
+                except StopAsyncIteration:
+                    break
+                if not full_answer:
+                    timings.record("llm_ttft", time.perf_counter() - llm_start)
+                full_answer += token
+                logger.debug(f"Streaming token: {token}")
+                yield token, None
+            timings.record("llm_total", time.perf_counter() - llm_start)
+
+            # Cache the complete answer
+            logger.debug(
+                f"Caching streamed result for document_id={document_id}, question='{question}'"
+            )
+            with op.activate():
+                self._cache_in_background(document_id, question, full_answer)
+            logger.info(
+                f"Streaming query processed for document_id={document_id}, question='{question}'"
+            )
+            timings.log(f"streaming query {document_id}")
+        except Exception as e:
+            op.fail(e)
+            raise
+        finally:
+            op.end()
 
 
 # Create a singleton instance
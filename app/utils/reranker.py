@@ -0,0 +1,131 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Optional
+from app.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"\w+")
+
+# BM25 parameters; the usual defaults
+_K1 = 1.2
+_B = 0.75
+
+
+class Reranker:
+    """
+    Second retrieval stage: rescore search candidates against the question
+    and keep only the ones worth putting in the prompt.
+
+    With RERANK_MODEL set and sentence-transformers installed, candidates are
+    scored by that cross-encoder on the CPU in batches. Otherwise each
+    (question, chunk) pair gets a BM25 score over the candidate set, blended
+    with the vector similarity from the search.
+    """
+
+    def __init__(self):
+        self.model = None
+        self._model_failed = False
+
+    def _load_model(self):
+        """The cross-encoder, or None to use the lexical scorer"""
+        if self.model is None and settings.RERANK_MODEL and not self._model_failed:
+            try:
+                # Imported here: it pulls in torch, which most deployments skip
+                from sentence_transformers import CrossEncoder
+
+                self.model = CrossEncoder(settings.RERANK_MODEL, device="cpu")
+                logger.info(f"Loaded reranker model {settings.RERANK_MODEL}")
+            except Exception as e:
+                self._model_failed = True
+                logger.warning(
+                    f"Reranker model {settings.RERANK_MODEL} unavailable, using lexical scoring: {e}"
+                )
+        return self.model
+
+    @property
+    def uses_model(self) -> bool:
+        return bool(settings.RERANK_MODEL) and not self._model_failed
+
+    def _model_scores(self, model, question: str, documents: List[str]) -> List[float]:
+        logits = model.predict(
+            [(question, document) for document in documents],
+            batch_size=settings.RERANK_BATCH_SIZE,
+        )
+        # Squash logits so the cutoff settings mean the same for every model
+        return [1 / (1 + math.exp(-float(logit))) for logit in logits]
+
+    def _lexical_scores(
+        self, question: str, documents: List[str], distances: List[Optional[float]]
+    ) -> List[float]:
+        terms = set(_WORD.findall(question.lower()))
+        counts = [Counter(_WORD.findall(document.lower())) for document in documents]
+        lengths = [sum(c.values()) for c in counts]
+        average_length = (sum(lengths) / len(lengths)) or 1
+        # Document frequency within the candidates only; cheap, and enough to
+        # discount words every candidate shares
+        idf = {}
+        for term in terms:
+            df = sum(1 for c in counts if term in c)
+            if df:
+                idf[term] = math.log(1 + (len(counts) - df + 0.5) / (df + 0.5))
+        bm25 = []
+        for count, length in zip(counts, lengths):
+            norm = _K1 * (1 - _B + _B * length / average_length)
+            score = 0.0
+            for term, weight in idf.items():
+                frequency = count.get(term)
+                if frequency:
+                    score += weight * frequency * (_K1 + 1) / (frequency + norm)
+            bm25.append(score)
+        top = max(bm25) or 1.0
+        weight = settings.RERANK_VECTOR_WEIGHT
+        return [
+            weight * (distance or 0.0) + (1 - weight) * score / top
+            for score, distance in zip(bm25, distances)
+        ]
+
+    def _cutoff(self, scores: List[float], max_chunks: int) -> int:
+        """How many of the descending ``scores`` to keep"""
+        keep = 1
+        while keep < min(max_chunks, len(scores)):
+            score = scores[keep]
+            if (
+                score < settings.RERANK_MIN_SCORE
+                or score < scores[0] * settings.RERANK_RELATIVE_CUTOFF
+                or scores[keep - 1] - score > settings.RERANK_MAX_GAP
+            ):
+                break
+            keep += 1
+        return keep
+
+    def rerank(self, question: str, search_results: Dict, max_chunks: int) -> Dict:
+        """
+        Reorder search results by relevance and cut them off adaptively.
+
+        Takes and returns the ``search_chunks`` result shape; ``distances``
+        become the rerank scores. At least the best candidate is kept.
+        """
+        documents = search_results["documents"]
+        if not documents:
+            return search_results
+        model = self._load_model()
+        if model is not None:
+            scores = self._model_scores(model, question, documents)
+        else:
+            scores = self._lexical_scores(question, documents, search_results["distances"])
+
+        order = sorted(range(len(documents)), key=lambda i: scores[i], reverse=True)
+        keep = self._cutoff([scores[i] for i in order], max_chunks)
+        order = order[:keep]
+        logger.debug(f"Reranker kept {keep} of {len(documents)} candidates")
+        return {
+            "documents": [documents[i] for i in order],
+            "metadatas": [search_results["metadatas"][i] for i in order],
+            "distances": [scores[i] for i in order],
+        }
+
+
+reranker = Reranker()
@@ -0,0 +1,87 @@
+import asyncio
+import time
+import logging
+from contextlib import contextmanager
+from typing import Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class StartupReport:
+    """Collects how long each part of process startup took"""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.services: Dict[str, bool] = {}
+
+    def record(self, stage: str, elapsed: float):
+        """Record the duration of a startup stage in seconds"""
+        self.stages[stage] = elapsed
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time the wrapped block as a startup stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def as_dict(self) -> Dict:
+        return {
+            "total_seconds": round(time.perf_counter() - self.started_at, 4),
+            "stages": {name: round(elapsed, 4) for name, elapsed in self.stages.items()},
+            "services": dict(self.services),
+        }
+
+    def log(self):
+        """Log the startup breakdown, slowest stage first"""
+        breakdown = ", ".join(
+            f"{name}={elapsed:.3f}s"
+            for name, elapsed in sorted(
+                self.stages.items(), key=lambda item: item[1], reverse=True
+            )
+        )
+        logger.info(
+            f"Startup finished in {time.perf_counter() - self.started_at:.3f}s ({breakdown})"
+        )
+        unhealthy = [name for name, ok in self.services.items() if not ok]
+        if unhealthy:
+            logger.warning(
+                f"Services not ready at startup, will connect on first use: {unhealthy}"
+            )
+
+
+async def warm_up_services(
+    checks: Dict[str, Callable[[], bool]], timeout: float
+) -> Dict[str, bool]:
+    """
+    Run blocking service health checks concurrently in threads.
+
+    A failing or slow service is recorded as unhealthy instead of aborting
+    startup; the service singletons retry their connection on first use.
+    """
+
+    async def _check(name: str, check: Callable[[], bool]) -> bool:
+        start = time.perf_counter()
+        try:
+            healthy = await asyncio.wait_for(asyncio.to_thread(check), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Warm-up of {name} timed out after {timeout}s")
+            healthy = False
+        except Exception as e:
+            logger.warning(f"Warm-up of {name} failed: {e}")
+            healthy = False
+        startup_report.record(f"warmup.{name}", time.perf_counter() - start)
+        startup_report.services[name] = healthy
+        return healthy
+
+    results = await asyncio.gather(
+        *(_check(name, check) for name, check in checks.items())
+    )
+    return dict(zip(checks.keys(), results))
+
+
+# Created on import so the report covers module loading as well
+startup_report = StartupReport()
@@ -0,0 +1,74 @@
+import asyncio
+import json
+import logging
+from typing import Any, Callable, Dict, Optional
+import redis.asyncio as aioredis
+from app.config import settings
+from app.utils.cache import DOCUMENT_EVENTS_CHANNEL
+
+logger = logging.getLogger(__name__)
+
+
+class StatusEventListener:
+    """
+    Single Redis pub/sub subscription per API process for document status events.
+
+    Every event is handed to ``on_event``; fan-out to individual clients is
+    the caller's job, so the number of Redis subscriptions does not grow with
+    the number of connected clients.
+    """
+
+    def __init__(self, on_event: Callable[[str, Dict[str, Any]], None]):
+        self.on_event = on_event
+        self.redis = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start listening in the background; safe to call repeatedly"""
+        if self._task is None or self._task.done():
+            if self.redis is None:
+                self.redis = aioredis.Redis(
+                    host=settings.REDIS_HOST,
+                    port=settings.REDIS_PORT,
+                    db=settings.REDIS_DB,
+                    decode_responses=True,
+                )
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.redis is not None:
+            await self.redis.aclose()
+            self.redis = None
+
+    async def _listen(self):
+        backoff = 1
+        prefix = f"{DOCUMENT_EVENTS_CHANNEL}:"
+        while True:
+            try:
+                async with self.redis.pubsub() as pubsub:
+                    await pubsub.psubscribe(f"{prefix}*")
+                    logger.info("Listening for document status events")
+                    backoff = 1
+                    async for message in pubsub.listen():
+                        if message["type"] != "pmessage":
+                            continue
+                        document_id = message["channel"][len(prefix):]
+                        try:
+                            self.on_event(document_id, json.loads(message["data"]))
+                        except Exception as e:
+                            logger.error(f"Error dispatching status event: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(
+                    f"Status event subscription lost: {e}; retrying in {backoff}s"
+                )
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
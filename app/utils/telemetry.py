@@ -0,0 +1,185 @@
+import asyncio
+import functools
+import os
+import time
+import logging
+from contextlib import contextmanager
+from typing import Callable
+from opentelemetry import trace
+from opentelemetry.trace import Status, StatusCode
+from prometheus_client import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+tracer = trace.get_tracer("docuquery")
+
+# Latency buckets from 5 ms to 2 minutes, covering cache hits through ingest stages
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120,
+)
+
+OPERATION_DURATION = Histogram(
+    "docuquery_operation_duration_seconds",
+    "Duration of traced operations",
+    ["operation"],
+    buckets=LATENCY_BUCKETS,
+)
+OPERATION_ERRORS = Counter(
+    "docuquery_operation_errors_total",
+    "Traced operations that raised",
+    ["operation"],
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "docuquery_http_request_duration_seconds",
+    "HTTP request duration by route",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+CACHE_REQUESTS = Counter(
+    "docuquery_cache_requests_total",
+    "Cache lookups by kind and result",
+    ["kind", "result"],
+)
+LLM_TIME_TO_FIRST_TOKEN = Histogram(
+    "docuquery_llm_time_to_first_token_seconds",
+    "Time from sending a streaming chat request to its first token",
+    buckets=LATENCY_BUCKETS,
+)
+EXTRACTION_SECONDS_PER_PAGE = Histogram(
+    "docuquery_extraction_seconds_per_page",
+    "Text extraction time divided by page count",
+    ["file_type"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+CONTEXT_CHUNKS = Histogram(
+    "docuquery_context_chunks",
+    "Chunks passed to the LLM per question",
+    buckets=(1, 2, 3, 5, 8, 13, 21, 34, 55, 100, 1000),
+)
+CELERY_QUEUE_WAIT = Histogram(
+    "docuquery_celery_queue_wait_seconds",
+    "Time a Celery task waited in the broker before starting",
+    ["task", "queue"],
+    buckets=LATENCY_BUCKETS + (300, 900, 1800, 3600),
+)
+
+
+@contextmanager
+def traced(operation: str, **attributes):
+    """Run the block in a trace span and record its duration"""
+    start = time.perf_counter()
+    with tracer.start_as_current_span(operation, attributes=attributes) as span:
+        try:
+            yield span
+        except BaseException as e:
+            if not isinstance(e, (asyncio.CancelledError, GeneratorExit)):
+                OPERATION_ERRORS.labels(operation).inc()
+                span.record_exception(e)
+                span.set_status(Status(StatusCode.ERROR, str(e)))
+            raise
+        finally:
+            OPERATION_DURATION.labels(operation).observe(time.perf_counter() - start)
+
+
+def instrument(operation: str) -> Callable:
+    """Decorator form of traced() for sync and async functions"""
+
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with traced(operation):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with traced(operation):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class OperationSpan:
+    """
+    Span that is ended explicitly, for async generators.
+
+    A context-managed span would stay "current" for the consumer while the
+    generator is suspended at a yield, so stages are activated only around
+    code that does not yield.
+    """
+
+    def __init__(self, operation: str, **attributes):
+        self.operation = operation
+        self.span = tracer.start_span(operation, attributes=attributes)
+        self.start = time.perf_counter()
+
+    def activate(self):
+        return trace.use_span(self.span, end_on_exit=False)
+
+    def fail(self, error: BaseException):
+        OPERATION_ERRORS.labels(self.operation).inc()
+        self.span.record_exception(error)
+        self.span.set_status(Status(StatusCode.ERROR, str(error)))
+
+    def end(self):
+        OPERATION_DURATION.labels(self.operation).observe(time.perf_counter() - self.start)
+        self.span.end()
+
+
+def configure_tracing(service_name: str):
+    """
+    Install an SDK tracer provider so spans get real trace ids.
+
+    Spans are exported over OTLP when OTEL_EXPORTER_OTLP_ENDPOINT is set and
+    the exporter package is installed; otherwise they only serve to
+    correlate work across the API and workers.
+    """
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+    provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    if os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"):
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+                OTLPSpanExporter,
+            )
+
+            provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+        except ImportError:
+            logger.warning(
+                "OTEL_EXPORTER_OTLP_ENDPOINT is set but opentelemetry-exporter-otlp is not installed"
+            )
+    trace.set_tracer_provider(provider)
+
+
+def metrics_payload() -> bytes:
+    """Prometheus exposition of this process, or of all processes in multiprocess mode"""
+    from prometheus_client import REGISTRY, CollectorRegistry, generate_latest
+
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def start_metrics_server(port: int):
+    """Serve /metrics from a background thread, for processes without an HTTP app"""
+    from prometheus_client import REGISTRY, CollectorRegistry, start_http_server
+
+    registry = REGISTRY
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    start_http_server(port, registry=registry)
+    logger.info(f"Serving Prometheus metrics on port {port}")
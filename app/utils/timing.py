@@ -0,0 +1,47 @@
+import time
+import logging
+from contextlib import contextmanager
+from typing import Dict
+from app.utils.telemetry import traced
+
+logger = logging.getLogger(__name__)
+
+
+class StageTimings:
+    """
+    Wall-clock time spent in each stage of one request.
+
+    Stages run through ``stage()`` are also traced, so the same names show up
+    in the per-request breakdown, the span tree and the latency histograms.
+    """
+
+    def __init__(self, prefix: str = "rag"):
+        self.prefix = prefix
+        self.stages: Dict[str, float] = {}
+        self.start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        begin = time.perf_counter()
+        try:
+            with traced(f"{self.prefix}.{name}"):
+                yield
+        finally:
+            self.record(name, time.perf_counter() - begin)
+
+    def record(self, name: str, seconds: float):
+        """Add time to a stage, e.g. one measured across yields of a stream"""
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def total(self) -> float:
+        return time.perf_counter() - self.start
+
+    def as_dict(self) -> Dict[str, float]:
+        """Stage durations in milliseconds, plus the total so far"""
+        timings = {name: round(seconds * 1000, 3) for name, seconds in self.stages.items()}
+        timings["total"] = round(self.total() * 1000, 3)
+        return timings
+
+    def log(self, label: str):
+        breakdown = ", ".join(f"{name}={ms:.1f}ms" for name, ms in self.as_dict().items())
+        logger.info(f"Stage timings for {label}: {breakdown}")
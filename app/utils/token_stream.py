@@ -0,0 +1,82 @@
+import asyncio
+from typing import AsyncGenerator, AsyncIterator
+
+# Binary token frame layout:
+#   1 byte   frame type (b"T" for tokens)
+#   1 byte   length of the query id in bytes
+#   n bytes  query id (UTF-8)
+#   rest     token text (UTF-8)
+BINARY_TOKEN_FRAME = b"T"
+MAX_QUERY_ID_BYTES = 255
+
+_END = object()
+
+
+def encode_binary_token_frame(query_id: str, content: str) -> bytes:
+    """Pack coalesced token text into a binary WebSocket frame"""
+    query_id_bytes = query_id.encode()
+    if len(query_id_bytes) > MAX_QUERY_ID_BYTES:
+        raise ValueError("query_id is too long for a binary frame")
+    return (
+        BINARY_TOKEN_FRAME
+        + bytes([len(query_id_bytes)])
+        + query_id_bytes
+        + content.encode()
+    )
+
+
+async def coalesce_tokens(
+    tokens: AsyncIterator[str], max_delay: float, max_bytes: int
+) -> AsyncGenerator[str, None]:
+    """
+    Group streamed tokens into larger frames.
+
+    The first token is passed through immediately so time-to-first-token is
+    unchanged; after that, tokens are joined until ``max_bytes`` of text have
+    been collected or ``max_delay`` seconds have passed since the first
+    buffered token, whichever comes first.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def pump():
+        try:
+            async for token in tokens:
+                await queue.put(token)
+            await queue.put(_END)
+        except Exception as e:
+            await queue.put(e)
+
+    pump_task = asyncio.create_task(pump())
+    loop = asyncio.get_running_loop()
+    pending = []
+    pending_bytes = 0
+    deadline = 0.0
+    first = True
+    try:
+        while True:
+            timeout = max(0.0, deadline - loop.time()) if pending else None
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                yield "".join(pending)
+                pending, pending_bytes = [], 0
+                continue
+
+            if item is _END or isinstance(item, Exception):
+                break
+
+            if not pending:
+                deadline = loop.time() + max_delay
+            pending.append(item)
+            pending_bytes += len(item.encode())
+            if first or pending_bytes >= max_bytes:
+                first = False
+                yield "".join(pending)
+                pending, pending_bytes = [], 0
+
+        if pending:
+            yield "".join(pending)
+        if isinstance(item, Exception):
+            raise item
+    finally:
+        pump_task.cancel()
@@ -1,19 +1,74 @@
-import numpy as np
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Set, Tuple
+import json
 import logging
-from qdrant_client import QdrantClient
-from qdrant_client.http.models import PointStruct, Filter, FieldCondition, MatchValue
+import time
 from app.config import settings as app_settings
+from app.utils.cache import DOCUMENT_TENANTS_KEY, cache
+from app.utils.chunk_store import chunk_store, chunking_of
+from app.utils.telemetry import instrument
 import uuid
 
 logger = logging.getLogger(__name__)
 
 COLLECTION_NAME = "document_chunks"
+# Points at the serving collection once a re-embedding migration has cut
+# over; until then COLLECTION_NAME itself is served
+ACTIVE_ALIAS = f"{COLLECTION_NAME}_active"
+
+# Redis: embedding profile per collection, and the running migration
+COLLECTION_PROFILES_KEY = "vector_collection_profiles"
+MIGRATION_STATE_KEY = "vector_migration"
+# Tenants with a collection of their own: tenant -> {"collection", "status"}
+TENANT_PARTITIONS_KEY = "vector_tenant_partitions"
+TENANT_COLLECTION_PREFIX = f"{COLLECTION_NAME}_tenant_"
+
+# Document -> tenant lookups remembered per process; a document's tenant never changes
+TENANT_CACHE_SIZE = 100000
+
+# Profile fields that decide whether two collections can share a query embedding
+QUERY_PROFILE_FIELDS = ("deployment", "dimensions", "reduction", "pca_path")
+
+
+def default_profile() -> Dict[str, Any]:
+    """Embedding and chunking settings from the environment"""
+    return {
+        "deployment": app_settings.AZURE_EMBEDDING_DEPLOYMENT_NAME,
+        "dimensions": app_settings.EMBEDDING_DIMENSIONS,
+        "reduction": app_settings.EMBEDDING_REDUCTION,
+        "pca_path": app_settings.EMBEDDING_PCA_PATH,
+        "chunk_size": app_settings.CHUNK_SIZE,
+        "chunk_overlap": app_settings.CHUNK_OVERLAP,
+    }
+
+
+def same_query_embedding(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+    return all(a.get(field) == b.get(field) for field in QUERY_PROFILE_FIELDS)
 
 
 class VectorStore:
+    """
+    Chunk vectors in Qdrant.
+
+    Each collection has an embedding profile (model deployment, vector size,
+    reduction and chunking). Collections without a registered profile use
+    the environment's. Operations go to the collection the routing picks:
+    normally the active alias, or COLLECTION_NAME before any migration.
+    During and just after a migration, reads fall back from the new
+    collection to the old one.
+
+    Large tenants can be given a collection of their own (see
+    app.helpers.vector_partitions), so their graph does not slow down
+    everyone else's searches. Operations on a document go to its tenant's
+    partition; every other tenant shares the active collection.
+    """
+
     def __init__(self):
-        logger.info("Initializing vector store")
+        self.client = None
+        self._routing: Optional[Dict[str, Any]] = None
+        self._routing_expires = 0.0
+        self._tenants: Dict[str, str] = {}
+
+    def get_url(self) -> str:
         host = app_settings.VECTOR_DB_HOST
 
         # Remove protocol if present
@@ -25,70 +80,344 @@ class VectorStore:
             url = f"https://{host}:{app_settings.VECTOR_DB_PORT}"
         else:
             url = f"http://{host}:{app_settings.VECTOR_DB_PORT}"
+        return url
+
+    def _init_client(self):
+        """Connect to Qdrant and ensure the collection exists on first use"""
+        if self.client is None:
+            # qdrant_client is the slowest import in the app, so it is only
+            # loaded once a vector operation actually needs it
+            from qdrant_client import QdrantClient
 
-        self.client = QdrantClient(
-            url=url
+            logger.info("Initializing vector store")
+            client = QdrantClient(url=self.get_url())
+            logger.debug(
+                f"QdrantClient initialized with host={app_settings.VECTOR_DB_HOST}, port={app_settings.VECTOR_DB_PORT}"
+            )
+            self._ensure_collection_exists(client)
+            self.client = client
+
+    def _ensure_collection_exists(self, client):
+        """Create the chunk collection if it does not exist yet"""
+        collections = [c.name for c in client.get_collections().collections]
+        logger.debug(f"Existing Qdrant collections: {collections}")
+        name = self._active_collection(client)
+        profile = self.profile_of(name)
+        if name not in collections:
+            logger.info(f"Collection '{name}' not found. Creating new collection.")
+            self.create_collection(client, name, profile["dimensions"])
+        else:
+            logger.info(f"Collection '{name}' already exists.")
+            size = client.get_collection(name).config.params.vectors.size
+            if size != profile["dimensions"]:
+                # Every upsert and search would fail; say why up front
+                raise RuntimeError(
+                    f"Collection '{name}' stores {size}-dimension vectors but its "
+                    f"embedding profile has {profile['dimensions']}; re-embed the "
+                    f"collection or change EMBEDDING_DIMENSIONS"
+                )
+            self._ensure_payload_index(client, name)
+
+    def _ensure_payload_index(self, client, name: str):
+        # Every search filters or groups on document_id; without an index
+        # Qdrant scans payloads. Creating an existing index is a no-op
+        client.create_payload_index(
+            collection_name=name,
+            field_name="document_id",
+            field_schema="keyword",
         )
-        logger.debug(
-            f"QdrantClient initialized with host={app_settings.VECTOR_DB_HOST}, port={app_settings.VECTOR_DB_PORT}"
+
+    def create_collection(self, client, name: str, dimensions: int):
+        """Create an empty chunk collection with its payload index"""
+        client.create_collection(
+            collection_name=name,
+            vectors_config={"size": dimensions, "distance": "Cosine"},
         )
-        # Create collection if not exists
-        collections = [c.name for c in self.client.get_collections().collections]
-        logger.debug(f"Existing Qdrant collections: {collections}")
-        if COLLECTION_NAME not in collections:
-            logger.info(
-                f"Collection '{COLLECTION_NAME}' not found. Creating new collection."
+        self._ensure_payload_index(client, name)
+        logger.info(f"Collection '{name}' created with {dimensions} dimensions.")
+
+    def _active_collection(self, client) -> str:
+        """The collection behind the active alias, or COLLECTION_NAME"""
+        for alias in client.get_aliases().aliases:
+            if alias.alias_name == ACTIVE_ALIAS:
+                return alias.collection_name
+        return COLLECTION_NAME
+
+    def profile_of(self, collection: str) -> Dict[str, Any]:
+        """Embedding profile a collection was built with"""
+        try:
+            data = cache.redis.hget(COLLECTION_PROFILES_KEY, collection)
+        except Exception as e:
+            logger.error(f"Error reading profile of collection {collection}: {e}")
+            data = None
+        return {**default_profile(), **json.loads(data)} if data else default_profile()
+
+    def register_profile(self, collection: str, profile: Dict[str, Any]):
+        cache.redis.hset(COLLECTION_PROFILES_KEY, collection, json.dumps(profile))
+
+    def forget_profile(self, collection: str):
+        cache.redis.hdel(COLLECTION_PROFILES_KEY, collection)
+
+    def migration_state(self) -> Optional[Dict[str, Any]]:
+        data = cache.redis.get(MIGRATION_STATE_KEY)
+        return json.loads(data) if data else None
+
+    def partitions(self) -> Dict[str, Dict[str, Any]]:
+        """Tenants with a collection of their own, and where their move stands"""
+        return {
+            tenant: json.loads(data)
+            for tenant, data in cache.redis.hgetall(TENANT_PARTITIONS_KEY).items()
+        }
+
+    def routing(self) -> Dict[str, Any]:
+        """
+        Where operations go, refreshed every VECTOR_ROUTING_TTL seconds.
+
+        ``write`` is the route for new chunks, ``read`` the routes to search
+        in order, and ``all`` every collection that may hold a document's
+        chunks. A route is ``{"collection": name, "profile": {...}}``.
+        ``tenants`` holds the ``write`` and ``read`` routes of tenants with
+        a partition of their own.
+        """
+        if self._routing is not None and time.monotonic() < self._routing_expires:
+            return self._routing
+        self._init_client()
+        try:
+            state = self.migration_state()
+        except Exception as e:
+            logger.error(f"Error reading migration state: {e}")
+            state = None
+        try:
+            partitions = self.partitions()
+        except Exception as e:
+            logger.error(f"Error reading tenant partitions: {e}")
+            partitions = {}
+        active = self._active_collection(self.client)
+        write, read, everything = active, [active], {active}
+        if state:
+            everything |= {state["source"], state["target"]}
+            if state["status"] == "cutover":
+                # The alias is about to move; new chunks already go to the target
+                write, read = state["target"], [state["target"], state["source"]]
+            elif state["status"] == "complete":
+                # Kept until cleanup for documents the migration has not reached
+                read = [active, state["source"]]
+        everything |= {partition["collection"] for partition in partitions.values()}
+        profiles = {name: self.profile_of(name) for name in everything}
+
+        def routes(names: List[str]) -> List[Dict[str, Any]]:
+            return [
+                {"collection": name, "profile": profiles[name]}
+                for name in dict.fromkeys(names)
+            ]
+
+        tenants = {}
+        for tenant, partition in partitions.items():
+            own = partition["collection"]
+            if partition["status"] == "moving":
+                # Chunks not copied over yet are still in the shared collection
+                tenants[tenant] = {"write": own, "read": [own] + read}
+            elif partition["status"] == "releasing":
+                tenants[tenant] = {"write": write, "read": read + [own]}
+            else:
+                tenants[tenant] = {"write": own, "read": [own]}
+        self._routing = {
+            "write": routes([write])[0],
+            "read": routes(read),
+            "all": sorted(everything),
+            "profiles": profiles,
+            "tenants": {
+                tenant: {
+                    "write": routes([names["write"]])[0],
+                    "read": routes(names["read"]),
+                }
+                for tenant, names in tenants.items()
+            },
+        }
+        self._routing_expires = time.monotonic() + app_settings.VECTOR_ROUTING_TTL
+        return self._routing
+
+    def refresh_routing(self):
+        self._routing = None
+
+    def tenants_of(self, document_ids: List[str]) -> List[Optional[str]]:
+        """Tenant of each document, None where it is not recorded"""
+        missing = [document_id for document_id in document_ids if document_id not in self._tenants]
+        if missing:
+            try:
+                found = cache.redis.hmget(DOCUMENT_TENANTS_KEY, missing)
+            except Exception as e:
+                logger.error(f"Error reading document tenants: {e}")
+                found = [None] * len(missing)
+            if len(self._tenants) + len(missing) > TENANT_CACHE_SIZE:
+                self._tenants.clear()
+            self._tenants.update(
+                (document_id, tenant)
+                for document_id, tenant in zip(missing, found)
+                if tenant is not None
+            )
+        return [self._tenants.get(document_id) for document_id in document_ids]
+
+    def routes_for(self, document_id: Optional[str] = None) -> Dict[str, Any]:
+        """The write and read routes of a document's tenant"""
+        routing = self.routing()
+        # Without partitions every tenant is in the shared collection, and
+        # the lookup is skipped
+        if document_id and routing["tenants"]:
+            tenant = self.tenants_of([document_id])[0]
+            if tenant in routing["tenants"]:
+                return routing["tenants"][tenant]
+        return routing
+
+    def write_route(self, document_id: Optional[str] = None) -> Dict[str, Any]:
+        return self.routes_for(document_id)["write"]
+
+    def read_routes(self, document_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        return self.routes_for(document_id)["read"]
+
+    def _texts(self, points: List[Any], collection: str) -> List[Optional[str]]:
+        """
+        Chunk text of each point: from its payload, or for slim points from
+        the chunk store, in one batched fetch. None where it is unknown;
+        see _with_texts.
+        """
+        texts = [point.payload.get("text") for point in points]
+        slim = [
+            index
+            for index, point in enumerate(points)
+            if texts[index] is None and "chunk_index" in point.payload
+        ]
+        if slim:
+            profile = self.routing()["profiles"].get(collection) or self.profile_of(collection)
+            fetched = chunk_store.get_many(
+                chunking_of(profile),
+                [
+                    (points[index].payload["document_id"], points[index].payload["chunk_index"])
+                    for index in slim
+                ],
             )
-            self.client.recreate_collection(
-                collection_name=COLLECTION_NAME,
-                vectors_config={
-                    "size": 1536,
-                    "distance": "Cosine",
-                },
+            for index, text in zip(slim, fetched):
+                texts[index] = text
+        return texts
+
+    def _with_texts(
+        self, points: List[Any], collection: str, texts: Optional[List[Optional[str]]] = None
+    ) -> Tuple[List[Any], List[str]]:
+        """
+        The points whose text is known, and their texts. A hit without text
+        would break reranking, prompts and citations, so it is dropped.
+        """
+        texts = self._texts(points, collection) if texts is None else texts
+        missing = [point.id for point, text in zip(points, texts) if text is None]
+        if missing:
+            logger.warning(
+                f"Dropping {len(missing)} hits without chunk text in {collection}, e.g. {missing[:5]}"
             )
-            logger.info(f"Collection '{COLLECTION_NAME}' created.")
-        else:
-            logger.info(f"Collection '{COLLECTION_NAME}' already exists.")
+            pairs = [(point, text) for point, text in zip(points, texts) if text is not None]
+            points, texts = [p for p, _ in pairs], [t for _, t in pairs]
+        return points, texts
+
+    def partition_documents(
+        self, document_ids: List[str]
+    ) -> List[Tuple[Dict[str, Any], List[str]]]:
+        """Group documents by the collection their reads go to first"""
+        routing = self.routing()
+        if not routing["tenants"]:
+            return [(routing["read"][0], list(document_ids))]
+        groups: Dict[str, Tuple[Dict[str, Any], List[str]]] = {}
+        for document_id, tenant in zip(document_ids, self.tenants_of(document_ids)):
+            route = routing["tenants"].get(tenant, routing)["read"][0]
+            groups.setdefault(route["collection"], (route, []))[1].append(document_id)
+        return list(groups.values())
 
+    def close(self):
+        """Close the Qdrant connection; the next operation reconnects"""
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+
+    def health_check(self) -> bool:
+        """Check that Qdrant is reachable, connecting if needed"""
+        try:
+            self._init_client()
+            self.client.get_collections()
+            return True
+        except Exception as e:
+            logger.warning(f"Vector store health check failed: {e}")
+            return False
+
+    @instrument("vector_store.upsert")
     def add_document_chunks(
         self,
         document_id: str,
         chunk_texts: List[str],
         embeddings: List[List[float]],
         metadatas: List[Dict[str, Any]],
+        collection: Optional[str] = None,
     ) -> bool:
         try:
+            from qdrant_client.http.models import PointStruct
+
+            self._init_client()
+            collection = collection or self.write_route(document_id)["collection"]
             logger.info(
-                f"Adding {len(chunk_texts)} chunks for document_id={document_id} to vector store."
+                f"Adding {len(chunk_texts)} chunks for document_id={document_id} to {collection}."
             )
-            chunk_ids = [str(uuid.uuid4()) for _ in range(len(chunk_texts))]
-            points = [
-                PointStruct(
-                    id=chunk_ids[i],
-                    vector=embeddings[i],
-                    payload={
-                        **metadatas[i],
-                        "document_id": document_id,
-                        "text": chunk_texts[i],
+            # Deterministic ids make re-running a shard overwrite its points
+            # instead of duplicating them
+            chunk_ids = [
+                str(uuid.uuid5(uuid.NAMESPACE_URL, f"{document_id}:{metadata['chunk_index']}"))
+                if "chunk_index" in metadata
+                else str(uuid.uuid4())
+                for metadata in metadatas
+            ]
+            if app_settings.VECTOR_SLIM_PAYLOADS and all(
+                "chunk_index" in metadata for metadata in metadatas
+            ):
+                # Texts first, so a point is never searchable without its text
+                chunking = chunking_of(self.profile_of(collection))
+                chunk_store.put(
+                    document_id,
+                    chunking,
+                    {
+                        metadata["chunk_index"]: text
+                        for metadata, text in zip(metadatas, chunk_texts)
                     },
                 )
+                payloads = [
+                    {"document_id": document_id, "chunk_index": metadata["chunk_index"]}
+                    for metadata in metadatas
+                ]
+            else:
+                payloads = [
+                    {**metadata, "document_id": document_id, "text": text}
+                    for metadata, text in zip(metadatas, chunk_texts)
+                ]
+            points = [
+                PointStruct(id=chunk_ids[i], vector=embeddings[i], payload=payloads[i])
                 for i in range(len(chunk_texts))
             ]
             logger.debug(f"Upserting points: {points}")
-            self.client.upsert(collection_name=COLLECTION_NAME, points=points)
+            self.client.upsert(collection_name=collection, points=points)
             logger.info(f"Successfully added chunks for document_id={document_id}.")
             return True
         except Exception as e:
             logger.error(f"Error adding document chunks to vector store: {e}")
             return False
 
+    @instrument("vector_store.search")
     def search_chunks(
         self,
         query_embedding: List[float],
         document_id: Optional[str] = None,
         top_k: int = 5,
+        collection: Optional[str] = None,
     ) -> Dict:
         try:
+            from qdrant_client.http.models import Filter, FieldCondition, MatchValue
+
+            self._init_client()
+            collection = collection or self.read_routes(document_id)[0]["collection"]
             logger.info(
                 f"Searching for top {top_k} chunks for document_id={document_id}."
             )
@@ -102,14 +431,15 @@ class VectorStore:
                     ]
                 )
                 logger.debug(f"Using filter: {query_filter}")
-            results = self.client.search(
-                collection_name=COLLECTION_NAME,
-                query_vector=query_embedding,
+            results = self.client.query_points(
+                collection_name=collection,
+                query=query_embedding,
                 limit=top_k,
                 query_filter=query_filter,
-            )
+            ).points
+            results, texts = self._with_texts(results, collection)
             response = {
-                "documents": [r.payload.get("text") for r in results],
+                "documents": texts,
                 "metadatas": [r.payload for r in results],
                 "distances": [r.score for r in results],
             }
@@ -122,8 +452,138 @@ class VectorStore:
             logger.error(f"Error searching vector store: {e}")
             return {"documents": [], "metadatas": [], "distances": []}
         
-    def search_chunks_via_document_id(self, document_id):
+    @instrument("vector_store.search_batch")
+    def search_chunks_batch(
+        self,
+        query_embeddings: List[List[float]],
+        document_id: Optional[str] = None,
+        top_k: int = 5,
+        collection: Optional[str] = None,
+    ) -> List[Dict]:
+        """Run several searches in one Qdrant request; one result per embedding"""
         try:
+            from qdrant_client.http.models import (
+                Filter,
+                FieldCondition,
+                MatchValue,
+                QueryRequest,
+            )
+
+            self._init_client()
+            collection = collection or self.read_routes(document_id)[0]["collection"]
+            logger.info(
+                f"Searching top {top_k} chunks for {len(query_embeddings)} queries in document_id={document_id}."
+            )
+            query_filter = None
+            if document_id:
+                query_filter = Filter(
+                    must=[
+                        FieldCondition(
+                            key="document_id", match=MatchValue(value=document_id)
+                        )
+                    ]
+                )
+            responses = self.client.query_batch_points(
+                collection_name=collection,
+                requests=[
+                    QueryRequest(
+                        query=embedding,
+                        filter=query_filter,
+                        limit=top_k,
+                        with_payload=True,
+                    )
+                    for embedding in query_embeddings
+                ],
+            )
+            # One chunk store fetch for every query's hits
+            texts = iter(
+                self._texts([r for response in responses for r in response.points], collection)
+            )
+            results = []
+            for response in responses:
+                points, documents = self._with_texts(
+                    response.points,
+                    collection,
+                    [next(texts) for _ in response.points],
+                )
+                results.append(
+                    {
+                        "documents": documents,
+                        "metadatas": [r.payload for r in points],
+                        "distances": [r.score for r in points],
+                    }
+                )
+            return results
+        except Exception as e:
+            logger.error(f"Error searching vector store: {e}")
+            return [
+                {"documents": [], "metadatas": [], "distances": []}
+                for _ in query_embeddings
+            ]
+
+    @instrument("vector_store.search_groups")
+    def search_chunks_grouped(
+        self,
+        query_embedding: List[float],
+        document_ids: List[str],
+        max_documents: int = 8,
+        chunks_per_document: int = 3,
+        collection: Optional[str] = None,
+    ) -> Dict:
+        """
+        Best chunks across several documents in one grouped search.
+
+        Results are grouped by document so a single long document cannot
+        crowd the others out; groups come best first and chunks within a
+        group best first.
+        """
+        try:
+            from qdrant_client.http.models import Filter, FieldCondition, MatchAny
+
+            self._init_client()
+            collection = collection or self.read_routes()[0]["collection"]
+            logger.info(
+                f"Searching {len(document_ids)} documents for the top {max_documents}."
+            )
+            results = self.client.query_points_groups(
+                collection_name=collection,
+                query=query_embedding,
+                group_by="document_id",
+                limit=max_documents,
+                group_size=chunks_per_document,
+                query_filter=Filter(
+                    must=[
+                        FieldCondition(
+                            key="document_id", match=MatchAny(any=document_ids)
+                        )
+                    ]
+                ),
+            ).groups
+            hits, texts = self._with_texts(
+                [hit for group in results for hit in group.hits], collection
+            )
+            response = {
+                "documents": texts,
+                "metadatas": [h.payload for h in hits],
+                "distances": [h.score for h in hits],
+            }
+            logger.info(
+                f"Grouped search found {len(hits)} chunks in {len(results)} documents."
+            )
+            return response
+        except Exception as e:
+            logger.error(f"Error searching vector store: {e}")
+            return {"documents": [], "metadatas": [], "distances": []}
+
+    @instrument("vector_store.scroll")
+    def search_chunks_via_document_id(
+        self, document_id: str, collection: Optional[str] = None
+    ) -> Dict:
+        try:
+            from qdrant_client.http.models import Filter, FieldCondition, MatchValue
+
+            self._init_client()
+            collection = collection or self.read_routes(document_id)[0]["collection"]
             query_filter = Filter(
                 must=[
                     FieldCondition(
@@ -132,15 +592,19 @@ class VectorStore:
                 ]
             )
             logger.debug(f"Using filter: {query_filter}")
-            results = self.client.search(
-                collection_name=COLLECTION_NAME,
-                query_filter=query_filter,
-                limit=1000
+            # No query vector here, so this is a filtered scroll rather than a search
+            results, _ = self.client.scroll(
+                collection_name=collection,
+                scroll_filter=query_filter,
+                limit=1000,
+                with_payload=True,
             )
+            results.sort(key=lambda r: r.payload.get("chunk_index", 0))
+            results, texts = self._with_texts(results, collection)
             response = {
-                "documents": [r.payload.get("text") for r in results],
+                "documents": texts,
                 "metadatas": [r.payload for r in results],
-                "distances": [r.score for r in results],
+                "distances": [None for _ in results],
             }
             logger.debug(f"Search response: {response}")
             logger.info(
@@ -153,26 +617,152 @@ class VectorStore:
 
 
 
-    def delete_document_chunks(self, document_id: str) -> bool:
+    @instrument("vector_store.delete")
+    def delete_document_chunks(
+        self, document_id: str, collection: Optional[str] = None
+    ) -> bool:
+        """Delete a document's chunks from ``collection``, or from every collection in use"""
         try:
+            from qdrant_client.http.models import Filter, FieldCondition, MatchValue
+
+            self._init_client()
             logger.info(
                 f"Deleting chunks for document_id={document_id} from vector store."
             )
-            self.client.delete(
-                collection_name=COLLECTION_NAME,
-                points_selector=Filter(
+            # Mid-migration a document may have chunks in both collections
+            for name in [collection] if collection else self.routing()["all"]:
+                self.client.delete(
+                    collection_name=name,
+                    points_selector=Filter(
+                        must=[
+                            FieldCondition(
+                                key="document_id", match=MatchValue(value=document_id)
+                            )
+                        ]
+                    ),
+                )
+            logger.info(f"Successfully deleted chunks for document_id={document_id}.")
+            return True
+        except Exception as e:
+            logger.error(f"Error deleting document chunks from vector store: {e}")
+            return False
+
+    @instrument("vector_store.delete_many")
+    def delete_documents_chunks(
+        self, document_ids: List[str], collection: Optional[str] = None
+    ) -> bool:
+        """Delete several documents' chunks from ``collection`` or every collection, one request each"""
+        try:
+            from qdrant_client.http.models import Filter, FieldCondition, MatchAny
+
+            self._init_client()
+            for name in [collection] if collection else self.routing()["all"]:
+                self.client.delete(
+                    collection_name=name,
+                    points_selector=Filter(
+                        must=[
+                            FieldCondition(
+                                key="document_id", match=MatchAny(any=document_ids)
+                            )
+                        ]
+                    ),
+                )
+            logger.info(f"Deleted chunks of {len(document_ids)} documents.")
+            return True
+        except Exception as e:
+            logger.error(f"Error deleting document chunks from vector store: {e}")
+            return False
+
+    def stored_document_ids(self, collection: str) -> Set[str]:
+        """Every document_id with points in ``collection``, from a payload-only scroll"""
+        self._init_client()
+        document_ids: Set[str] = set()
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=collection,
+                limit=1000,
+                offset=offset,
+                with_payload=["document_id"],
+                with_vectors=False,
+            )
+            document_ids.update(point.payload.get("document_id") for point in points)
+            if offset is None:
+                break
+        document_ids.discard(None)
+        return document_ids
+
+    def count_document_points(self, collection: str, document_ids: List[str]) -> int:
+        """How many points ``document_ids`` have in ``collection``"""
+        from qdrant_client.http.models import Filter, FieldCondition, MatchAny
+
+        self._init_client()
+        total = 0
+        for start in range(0, len(document_ids), 1000):
+            total += self.client.count(
+                collection_name=collection,
+                count_filter=Filter(
                     must=[
                         FieldCondition(
-                            key="document_id", match=MatchValue(value=document_id)
+                            key="document_id",
+                            match=MatchAny(any=document_ids[start:start + 1000]),
                         )
                     ]
                 ),
+                exact=True,
+            ).count
+        return total
+
+    @instrument("vector_store.copy")
+    def copy_document_points(
+        self, source: str, target: str, document_ids: List[str], batch_size: int = 256
+    ) -> int:
+        """
+        Copy the points of ``document_ids`` with their ids, vectors and
+        payloads, so copying again overwrites instead of duplicating.
+        Both collections must share an embedding profile.
+        """
+        from qdrant_client.http.models import (
+            Filter,
+            FieldCondition,
+            MatchAny,
+            PointStruct,
+        )
+
+        self._init_client()
+        copied = 0
+        for start in range(0, len(document_ids), 1000):
+            scroll_filter = Filter(
+                must=[
+                    FieldCondition(
+                        key="document_id",
+                        match=MatchAny(any=document_ids[start:start + 1000]),
+                    )
+                ]
             )
-            logger.info(f"Successfully deleted chunks for document_id={document_id}.")
-            return True
-        except Exception as e:
-            logger.error(f"Error deleting document chunks from vector store: {e}")
-            return False
+            offset = None
+            while True:
+                points, offset = self.client.scroll(
+                    collection_name=source,
+                    scroll_filter=scroll_filter,
+                    limit=batch_size,
+                    offset=offset,
+                    with_payload=True,
+                    with_vectors=True,
+                )
+                if points:
+                    self.client.upsert(
+                        collection_name=target,
+                        points=[
+                            PointStruct(id=point.id, vector=point.vector, payload=point.payload)
+                            for point in points
+                        ],
+                    )
+                    copied += len(points)
+                if offset is None:
+                    break
+        logger.info(f"Copied {copied} points of {len(document_ids)} documents from {source} to {target}.")
+        return copied
 
 
 vector_store = VectorStore()
@@ -0,0 +1,50 @@
+"""Synthetic documents and questions of controllable size"""
+import random
+from typing import List, Tuple
+
+_TOPICS = [
+    "invoice", "warranty", "shipment", "contract", "renewal", "penalty",
+    "account", "refund", "license", "audit", "schedule", "supplier",
+    "inventory", "payment", "deadline", "policy", "clause", "tenant",
+    "storage", "compliance", "budget", "forecast", "incident", "release",
+]
+_FILLER = [
+    "the", "a", "for", "with", "after", "before", "under", "each", "any",
+    "must", "may", "shall", "be", "is", "are", "was", "within", "days",
+    "agreed", "party", "terms", "notice", "period", "written", "section",
+]
+
+
+def make_document(rng: random.Random, size_bytes: int) -> str:
+    """Paragraphs of pseudo-sentences totalling roughly ``size_bytes`` bytes"""
+    paragraphs = []
+    total = 0
+    while total < size_bytes:
+        sentences = []
+        for _ in range(rng.randint(3, 7)):
+            words = [rng.choice(_TOPICS)] + [
+                rng.choice(_FILLER if rng.random() < 0.7 else _TOPICS)
+                for _ in range(rng.randint(8, 20))
+            ]
+            sentences.append(" ".join(words).capitalize() + ".")
+        paragraph = " ".join(sentences)
+        paragraphs.append(paragraph)
+        total += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+
+def make_question(rng: random.Random, index: int) -> str:
+    """Questions are unique per index so they miss the answer cache"""
+    topics = rng.sample(_TOPICS, 3)
+    return f"What does the document say about the {topics[0]} {topics[1]} and {topics[2]}? (#{index})"
+
+
+def make_corpus(
+    documents: int, document_bytes: int, seed: int = 42
+) -> List[Tuple[str, str]]:
+    """(file name, text) pairs for a reproducible corpus"""
+    rng = random.Random(seed)
+    return [
+        (f"benchmark-{index:04d}.txt", make_document(rng, document_bytes))
+        for index in range(documents)
+    ]
@@ -0,0 +1,172 @@
+"""
+DOCX text extraction: python-docx against the streaming extractor.
+
+Builds a large DOCX of paragraphs and tables, then extracts it with each
+method in a fresh process, reporting wall time and peak RSS growth:
+
+    python -m benchmarks.docx_extraction --paragraphs 20000 --tables 400 --rows 50 --cols 6
+    python -m benchmarks.docx_extraction --file export.docx
+
+``python-docx`` is the former DocumentProcessor path: body paragraphs only,
+tables ignored. ``stream`` is app.utils.docx_text, which also extracts
+table rows.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from typing import Dict
+from xml.sax.saxutils import escape
+
+from benchmarks.corpus import make_document
+
+METHODS = ("python-docx", "stream")
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" ContentType="application/'
+    'vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    "</Types>"
+)
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/'
+    '2006/relationships/officeDocument" Target="word/document.xml"/>'
+    "</Relationships>"
+)
+_W = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+
+
+def _paragraph(text: str) -> str:
+    return f'<w:p><w:r><w:t xml:space="preserve">{escape(text)}</w:t></w:r></w:p>'
+
+
+def make_docx(path: str, paragraphs: int, tables: int, rows: int, cols: int, seed: int):
+    """
+    Write a DOCX with ``paragraphs`` paragraphs and ``tables`` tables spread
+    between them. The XML is written directly: python-docx takes minutes
+    to build tables this size.
+    """
+    rng = random.Random(seed)
+    words = make_document(rng, 64 * 1024).split()
+    table_every = max(1, paragraphs // max(1, tables))
+
+    def sentence(length: int) -> str:
+        start = rng.randrange(len(words) - length)
+        return " ".join(words[start:start + length])
+
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as package:
+        package.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        package.writestr("_rels/.rels", _RELS)
+        with package.open("word/document.xml", "w") as xml:
+            xml.write(
+                f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                f'<w:document xmlns:w="{_W}"><w:body>'.encode()
+            )
+            written_tables = 0
+            for index in range(paragraphs):
+                xml.write(_paragraph(sentence(rng.randint(20, 60))).encode())
+                if written_tables < tables and index % table_every == table_every - 1:
+                    cells = "".join(
+                        "<w:tr>"
+                        + "".join(
+                            f"<w:tc>{_paragraph(sentence(rng.randint(1, 6)))}</w:tc>"
+                            for _ in range(cols)
+                        )
+                        + "</w:tr>"
+                        for _ in range(rows)
+                    )
+                    xml.write(f"<w:tbl>{cells}</w:tbl>".encode())
+                    written_tables += 1
+            xml.write(b"<w:sectPr/></w:body></w:document>")
+
+
+def extract(method: str, path: str) -> Dict:
+    """Extract in this process; meant to run in a fresh one per method"""
+    if method == "python-docx":
+        import docx
+    else:
+        from app.utils.docx_text import iter_docx_blocks
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    if method == "python-docx":
+        document = docx.Document(path)
+        text = "".join(paragraph.text + "\n" for paragraph in document.paragraphs)
+    else:
+        with open(path, "rb") as f:
+            text = "".join(f"{block}\n" for block in iter_docx_blocks(f))
+    elapsed = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "method": method,
+        "seconds": round(elapsed, 3),
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_growth_mb": round((peak - before) / 1024, 1),
+        "characters": len(text),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--file", help="benchmark an existing DOCX instead of a generated one")
+    parser.add_argument("--paragraphs", type=int, default=20000)
+    parser.add_argument("--tables", type=int, default=400)
+    parser.add_argument("--rows", type=int, default=50)
+    parser.add_argument("--cols", type=int, default=6)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--methods", default=",".join(METHODS))
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--measure", choices=METHODS, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.measure:
+        json.dump(extract(args.measure, args.file), sys.stdout)
+        return
+
+    path = args.file
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(), "bench.docx")
+        started = time.perf_counter()
+        make_docx(path, args.paragraphs, args.tables, args.rows, args.cols, args.seed)
+        print(
+            f"Generated {path} ({os.path.getsize(path) / 2**20:.1f} MB) "
+            f"in {time.perf_counter() - started:.1f}s",
+            file=sys.stderr,
+        )
+    results = []
+    for method in args.methods.split(","):
+        completed = subprocess.run(
+            [sys.executable, "-m", "benchmarks.docx_extraction", "--measure", method, "--file", path],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        results.append(json.loads(completed.stdout))
+    print(f"{'method':<12} {'seconds':>8} {'peak RSS MB':>12} {'characters':>12}")
+    for result in results:
+        print(
+            f"{result['method']:<12} {result['seconds']:>8} "
+            f"{result['peak_rss_growth_mb']:>12} {result['characters']:>12}"
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {"file": path, "bytes": os.path.getsize(path), "results": results}, f, indent=2
+            )
+
+
+if __name__ == "__main__":
+    main()
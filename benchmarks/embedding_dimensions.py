@@ -0,0 +1,182 @@
+"""
+Recall vs embedding dimension, to choose EMBEDDING_DIMENSIONS.
+
+Held-out vectors act as queries. Their exact top-k neighbours at full size
+are compared with the neighbours found after reducing every vector:
+
+- truncate: keep the first d components and re-normalize. This is what the
+  provider's ``dimensions`` parameter returns for text-embedding-3 models;
+  it is meaningless for older models such as ada-002.
+- pca: project onto the top d principal components of our own vectors
+  (EMBEDDING_REDUCTION=pca).
+
+    # Stored full-size vectors from the configured Qdrant collection
+    python -m benchmarks.embedding_dimensions --source qdrant --sample 20000
+    # Offline, with the benchmark corpus and fake embeddings (these span
+    # only a couple of hundred dimensions, so they exercise the harness
+    # rather than predict real recall)
+    python -m benchmarks.embedding_dimensions --source fake
+    # Fit and save the projection for EMBEDDING_PCA_PATH
+    python -m benchmarks.embedding_dimensions --source qdrant --fit-pca pca-512.npz --dimensions 512
+"""
+import argparse
+import json
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_DIMENSIONS = "128,256,384,512,768,1024,1536"
+
+
+def load_qdrant_vectors(sample: int) -> np.ndarray:
+    from app.utils.vector_store import vector_store
+
+    vector_store._init_client()
+    collection = vector_store.read_routes()[0]["collection"]
+    vectors, offset = [], None
+    while len(vectors) < sample:
+        points, offset = vector_store.client.scroll(
+            collection_name=collection,
+            limit=min(1000, sample - len(vectors)),
+            offset=offset,
+            with_payload=False,
+            with_vectors=True,
+        )
+        vectors.extend(point.vector for point in points)
+        if offset is None:
+            break
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def load_fake_vectors(sample: int, seed: int) -> np.ndarray:
+    from app.config import settings
+    from app.utils.document_processor import document_processor
+    from benchmarks.corpus import make_corpus
+    from benchmarks.fakes import fake_embedding
+
+    chunks: List[str] = []
+    documents = max(1, sample * settings.CHUNK_SIZE // (32 * 1024) + 1)
+    for _, text in make_corpus(documents, 32 * 1024, seed):
+        chunks.extend(document_processor.chunk_text(text))
+    return np.asarray([fake_embedding(chunk) for chunk in chunks[:sample]], dtype=np.float32)
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def top_k(queries: np.ndarray, base: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k most cosine-similar base rows per query (unordered)"""
+    scores = normalize(queries) @ normalize(base).T
+    return np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+
+def recall(truth: np.ndarray, found: np.ndarray) -> float:
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth, found))
+    return hits / truth.size
+
+
+def evaluate(
+    vectors: np.ndarray, dimensions: List[int], queries: int, k: int, seed: int
+) -> Tuple[List[Dict], float]:
+    from app.utils.embedding_projection import PCAProjection
+
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(vectors))
+    query_vectors, base = vectors[order[:queries]], vectors[order[queries:]]
+    truth = top_k(query_vectors, base, k)
+    full = vectors.shape[1]
+    # One fit serves every size: smaller projections are prefixes of it
+    largest = min(max(dimensions), *base.shape)
+    started = time.perf_counter()
+    pca = PCAProjection.fit(base, largest)
+    fit_seconds = round(time.perf_counter() - started, 2)
+
+    rows = []
+    for d in dimensions:
+        if d > full:
+            continue
+        row = {
+            "dimensions": d,
+            "bytes_per_vector": d * 4,
+            f"recall@{k}_truncate": round(
+                recall(truth, top_k(query_vectors[:, :d], base[:, :d], k)), 4
+            ),
+        }
+        if d <= largest:
+            projection = pca.truncate(d)
+            row[f"recall@{k}_pca"] = round(
+                recall(
+                    truth,
+                    top_k(projection.transform(query_vectors), projection.transform(base), k),
+                ),
+                4,
+            )
+        rows.append(row)
+    return rows, fit_seconds
+
+
+def print_table(rows: List[Dict], total_vectors: Optional[int]):
+    keys = [key for key in rows[0] if key != "bytes_per_vector"] if rows else []
+    header = keys + (["raw_vector_gib"] if total_vectors else [])
+    print("  ".join(f"{name:>18}" for name in header))
+    for row in rows:
+        cells = [row.get(key, "-") for key in keys]
+        if total_vectors:
+            cells.append(round(row["bytes_per_vector"] * total_vectors / 2**30, 2))
+        print("  ".join(f"{cell!s:>18}" for cell in cells))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--source", choices=("qdrant", "fake"), default="fake")
+    parser.add_argument("--sample", type=int, default=5000, help="vectors to load")
+    parser.add_argument("--queries", type=int, default=200, help="held-out query vectors")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--dimensions", default=DEFAULT_DIMENSIONS, help="comma-separated sizes")
+    parser.add_argument(
+        "--total-vectors", type=int, help="collection size, to estimate raw vector memory"
+    )
+    parser.add_argument("--fit-pca", metavar="PATH", help="fit a projection and save it")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the results as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    dimensions = [int(d) for d in args.dimensions.split(",") if d.strip()]
+
+    if args.source == "qdrant":
+        vectors = load_qdrant_vectors(args.sample)
+    else:
+        vectors = load_fake_vectors(args.sample, args.seed)
+    if len(vectors) <= args.queries + args.k:
+        raise SystemExit(f"Only {len(vectors)} vectors loaded; need more than --queries + k")
+    print(f"Loaded {len(vectors)} vectors of {vectors.shape[1]} dimensions", file=sys.stderr)
+
+    if args.fit_pca:
+        from app.utils.embedding_projection import PCAProjection
+
+        if len(dimensions) != 1:
+            raise SystemExit("--fit-pca needs exactly one --dimensions value")
+        PCAProjection.fit(vectors, dimensions[0]).save(args.fit_pca)
+        print(f"Saved {vectors.shape[1]} -> {dimensions[0]} projection to {args.fit_pca}")
+        return
+
+    rows, fit_seconds = evaluate(vectors, dimensions, args.queries, args.k, args.seed)
+    print(f"PCA fit took {fit_seconds}s", file=sys.stderr)
+    print_table(rows, args.total_vectors)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {"source": args.source, "vectors": len(vectors), "k": args.k, "results": rows},
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+"""
+Local stand-ins for the external services, so benchmarks run offline.
+
+- FakeOpenAIServer: an Azure OpenAI compatible HTTP server with
+  configurable latency and token streaming, served by uvicorn in a thread.
+- InMemoryObjectStore: the subset of the MinIO client used by MinioHelper.
+- install_fakes(): points the app's singletons at in-memory Qdrant and Redis
+  (or real local binaries, when URLs are given) and the in-memory object store.
+"""
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import math
+import re
+import socket
+import struct
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+EMBEDDING_DIMENSIONS = 1536
+_WORD = re.compile(r"\w+")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def fake_embedding(text: str, dimensions: int = EMBEDDING_DIMENSIONS) -> List[float]:
+    """Deterministic bag-of-words vector, so similar texts land near each other"""
+    vector = [0.0] * dimensions
+    for word in _WORD.findall(text.lower()):
+        digest = hashlib.blake2b(word.encode(), digest_size=8).digest()
+        vector[int.from_bytes(digest, "little") % dimensions] += 1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+@dataclass
+class OpenAILatency:
+    """Simulated service times, in seconds"""
+
+    embedding_base: float = 0.02
+    embedding_per_input: float = 0.0005
+    chat_first_token: float = 0.3
+    chat_token_interval: float = 0.01
+    answer_tokens: int = 60
+
+
+class FakeOpenAIServer:
+    """Azure OpenAI compatible embeddings and chat endpoints on localhost"""
+
+    def __init__(self, latency: Optional[OpenAILatency] = None):
+        self.latency = latency or OpenAILatency()
+        self.port = free_port()
+        self.requests = {"embeddings": 0, "chat": 0}
+        self._server = None
+        self._thread = None
+
+    @property
+    def endpoint(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def _build_app(self):
+        from fastapi import FastAPI, Request
+        from fastapi.responses import JSONResponse, StreamingResponse
+
+        app = FastAPI()
+        latency = self.latency
+
+        @app.post("/openai/deployments/{deployment}/embeddings")
+        async def embeddings(deployment: str, request: Request):
+            self.requests["embeddings"] += 1
+            body = await request.json()
+            inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+            await asyncio.sleep(
+                latency.embedding_base + latency.embedding_per_input * len(inputs)
+            )
+            data = []
+            for index, text in enumerate(inputs):
+                vector = fake_embedding(text, body.get("dimensions") or EMBEDDING_DIMENSIONS)
+                if body.get("encoding_format") == "base64":
+                    vector = base64.b64encode(
+                        struct.pack(f"<{len(vector)}f", *vector)
+                    ).decode()
+                data.append({"object": "embedding", "index": index, "embedding": vector})
+            tokens = sum(len(text) // 4 + 1 for text in inputs)
+            return JSONResponse(
+                {
+                    "object": "list",
+                    "data": data,
+                    "model": deployment,
+                    "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+                }
+            )
+
+        @app.post("/openai/deployments/{deployment}/chat/completions")
+        async def chat(deployment: str, request: Request):
+            self.requests["chat"] += 1
+            body = await request.json()
+            completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+            words = [f"word{i} " for i in range(latency.answer_tokens)]
+
+            if not body.get("stream"):
+                await asyncio.sleep(
+                    latency.chat_first_token
+                    + latency.chat_token_interval * latency.answer_tokens
+                )
+                return JSONResponse(
+                    {
+                        "id": completion_id,
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": deployment,
+                        "choices": [
+                            {
+                                "index": 0,
+                                "message": {"role": "assistant", "content": "".join(words)},
+                                "finish_reason": "stop",
+                            }
+                        ],
+                        "usage": {
+                            "prompt_tokens": 0,
+                            "completion_tokens": latency.answer_tokens,
+                            "total_tokens": latency.answer_tokens,
+                        },
+                    }
+                )
+
+            async def events():
+                await asyncio.sleep(latency.chat_first_token)
+                for index, word in enumerate(words):
+                    if index:
+                        await asyncio.sleep(latency.chat_token_interval)
+                    chunk = {
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": deployment,
+                        "choices": [
+                            {"index": 0, "delta": {"content": word}, "finish_reason": None}
+                        ],
+                    }
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        return app
+
+    def start(self):
+        self._server, self._thread = serve_in_thread(self._build_app(), self.port)
+        return self
+
+    def stop(self):
+        stop_server(self._server, self._thread)
+
+
+def serve_in_thread(app, port: int):
+    """Run an ASGI app with uvicorn on a background thread until it is ready"""
+    import uvicorn
+
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 30
+    while not server.started:
+        if not thread.is_alive() or time.monotonic() > deadline:
+            raise RuntimeError(f"Server on port {port} failed to start")
+        time.sleep(0.05)
+    return server, thread
+
+
+def stop_server(server, thread):
+    if server is not None:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+
+class InMemoryObjectStore:
+    """The parts of minio.Minio that MinioHelper uses, backed by a dict"""
+
+    def __init__(self):
+        self.buckets: Dict[str, Dict[str, bytes]] = {}
+        self.modified: Dict[str, datetime] = {}
+        self._lock = threading.Lock()
+
+    def bucket_exists(self, bucket: str) -> bool:
+        return bucket in self.buckets
+
+    def make_bucket(self, bucket: str):
+        self.buckets.setdefault(bucket, {})
+
+    def put_object(self, bucket, object_name, data, length, content_type=None, **kwargs):
+        payload = data.read(length) if length >= 0 else data.read()
+        with self._lock:
+            self.buckets[bucket][object_name] = payload
+            self.modified[object_name] = datetime.now(timezone.utc)
+
+    def get_object(self, bucket, object_name, *args, **kwargs):
+        from minio.error import S3Error
+
+        with self._lock:
+            payload = self.buckets.get(bucket, {}).get(object_name)
+        if payload is None:
+            raise S3Error(
+                response=None,
+                code="NoSuchKey",
+                message="Object does not exist",
+                resource=object_name,
+                request_id=None,
+                host_id=None,
+            )
+        return _ObjectResponse(payload)
+
+    def remove_object(self, bucket, object_name, *args, **kwargs):
+        with self._lock:
+            self.buckets.get(bucket, {}).pop(object_name, None)
+
+    def list_objects(self, bucket, prefix=None, recursive=False, **kwargs):
+        with self._lock:
+            names = [
+                name for name in self.buckets.get(bucket, {}) if name.startswith(prefix or "")
+            ]
+        return [
+            SimpleNamespace(object_name=name, last_modified=self.modified.get(name))
+            for name in names
+        ]
+
+    def remove_objects(self, bucket, delete_object_list, **kwargs):
+        for item in delete_object_list:
+            # DeleteObject exposes ``name`` in recent minio releases, ``_name`` before
+            self.remove_object(bucket, getattr(item, "name", None) or item._name)
+        return iter(())
+
+
+class _ObjectResponse(io.BytesIO):
+    def release_conn(self):
+        pass
+
+
+class NetworkDelay:
+    """
+    Adds a fixed round-trip time to every method call of the wrapped client.
+
+    In-memory stand-ins answer without touching the network, so without
+    this a blocking call looks free to the event loop when a real server
+    round trip would stall it. The sleep releases the GIL like socket I/O.
+    """
+
+    def __init__(self, client, seconds: float):
+        self._client = client
+        self._seconds = seconds
+
+    def __getattr__(self, name):
+        attribute = getattr(self._client, name)
+        if not callable(attribute) or self._seconds <= 0:
+            return attribute
+
+        def delayed(*args, **kwargs):
+            time.sleep(self._seconds)
+            return attribute(*args, **kwargs)
+
+        return delayed
+
+
+def install_fakes(
+    qdrant_url: Optional[str] = None,
+    redis_url: Optional[str] = None,
+    qdrant_rtt: float = 0.0,
+):
+    """
+    Point the app's service singletons at local stand-ins.
+
+    Must run before the first vector, cache or storage operation. Qdrant and
+    Redis run in memory unless URLs of local servers are given; ``qdrant_rtt``
+    simulates the network round trip of the in-memory Qdrant.
+    """
+    from qdrant_client import QdrantClient
+    from app.helpers.minio_helpers import minio_helper
+    from app.utils.cache import cache
+    from app.utils.vector_store import vector_store
+
+    # Redis first: the vector store reads collection profiles from it
+    if redis_url:
+        import redis
+
+        cache.redis = redis.Redis.from_url(redis_url, decode_responses=True)
+    else:
+        import fakeredis
+
+        cache.redis = fakeredis.FakeRedis(decode_responses=True)
+    cache.redis.flushdb()
+
+    if qdrant_url:
+        client = QdrantClient(url=qdrant_url)
+    else:
+        client = NetworkDelay(QdrantClient(location=":memory:"), qdrant_rtt)
+    vector_store._ensure_collection_exists(client)
+    vector_store.client = client
+
+    minio_helper.client = InMemoryObjectStore()
+    minio_helper._ensure_bucket_exists()
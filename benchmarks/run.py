@@ -0,0 +1,454 @@
+"""
+Offline benchmark for the ingest and query paths.
+
+Runs the real application code against local stand-ins (see
+benchmarks/fakes.py) and writes machine-readable results:
+
+    python -m benchmarks.run --documents 20 --document-kb 64 --queries 200 \\
+        --output results.json --compare baseline.json
+
+Scenarios:
+    ingest        process_document_task, run eagerly in this process
+    query         RAGEngine.process_query with unique questions (cache misses)
+    query_cached  the same questions again (cache hits)
+    stream        RAGEngine.process_query_stream; time to first token and total
+    ws            /ws/query on a local uvicorn server
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from benchmarks.corpus import make_corpus, make_question
+from benchmarks.fakes import (
+    FakeOpenAIServer,
+    OpenAILatency,
+    free_port,
+    install_fakes,
+    serve_in_thread,
+    stop_server,
+)
+
+SCENARIOS = ("ingest", "query", "query_cached", "stream", "ws")
+
+
+def configure_environment(openai_endpoint: str, workdir: str):
+    """Settings are read at import time, so this runs before any app import"""
+    os.environ.update(
+        {
+            "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'benchmark.db')}",
+            "AZURE_OPENAI_ENDPOINT": openai_endpoint,
+            "AZURE_OPENAI_API_KEY": "benchmark",
+            "AZURE_OPENAI_API_VERSION": "2024-02-01",
+            "AZURE_EMBEDDING_DEPLOYMENT_NAME": "benchmark-embedding",
+            "AZURE_CHAT_MODEL_DEPLOYMENT_NAME": "benchmark-chat",
+            # The fake server has no quota; keep the limiter out of the way
+            "AZURE_EMBEDDING_RPM": "1000000",
+            "AZURE_EMBEDDING_TPM": "1000000000",
+            "AZURE_CHAT_RPM": "1000000",
+            "AZURE_CHAT_TPM": "1000000000",
+            "LOG_LEVEL": os.environ.get("LOG_LEVEL", "warning"),
+        }
+    )
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Latency distribution in milliseconds"""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def percentile(p: float) -> float:
+        index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+        return round(ordered[index] * 1000, 3)
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "p50_ms": percentile(50),
+        "p90_ms": percentile(90),
+        "p99_ms": percentile(99),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def bench_ingest(corpus) -> Dict:
+    from app.db.crud_documents import create_document
+    from app.db.session import SessionLocal
+    from app.helpers.celery_tasks import celery_app, process_document_task
+    from app.helpers.minio_helpers import minio_helper
+    from app.config import settings
+
+    # Shards and the finalize callback run inline, like one worker process
+    celery_app.conf.task_always_eager = True
+
+    document_ids, latencies = [], []
+    failed = 0
+    chunks_before = vector_count()
+    started = time.perf_counter()
+    for file_name, text in corpus:
+        document_id = str(uuid.uuid4())
+        payload = text.encode()
+        db = SessionLocal()
+        try:
+            create_document(
+                db,
+                {
+                    "id": document_id,
+                    "title": file_name,
+                    "file_name": file_name,
+                    "file_size": len(payload),
+                    "file_type": "text/plain",
+                },
+            )
+        finally:
+            db.close()
+        object_name = f"{document_id}/{file_name}"
+        minio_helper.client.put_object(
+            settings.MINIO_BUCKET_NAME, object_name, _bytes_io(payload), len(payload)
+        )
+
+        begin = time.perf_counter()
+        if process_document_task.apply(args=[document_id, object_name]).get():
+            document_ids.append(document_id)
+        else:
+            failed += 1
+        latencies.append(time.perf_counter() - begin)
+    elapsed = time.perf_counter() - started
+    chunks = vector_count() - chunks_before
+    return {
+        "documents": len(corpus),
+        "failed": failed,
+        "chunks": chunks,
+        "seconds": round(elapsed, 3),
+        "documents_per_second": round(len(corpus) / elapsed, 3),
+        "chunks_per_second": round(chunks / elapsed, 3),
+        "document_latency": summarize(latencies),
+        "_document_ids": document_ids,
+    }
+
+
+def vector_count() -> int:
+    from app.utils.vector_store import vector_store
+
+    return vector_store.client.count(vector_store.read_routes()[0]["collection"]).count
+
+
+def _bytes_io(payload: bytes):
+    import io
+
+    return io.BytesIO(payload)
+
+
+async def _run_concurrently(jobs, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(job):
+        async with semaphore:
+            return await job()
+
+    return await asyncio.gather(*(run(job) for job in jobs))
+
+
+async def bench_query(workload, concurrency: int) -> Dict:
+    from app.utils.rag_engine import rag_engine
+
+    errors = 0
+
+    def job(document_id, question):
+        async def run():
+            nonlocal errors
+            begin = time.perf_counter()
+            try:
+                await rag_engine.process_query(document_id, question)
+            except Exception:
+                errors += 1
+            return time.perf_counter() - begin
+
+        return run
+
+    started = time.perf_counter()
+    latencies = await _run_concurrently(
+        [job(document_id, question) for document_id, question in workload], concurrency
+    )
+    elapsed = time.perf_counter() - started
+    return {
+        "queries": len(workload),
+        "errors": errors,
+        "concurrency": concurrency,
+        "queries_per_second": round(len(workload) / elapsed, 3),
+        "latency": summarize(latencies),
+    }
+
+
+async def bench_stream(workload, concurrency: int) -> Dict:
+    from app.utils.rag_engine import rag_engine
+
+    first_token, totals = [], []
+    errors = 0
+
+    def job(document_id, question):
+        async def run():
+            nonlocal errors
+            begin = time.perf_counter()
+            first = None
+            try:
+                async for _ in rag_engine.process_query_stream(document_id, question):
+                    if first is None:
+                        first = time.perf_counter() - begin
+            except Exception:
+                errors += 1
+                return
+            first_token.append(first if first is not None else 0.0)
+            totals.append(time.perf_counter() - begin)
+
+        return run
+
+    started = time.perf_counter()
+    await _run_concurrently(
+        [job(document_id, question) for document_id, question in workload], concurrency
+    )
+    elapsed = time.perf_counter() - started
+    return {
+        "queries": len(workload),
+        "errors": errors,
+        "concurrency": concurrency,
+        "queries_per_second": round(len(workload) / elapsed, 3),
+        "time_to_first_token": summarize(first_token),
+        "latency": summarize(totals),
+    }
+
+
+async def _ws_client(url: str, workload, first_token: list, totals: list) -> int:
+    import websockets
+
+    errors = 0
+    async with websockets.connect(url, max_size=None) as ws:
+        for document_id, question in workload:
+            query_id = uuid.uuid4().hex
+            begin = time.perf_counter()
+            first = None
+            await ws.send(
+                json.dumps(
+                    {"query_id": query_id, "document_id": document_id, "question": question}
+                )
+            )
+            while True:
+                message = json.loads(await ws.recv())
+                if message.get("query_id") != query_id:
+                    continue
+                if "error" in message:
+                    errors += 1
+                    break
+                if message.get("type") == "token" and first is None:
+                    first = time.perf_counter() - begin
+                elif message.get("type") == "complete":
+                    first_token.append(first if first is not None else 0.0)
+                    totals.append(time.perf_counter() - begin)
+                    break
+    return errors
+
+
+def bench_websocket(workload, connections: int) -> Dict:
+    from app.main import app
+
+    port = free_port()
+    server, thread = serve_in_thread(app, port)
+    try:
+        url = f"ws://127.0.0.1:{port}/ws/query"
+        first_token, totals = [], []
+        per_connection = [workload[index::connections] for index in range(connections)]
+
+        async def run_clients():
+            return await asyncio.gather(
+                *(
+                    _ws_client(url, queries, first_token, totals)
+                    for queries in per_connection
+                    if queries
+                )
+            )
+
+        started = time.perf_counter()
+        errors = sum(asyncio.run(run_clients()))
+        elapsed = time.perf_counter() - started
+    finally:
+        stop_server(server, thread)
+    return {
+        "queries": len(workload),
+        "errors": errors,
+        "connections": connections,
+        "queries_per_second": round(len(workload) / elapsed, 3),
+        "time_to_first_token": summarize(first_token),
+        "latency": summarize(totals),
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def compare(results: Dict, baseline_path: str):
+    """Print the change of each headline number against an earlier run"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    print(f"\nChange vs {baseline_path}:", file=sys.stderr)
+    for scenario, current in results.items():
+        previous = baseline.get(scenario)
+        if not previous:
+            continue
+        for metric, path in (
+            ("throughput", ("documents_per_second",)),
+            ("throughput", ("queries_per_second",)),
+            ("p50", ("latency", "p50_ms")),
+            ("p99", ("latency", "p99_ms")),
+            ("ttft p50", ("time_to_first_token", "p50_ms")),
+            ("ttft p99", ("time_to_first_token", "p99_ms")),
+        ):
+            old, new = previous, current
+            for key in path:
+                old = old.get(key) if isinstance(old, dict) else None
+                new = new.get(key) if isinstance(new, dict) else None
+            if old and new is not None:
+                print(
+                    f"  {scenario:<13} {metric:<10} {old:>10} -> {new:<10} ({(new - old) / old:+.1%})",
+                    file=sys.stderr,
+                )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--documents", type=int, default=10)
+    parser.add_argument("--document-kb", type=int, default=32, help="size of each document")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--ws-connections", type=int, default=4)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--embedding-latency-ms", type=float, default=20)
+    parser.add_argument("--first-token-ms", type=float, default=300)
+    parser.add_argument("--token-interval-ms", type=float, default=10)
+    parser.add_argument("--answer-tokens", type=int, default=60)
+    parser.add_argument(
+        "--qdrant-rtt-ms", type=float, default=2, help="simulated round trip of in-memory Qdrant"
+    )
+    parser.add_argument("--qdrant-url", help="use a local Qdrant server instead of in-memory")
+    parser.add_argument("--redis-url", help="use a local Redis server instead of fakeredis")
+    parser.add_argument("--output", help="write JSON results here instead of stdout")
+    parser.add_argument("--compare", help="earlier results file to diff against")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    openai_server = FakeOpenAIServer(
+        OpenAILatency(
+            embedding_base=args.embedding_latency_ms / 1000,
+            chat_first_token=args.first_token_ms / 1000,
+            chat_token_interval=args.token_interval_ms / 1000,
+            answer_tokens=args.answer_tokens,
+        )
+    ).start()
+    workdir = tempfile.mkdtemp(prefix="docuquery-bench-")
+    configure_environment(openai_server.endpoint, workdir)
+
+    from app.db.session import init_db
+    from app.helpers.ai_helpers import ai_helper
+
+    install_fakes(
+        qdrant_url=args.qdrant_url,
+        redis_url=args.redis_url,
+        qdrant_rtt=args.qdrant_rtt_ms / 1000,
+    )
+    init_db()
+
+    results: Dict[str, Dict] = {}
+    try:
+        # Every query scenario needs indexed documents
+        ingest = bench_ingest(make_corpus(args.documents, args.document_kb * 1024, args.seed))
+        document_ids = ingest.pop("_document_ids")
+        # Ingest ran on the worker's event loop; the query scenarios get a
+        # client bound to their own loop
+        from app.helpers.celery_tasks import run_async
+
+        run_async(ai_helper.close())
+        if "ingest" in scenarios:
+            results["ingest"] = ingest
+        if not document_ids:
+            raise SystemExit("No documents were ingested; check the log output")
+
+        rng = random.Random(args.seed)
+
+        def workload(offset: int):
+            return [
+                (rng.choice(document_ids), make_question(rng, offset + index))
+                for index in range(args.queries)
+            ]
+
+        async def run_async_scenarios():
+            try:
+                if "query" in scenarios or "query_cached" in scenarios:
+                    queries = workload(0)
+                    results["query"] = await bench_query(queries, args.concurrency)
+                    if "query_cached" in scenarios:
+                        results["query_cached"] = await bench_query(queries, args.concurrency)
+                    if "query" not in scenarios:
+                        del results["query"]
+                if "stream" in scenarios:
+                    results["stream"] = await bench_stream(workload(args.queries), args.concurrency)
+            finally:
+                # The async client is bound to this loop; the WS server has its own
+                await ai_helper.close()
+
+        asyncio.run(run_async_scenarios())
+        if "ws" in scenarios:
+            results["ws"] = bench_websocket(workload(2 * args.queries), args.ws_connections)
+    finally:
+        openai_server.stop()
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "backends": {
+                "qdrant": args.qdrant_url or f"in-memory (+{args.qdrant_rtt_ms} ms)",
+                "redis": args.redis_url or "fakeredis",
+                "object_store": "in-memory",
+            },
+            "config": vars(args),
+            "openai_requests": openai_server.requests,
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,9 @@
 import os
 import logging
-from app.helpers.celery_tasks import celery_app
+from app.utils.startup import startup_report
+
+with startup_report.stage("imports"):
+    from app.helpers.celery_tasks import celery_app
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -11,6 +14,7 @@ logger.info("Starting Celery worker...")
 logger.info(f"Database URL: {os.environ.get('DATABASE_URL', 'Not set')}")
 logger.info(f"MinIO endpoint: {os.environ.get('MINIO_ENDPOINT', 'Not set')}")
 logger.info(f"Redis host: {os.environ.get('REDIS_HOST', 'Not set')}")
+startup_report.log()
 
 
 if __name__ == "__main__":